@@ -4,7 +4,16 @@ from datetime import datetime
 from os import listdir
 import os
 import csv
-from application_logging.logger import App_Logger
+import time
+from itertools import islice
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # the Parquet export is optional, the data is exported as CSV without pyarrow
+    pa = pq = None
+from application_logging.logger import App_Logger, DEBUG
+from data_ingestion.connection_manager import Connection_Manager
+from Prediction_Raw_Data_Validation.predictionDataValidation import NA_VALUES
 
 class dBOperation:
     """
@@ -16,10 +25,12 @@ class dBOperation:
         self.badFilePath = "Prediction_Raw_Files_Validated/Bad_Raw"
         self.goodFilePath = "Prediction_Raw_Files_Validated/Good_Raw"
         self.logger = App_Logger()
+        self.connections = Connection_Manager(self.logger, "Prediction_Logs/DataBaseConnectionLog.txt")
 
     def dataBaseConnection(self, DatabaseName):
         """
-        Creates or connects to a database with the given name.
+        Returns the connection to the database with the given name. It is opened (and the database
+        created) on first use, then reused by every operation until close is called.
 
         Args:
             DatabaseName (str): The name of the database.
@@ -31,17 +42,39 @@ class dBOperation:
             ConnectionError: If there is an error connecting to the database.
         """
         try:
-            conn = sqlite3.connect(self.path + DatabaseName + '.db')
-            file = open("Prediction_Logs/DataBaseConnectionLog.txt", 'a+')
-            self.logger.log(file, "Opened %s database successfully" % DatabaseName)
-            file.close()
-        except ConnectionError:
-            file = open("Prediction_Logs/DataBaseConnectionLog.txt", 'a+')
-            self.logger.log(file, "Error while connecting to database: %s" % ConnectionError)
-            file.close()
-            raise ConnectionError
+            conn = self.connections.connect(self.path + DatabaseName + '.db')
+        except sqlite3.Error as e:
+            self.logger.log("Prediction_Logs/DataBaseConnectionLog.txt", "Error while connecting to database: %s" % e)
+            raise ConnectionError(e)
         return conn
 
+    def readerConnection(self, DatabaseName):
+        """
+        Opens a read-only connection to the database with the given name, which can read while the
+        connection of dataBaseConnection writes. The caller closes it.
+
+        Args:
+            DatabaseName (str): The name of the database.
+
+        Returns:
+            sqlite3.Connection: Read-only connection to the database.
+
+        Raises:
+            ConnectionError: If there is an error connecting to the database.
+        """
+        try:
+            return self.connections.reader(self.path + DatabaseName + '.db')
+        except sqlite3.Error as e:
+            self.logger.log("Prediction_Logs/DataBaseConnectionLog.txt", "Error while connecting to database: %s" % e)
+            raise ConnectionError(e)
+
+    def close(self):
+        """
+        Closes the connections opened by dataBaseConnection, at the end of a pipeline run.
+
+        """
+        self.connections.close()
+
     def createTableDb(self, DatabaseName, column_names):
         """
         Creates a table in the given database to insert the good data after raw data validation.
@@ -56,101 +89,293 @@ class dBOperation:
         try:
             conn = self.dataBaseConnection(DatabaseName)
             conn.execute('DROP TABLE IF EXISTS Good_Raw_Data;')
-
-            for key in column_names.keys():
-                type = column_names[key]
-
-                try:
-                    conn.execute('ALTER TABLE Good_Raw_Data ADD COLUMN "{column_name}" {dataType}'.format(column_name=key, dataType=type))
-                except:
-                    conn.execute('CREATE TABLE  Good_Raw_Data ({column_name} {dataType})'.format(column_name=key, dataType=type))
-
-            conn.close()
-
-            file = open("Prediction_Logs/DbTableCreateLog.txt", 'a+')
-            self.logger.log(file, "Tables created successfully!!")
-            file.close()
-
-            file = open("Prediction_Logs/DataBaseConnectionLog.txt", 'a+')
-            self.logger.log(file, "Closed %s database successfully" % DatabaseName)
-            file.close()
+            conn.execute(self.createTableQuery(column_names))
+            self.logger.log("Prediction_Logs/DbTableCreateLog.txt", "Tables created successfully!!")
 
         except Exception as e:
-            file = open("Prediction_Logs/DbTableCreateLog.txt", 'a+')
-            self.logger.log(file, "Error while creating table: %s " % e)
-            file.close()
-            conn.close()
-            file = open("Prediction_Logs/DataBaseConnectionLog.txt", 'a+')
-            self.logger.log(file, "Closed %s database successfully" % DatabaseName)
-            file.close()
+            self.logger.log("Prediction_Logs/DbTableCreateLog.txt", "Error while creating table: %s " % e)
             raise e
 
-    def insertIntoTableGoodData(self, Database):
+    def createTableQuery(self, column_names):
+        """
+        Returns the statement creating the Good_Raw_Data table with the columns of the schema.
+
+        """
+        return 'CREATE TABLE IF NOT EXISTS Good_Raw_Data ({columns})'.format(
+            columns=', '.join('"%s" %s' % (column.replace('"', '""'), type) for column, type in column_names.items()))
+
+    def insertIntoTableGoodData(self, Database, chunksize=10000, files=None, column_names=None):
         """
         Inserts the Good data files from the Good_Raw folder into the created table.
 
+        Each file is loaded with parameterized executemany calls of at most chunksize rows inside a
+        single transaction, so a malformed file is rolled back and moved to the Bad_Raw folder as a whole.
+        Every row is appended, rows with the same policy number included: each row is a claim to score.
+
         Args:
             Database (str): The name of the database.
+            chunksize (int): The number of rows sent to the database per executemany call.
+            files (iterable): The names of the files to insert, in order. Defaults to every file of the
+                              Good_Raw folder, in name order. It can be fed while the files are still
+                              being validated, as this method is the only writer of the database.
+            column_names (dict): The column names and types of the schema. The values of the Integer
+                                 columns are bound as integers (floats if they have decimals), the
+                                 others as text, and missing values as NULL.
+
+        Returns:
+            int: The number of rows inserted.
         """
         conn = self.dataBaseConnection(Database)
         goodFilePath = self.goodFilePath
         badFilePath = self.badFilePath
-        onlyfiles = [f for f in listdir(goodFilePath)]
-        log_file = open("Prediction_Logs/DbInsertLog.txt", 'a+')
+        onlyfiles = sorted(listdir(goodFilePath)) if files is None else files
+        total_rows = 0
 
         for file in onlyfiles:
             try:
-                with open(goodFilePath + '/' + file, "r") as f:
-                    next(f)
-                    reader = csv.reader(f, delimiter="\n")
-                    for line in enumerate(reader):
-                        for list_ in (line[1]):
-                            try:
-                                conn.execute('INSERT INTO Good_Raw_Data values ({values})'.format(values=(list_)))
-                                self.logger.log(log_file, " %s: File loaded successfully!!" % file)
-                                conn.commit()
-                            except Exception as e:
-                                raise e
+                rows = 0
+                with open(goodFilePath + '/' + file, "r", newline='') as f:
+                    reader = csv.reader(f)
+                    header = next(reader)
+                    converters = [self.valueConverter((column_names or {}).get(column)) for column in header]
+                    query = 'INSERT INTO Good_Raw_Data ({columns}) values ({placeholders})'.format(
+                        columns=', '.join('"%s"' % column.replace('"', '""') for column in header),
+                        placeholders=', '.join(['?'] * len(header)))
+                    with conn:  # commits the whole file at once, rolls it back on any error
+                        for chunk in self.rowsInChunks(reader, converters, chunksize):
+                            conn.executemany(query, chunk)
+                            rows += len(chunk)
+                self.logger.log("Prediction_Logs/DbInsertLog.txt", " %s: File loaded successfully!! %d rows inserted" % (file, rows), level=DEBUG)
+                total_rows += rows
 
             except Exception as e:
                 conn.rollback()
-                self.logger.log(log_file, "Error while creating table: %s " % e)
+                self.logger.log("Prediction_Logs/DbInsertLog.txt", "Error while inserting file %s: %s " % (file, e))
                 shutil.move(goodFilePath + '/' + file, badFilePath)
-                self.logger.log(log_file, "File Moved Successfully %s" % file)
-                log_file.close()
-                conn.close()
+                self.logger.log("Prediction_Logs/DbInsertLog.txt", "File Moved Successfully %s" % file, level=DEBUG)
                 raise e
+        return total_rows
+
+    def rowsInChunks(self, reader, converters, chunksize):
+        """
+        Yields the rows of a csv reader as lists of at most chunksize parameter tuples.
+
+        The values are converted a column at a time, so the common case (a column of well formed
+        integers, or of text) is converted by a single C-level pass instead of a call per value.
+
+        Args:
+            reader (csv.reader): The reader positioned after the header.
+            converters (list): The function converting the values of each column to their bound values.
+            chunksize (int): The maximum number of rows per chunk.
+
+        Raises:
+            ValueError: If a row does not have a value for every column.
+        """
+        while True:
+            rows = list(islice(reader, chunksize))
+            if not rows:
+                return
+            rows = [row for row in rows if row]  # skip blank lines
+            if any(len(row) != len(converters) for row in rows):
+                raise ValueError('Row with a number of values different from the %d columns' % len(converters))
+            if rows:
+                yield list(zip(*[convert(column) for convert, column in zip(converters, zip(*rows))]))
+
+    def valueConverter(self, column_type):
+        """
+        Returns the function converting the csv values of a column of the given schema type to the
+        values bound in the insert statement.
+
+        """
+        if column_type is not None and column_type.lower() == 'integer':
+            return self.integerValues
+        return self.textValues
+
+    def textValues(self, values):
+        return [None if value in NA_VALUES else value for value in values]
+
+    def integerValues(self, values):
+        try:
+            return list(map(int, values))
+        except ValueError:
+            pass
+        try:
+            return list(map(float, values))
+        except ValueError:
+            return [self.integerValue(value) for value in values]
 
-        conn.close()
-        log_file.close()
+    def integerValue(self, value):
+        if value in NA_VALUES:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            try:
+                return float(value)
+            except ValueError:
+                return value  # e.g. '?', stored as text as the column affinity would do
 
-    def selectingDatafromtableintocsv(self, Database):
+    def selectingDatafromtableintocsv(self, Database, chunksize=10000):
         """
         Exports the data in GoodData table as a CSV file in a given location.
 
+        The rows are streamed from the cursor to the file chunksize rows at a time, so the memory used
+        does not grow with the table.
+
         Args:
             Database (str): The name of the database.
+            chunksize (int): The number of rows fetched from the database at a time.
+
+        Returns:
+            int: The number of rows exported.
         """
         self.fileFromDb = 'Prediction_FileFromDB/'
         self.fileName = 'InputFile.csv'
-        log_file = open("Prediction_Logs/ExportToCsv.txt", 'a+')
+        conn = None
         try:
-            conn = self.dataBaseConnection(Database)
+            conn = self.readerConnection(Database)  # does not block a writer
+            start = time.perf_counter()
             sqlSelect = "SELECT *  FROM Good_Raw_Data"
             cursor = conn.cursor()
             cursor.execute(sqlSelect)
-            results = cursor.fetchall()
             headers = [i[0] for i in cursor.description]
 
             if not os.path.isdir(self.fileFromDb):
                 os.makedirs(self.fileFromDb)
 
-            csvFile = csv.writer(open(self.fileFromDb + self.fileName, 'w', newline=''), delimiter=',', lineterminator='\r\n', quoting=csv.QUOTE_ALL, escapechar='\\')
-            csvFile.writerow(headers)
-            csvFile.writerows(results)
+            rows = 0
+            # written next to the target and renamed, so a reader never sees a partial file
+            with open(self.fileFromDb + self.fileName + '.tmp', 'w', newline='') as f:
+                csvFile = csv.writer(f, delimiter=',', lineterminator='\r\n', quoting=csv.QUOTE_ALL, escapechar='\\')
+                csvFile.writerow(headers)
+                for results in iter(lambda: cursor.fetchmany(chunksize), []):
+                    csvFile.writerows(results)
+                    rows += len(results)
+            os.replace(self.fileFromDb + self.fileName + '.tmp', self.fileFromDb + self.fileName)
 
-            self.logger.log(log_file, "File exported successfully!!!")
+            self.logger.log("Prediction_Logs/ExportToCsv.txt", "File exported successfully!!! %s" % self.exportRate(rows, start))
+            return rows
 
         except Exception as e:
-            self.logger.log(log_file, "File exporting failed. Error : %s" % e)
+            self.logger.log("Prediction_Logs/ExportToCsv.txt", "File exporting failed. Error : %s" % e)
             raise e
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def exportGoodData(self, Database, column_names=None, export_format='parquet'):
+        """
+        Exports the data in GoodData table for the prediction pipeline: as a Parquet file typed from the
+        schema if export_format is 'parquet' and pyarrow is installed, as a CSV file otherwise. The
+        export of the other format is removed, so the data loader never reads a stale file.
+
+        Args:
+            Database (str): The name of the database.
+            column_names (dict): The column names and types of the schema.
+            export_format (str): 'parquet' or 'csv'.
+
+        Returns:
+            int: The number of rows exported.
+        """
+        if export_format == 'parquet' and pq is None:
+            self.logger.log("Prediction_Logs/ExportToCsv.txt", "pyarrow is not installed, exporting CSV instead of Parquet")
+        if export_format == 'parquet' and pq is not None:
+            rows = self.selectingDatafromtableintoparquet(Database, column_names)
+            stale_file = 'Prediction_FileFromDB/InputFile.csv'
+        else:
+            rows = self.selectingDatafromtableintocsv(Database)
+            stale_file = 'Prediction_FileFromDB/InputFile.parquet'
+        if rows is not None and os.path.exists(stale_file):
+            os.remove(stale_file)
+        return rows
+
+    def selectingDatafromtableintoparquet(self, Database, column_names=None, chunksize=10000):
+        """
+        Exports the data in GoodData table as a Parquet file in a given location. The Integer columns
+        of the schema are stored as integers (floats if they have decimals) and the others as strings,
+        so the loader reads every column with its type instead of inferring it from text.
+
+        The rows are streamed from the cursor to the file chunksize rows at a time, one row group per
+        chunk, so the memory used does not grow with the table.
+
+        Args:
+            Database (str): The name of the database.
+            column_names (dict): The column names and types of the schema.
+            chunksize (int): The number of rows fetched from the database at a time.
+
+        Returns:
+            int: The number of rows exported.
+        """
+        self.fileFromDb = 'Prediction_FileFromDB/'
+        self.fileName = 'InputFile.parquet'
+        conn = None
+        try:
+            conn = self.readerConnection(Database)  # does not block a writer
+            start = time.perf_counter()
+            cursor = conn.execute("SELECT *  FROM Good_Raw_Data")
+            headers = [i[0] for i in cursor.description]
+            schema = self.arrowSchema(conn, headers, column_names)
+
+            if not os.path.isdir(self.fileFromDb):
+                os.makedirs(self.fileFromDb)
+
+            rows = 0
+            # written next to the target and renamed, so a reader never sees a partial file
+            with pq.ParquetWriter(self.fileFromDb + self.fileName + '.tmp', schema) as writer:
+                for results in iter(lambda: cursor.fetchmany(chunksize), []):
+                    writer.write_table(pa.table([self.arrowColumn(values, field.type) for field, values in zip(schema, zip(*results))],
+                                                schema=schema))
+                    rows += len(results)
+            os.replace(self.fileFromDb + self.fileName + '.tmp', self.fileFromDb + self.fileName)
+
+            self.logger.log("Prediction_Logs/ExportToCsv.txt", "File exported successfully as Parquet!!! %s" % self.exportRate(rows, start))
+            return rows
+
+        except Exception as e:
+            self.logger.log("Prediction_Logs/ExportToCsv.txt", "File exporting failed. Error : %s" % e)
+            raise e
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def arrowSchema(self, conn, headers, column_names):
+        """
+        Returns the Arrow schema of the export. A column is a string column unless the schema types it
+        Integer; an Integer column is float64 if it stores a decimal, int64 otherwise, and string if it
+        stores text that is not a missing value spelling ('?' for instance). The stored types are found
+        by one aggregate query before any row is written, and the text of the few columns storing some
+        by one more query each.
+
+        """
+        types = dict.fromkeys(headers, pa.string())
+        integer_columns = [header for header in headers if ((column_names or {}).get(header) or '').lower() == 'integer']
+        if integer_columns:
+            quoted = ['"%s"' % column.replace('"', '""') for column in integer_columns]
+            stored = conn.execute('SELECT %s FROM Good_Raw_Data' % ', '.join(
+                "max(typeof({0}) = 'real'), max(typeof({0}) = 'text')".format(column) for column in quoted)).fetchone()
+            na_values = ', '.join("'%s'" % value.replace("'", "''") for value in sorted(NA_VALUES))
+            for i, (header, column) in enumerate(zip(integer_columns, quoted)):
+                has_real, has_text = stored[2 * i], stored[2 * i + 1]
+                if has_text:
+                    has_text = conn.execute("SELECT 1 FROM Good_Raw_Data WHERE typeof({0}) = 'text' AND {0} NOT IN ({1}) LIMIT 1".format(
+                        column, na_values)).fetchone()
+                types[header] = pa.string() if has_text else pa.float64() if has_real else pa.int64()
+        return pa.schema([(header, types[header]) for header in headers])
+
+    def arrowColumn(self, values, arrow_type):
+        """
+        Returns the values of a column as an Arrow array of the given type, see arrowSchema.
+
+        """
+        if arrow_type != pa.string():
+            try:
+                return pa.array(values, type=arrow_type)
+            except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+                # the only text of a numeric column is a missing value spelling, e.g. 'nan' stored
+                # by rows inserted before the values were typed
+                return pa.array([None if value.__class__ is str else value for value in values], type=arrow_type)
+        return pa.array([None if value in NA_VALUES else value for value in map(str, values)], type=pa.string())  # None is 'None'
+
+    def exportRate(self, rows, start):
+        elapsed = time.perf_counter() - start
+        return "%d rows in %.2f s (%.0f rows/s)" % (rows, elapsed, rows / elapsed if elapsed else 0)
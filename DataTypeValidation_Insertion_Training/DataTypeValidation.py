@@ -4,7 +4,17 @@ from datetime import datetime
 from os import listdir
 import os
 import csv
-from application_logging.logger import App_Logger
+import hashlib
+import time
+from itertools import islice
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # the Parquet export is optional, the data is exported as CSV without pyarrow
+    pa = pq = None
+from application_logging.logger import App_Logger, DEBUG
+from data_ingestion.connection_manager import Connection_Manager
+from Training_Raw_data_validation.rawValidation import NA_VALUES
 
 class dBOperation:
     """
@@ -16,10 +26,12 @@ class dBOperation:
         self.badFilePath = "Training_Raw_files_validated/Bad_Raw"
         self.goodFilePath = "Training_Raw_files_validated/Good_Raw"
         self.logger = App_Logger()
+        self.connections = Connection_Manager(self.logger, "Training_Logs/DataBaseConnectionLog.txt")
 
     def dataBaseConnection(self, DatabaseName):
         """
-        Creates or connects to a database with the given name.
+        Returns the connection to the database with the given name. It is opened (and the database
+        created) on first use, then reused by every operation until close is called.
 
         Args:
             DatabaseName (str): The name of the database.
@@ -31,138 +43,469 @@ class dBOperation:
             ConnectionError: If there is an error connecting to the database.
         """
         try:
-            conn = sqlite3.connect(self.path + DatabaseName + '.db')
-            file = open("Training_Logs/DataBaseConnectionLog.txt", 'a+')
-            self.logger.log(file, "Opened %s database successfully" % DatabaseName)
-            file.close()
-        except ConnectionError:
-            file = open("Training_Logs/DataBaseConnectionLog.txt", 'a+')
-            self.logger.log(file, "Error while connecting to database: %s" % ConnectionError)
-            file.close()
-            raise ConnectionError
+            conn = self.connections.connect(self.path + DatabaseName + '.db')
+        except sqlite3.Error as e:
+            self.logger.log("Training_Logs/DataBaseConnectionLog.txt", "Error while connecting to database: %s" % e)
+            raise ConnectionError(e)
         return conn
 
-    def createTableDb(self, DatabaseName, column_names):
+    def readerConnection(self, DatabaseName):
         """
-        Creates a table in the given database to insert the Good data after raw data validation.
+        Opens a read-only connection to the database with the given name, which can read while the
+        connection of dataBaseConnection writes. The caller closes it.
+
+        Args:
+            DatabaseName (str): The name of the database.
+
+        Returns:
+            sqlite3.Connection: Read-only connection to the database.
+
+        Raises:
+            ConnectionError: If there is an error connecting to the database.
+        """
+        try:
+            return self.connections.reader(self.path + DatabaseName + '.db')
+        except sqlite3.Error as e:
+            self.logger.log("Training_Logs/DataBaseConnectionLog.txt", "Error while connecting to database: %s" % e)
+            raise ConnectionError(e)
+
+    def close(self):
+        """
+        Closes the connections opened by dataBaseConnection, at the end of a pipeline run.
+
+        """
+        self.connections.close()
+
+    def createTableDb(self, DatabaseName, column_names, force_reload=False, unique_key=None):
+        """
+        Creates a table in the given database to insert the Good data after raw data validation, and
+        the Ingestion_Manifest table recording the batch files already loaded into it.
 
         Args:
             DatabaseName (str): The name of the database.
             column_names (dict): A dictionary of column names and their data types.
+            force_reload (bool): Drops both tables first, so every batch file is loaded again.
+            unique_key (str): The column of the unique index of the table, if any.
 
         Raises:
             Exception: If there is an error while creating the table.
         """
         try:
             conn = self.dataBaseConnection(DatabaseName)
-            c = conn.cursor()
-            c.execute("SELECT count(name)  FROM sqlite_master WHERE type = 'table'AND name = 'Good_Raw_Data'")
-            if c.fetchone()[0] == 1:
-                conn.close()
-                file = open("Training_Logs/DbTableCreateLog.txt", 'a+')
-                self.logger.log(file, "Tables created successfully!!")
-                file.close()
+            if force_reload:
+                conn.execute('DROP TABLE IF EXISTS Good_Raw_Data')
+                conn.execute('DROP TABLE IF EXISTS Ingestion_Manifest')
+                self.logger.log("Training_Logs/DbTableCreateLog.txt", "Forced reload, existing data dropped!!")
+            # the rows of a file are inserted in one transaction by the only writer, so they get
+            # the consecutive rowids first_row to last_row
+            conn.execute('CREATE TABLE IF NOT EXISTS Ingestion_Manifest (file_name TEXT PRIMARY KEY, size INTEGER, '
+                         'content_hash TEXT, loaded_at TEXT, first_row INTEGER, last_row INTEGER)')
+            # kept across runs, the good data of every run is added to it
+            conn.execute(self.createTableQuery(column_names))
+            self.createUniqueIndex(conn, unique_key)
+            self.logger.log("Training_Logs/DbTableCreateLog.txt", "Tables created successfully!!")
 
-                file = open("Training_Logs/DataBaseConnectionLog.txt", 'a+')
-                self.logger.log(file, "Closed %s database successfully" % DatabaseName)
-                file.close()
-
-            else:
+        except Exception as e:
+            self.logger.log("Training_Logs/DbTableCreateLog.txt", "Error while creating table: %s " % e)
+            raise e
 
-                for key in column_names.keys():
-                    type = column_names[key]
+    def createTableQuery(self, column_names):
+        """
+        Returns the statement creating the Good_Raw_Data table with the columns of the schema.
 
-                    try:
-                        conn.execute('ALTER TABLE Good_Raw_Data ADD COLUMN "{column_name}" {dataType}'.format(column_name=key, dataType=type))
-                    except:
-                        conn.execute('CREATE TABLE  Good_Raw_Data ({column_name} {dataType})'.format(column_name=key, dataType=type))
+        """
+        return 'CREATE TABLE IF NOT EXISTS Good_Raw_Data ({columns})'.format(
+            columns=', '.join('"%s" %s' % (column.replace('"', '""'), type) for column, type in column_names.items()))
 
-                conn.close()
+    def skipLoadedFiles(self, Database):
+        """
+        Compares the files of the Good_Raw folder with the Ingestion_Manifest table and removes the
+        ones already loaded with the same size and content hash, so they are neither validated nor
+        inserted again.
 
-                file = open("Training_Logs/DbTableCreateLog.txt", 'a+')
-                self.logger.log(file, "Tables created successfully!!")
-                file.close()
+        Args:
+            Database (str): The name of the database.
 
-                file = open("Training_Logs/DataBaseConnectionLog.txt", 'a+')
-                self.logger.log(file, "Closed %s database successfully" % DatabaseName)
-                file.close()
+        Returns:
+            dict: The size and content hash of every new or modified file left in the Good_Raw folder.
+        """
+        conn = self.dataBaseConnection(Database)
+        files = {}
+        for file in sorted(listdir(self.goodFilePath)):
+            path = self.goodFilePath + '/' + file
+            size, content_hash = os.path.getsize(path), self.fileHash(path)
+            loaded = conn.execute('SELECT size, content_hash, loaded_at FROM Ingestion_Manifest WHERE file_name = ?', (file,)).fetchone()
+            if loaded is not None and loaded[:2] == (size, content_hash):
+                os.remove(path)
+                self.logger.log("Training_Logs/DbInsertLog.txt", " %s: File unchanged since it was loaded at %s, skipped" % (file, loaded[2]), level=DEBUG)
+            else:
+                files[file] = (size, content_hash)
+                self.logger.log("Training_Logs/DbInsertLog.txt", " %s: %s file to load" % (file, 'New' if loaded is None else 'Modified'), level=DEBUG)
+        return files
 
-        except Exception as e:
-            file = open("Training_Logs/DbTableCreateLog.txt", 'a+')
-            self.logger.log(file, "Error while creating table: %s " % e)
-            file.close()
-            conn.close()
-            file = open("Training_Logs/DataBaseConnectionLog.txt", 'a+')
-            self.logger.log(file, "Closed %s database successfully" % DatabaseName)
-            file.close()
-            raise e
+    def fileHash(self, path):
+        content_hash = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                content_hash.update(block)
+        return content_hash.hexdigest()
 
-    def insertIntoTableGoodData(self, Database):
+    def insertIntoTableGoodData(self, Database, chunksize=10000, files=None, column_names=None, unique_key=None, manifest=None):
         """
         Inserts the Good data files from the Good_Raw folder into the created table.
 
+        Each file is loaded with parameterized executemany calls of at most chunksize rows inside a
+        single transaction, so a malformed file is rolled back and moved to the Bad_Raw folder as a whole.
+        The Ingestion_Manifest entry of a file is written in the same transaction, and the rows of the
+        previous version of a modified file are deleted in it.
+
         Args:
             Database (str): The name of the database.
+            chunksize (int): The number of rows sent to the database per executemany call.
+            files (iterable): The names of the files to insert, in order. Defaults to every file of the
+                              Good_Raw folder, in name order. It can be fed while the files are still
+                              being validated, as this method is the only writer of the database.
+            column_names (dict): The column names and types of the schema. The values of the Integer
+                                 columns are bound as integers (floats if they have decimals), the
+                                 others as text, and missing values as NULL.
+            manifest (dict): The size and content hash of the files to record in Ingestion_Manifest,
+                             as returned by skipLoadedFiles. Other files are not recorded.
+
+            unique_key (str): The column of the unique index of the table. A row whose key is already in
+                              the table updates it, or is skipped if it has the same values, so the
+                              table holds one row per key however often a row is loaded.
+
+        Returns:
+            int: The number of rows loaded (inserted, updated or skipped).
         """
         conn = self.dataBaseConnection(Database)
+        manifest = manifest or {}
         goodFilePath = self.goodFilePath
         badFilePath = self.badFilePath
-        onlyfiles = [f for f in listdir(goodFilePath)]
-        log_file = open("Training_Logs/DbInsertLog.txt", 'a+')
+        onlyfiles = sorted(listdir(goodFilePath)) if files is None else files
+        total_rows = 0
+        counts = {'inserted': 0, 'updated': 0, 'skipped': 0}
 
         for file in onlyfiles:
             try:
-                with open(goodFilePath+'/'+file, "r") as f:
-                    next(f)
-                    reader = csv.reader(f, delimiter="\n")
-                    for line in enumerate(reader):
-                        for list_ in (line[1]):
-                            try:
-                                conn.execute('INSERT INTO Good_Raw_Data values ({values})'.format(values=(list_)))
-                                self.logger.log(log_file, " %s: File loaded successfully!!" % file)
-                                conn.commit()
-                            except Exception as e:
-                                raise e
+                rows = 0
+                with open(goodFilePath + '/' + file, "r", newline='') as f:
+                    reader = csv.reader(f)
+                    header = next(reader)
+                    converters = [self.valueConverter((column_names or {}).get(column)) for column in header]
+                    query = self.insertQuery(header, unique_key)
+                    with conn:  # commits the whole file at once, rolls it back on any error
+                        if file in manifest:
+                            self.deleteLoadedRows(conn, file)
+                        last_row = conn.execute('SELECT coalesce(max(rowid), 0) FROM Good_Raw_Data').fetchone()[0]
+                        changes = conn.total_changes
+                        for chunk in self.rowsInChunks(reader, converters, chunksize):
+                            conn.executemany(query, chunk)
+                            rows += len(chunk)
+                        file_counts = self.loadCounts(conn, last_row, rows, conn.total_changes - changes)
+                        if file in manifest:
+                            row_range = (None, None) if unique_key else (last_row + 1, last_row + rows)
+                            conn.execute('INSERT OR REPLACE INTO Ingestion_Manifest VALUES (?, ?, ?, ?, ?, ?)',
+                                         (file,) + manifest[file] + (datetime.now().isoformat(timespec='seconds'),) + row_range)
+                self.logger.log("Training_Logs/DbInsertLog.txt", " %s: File loaded successfully!! %d rows inserted, %d updated, %d skipped" % (
+                    (file,) + tuple(file_counts.values())), level=DEBUG)
+                total_rows += rows
+                for count in counts:
+                    counts[count] += file_counts[count]
 
             except Exception as e:
                 conn.rollback()
-                self.logger.log(log_file, "Error while creating table: %s " % e)
-                shutil.move(goodFilePath+'/' + file, badFilePath)
-                self.logger.log(log_file, "File Moved Successfully %s" % file)
-                log_file.close()
-                conn.close()
+                self.logger.log("Training_Logs/DbInsertLog.txt", "Error while inserting file %s: %s " % (file, e))
+                shutil.move(goodFilePath + '/' + file, badFilePath)
+                self.logger.log("Training_Logs/DbInsertLog.txt", "File Moved Successfully %s" % file, level=DEBUG)
+        self.logger.log("Training_Logs/DbInsertLog.txt", "All files loaded!! %d rows inserted, %d updated, %d skipped" % tuple(counts.values()))
+        return total_rows
+
+    def loadCounts(self, conn, last_row, rows, changes):
+        """
+        Splits the rows of a file into the ones inserted, updated and skipped. The inserted rows are
+        the ones with a rowid after last_row, the largest before the file was loaded, and every row
+        inserted or updated is one change of the connection.
+
+        """
+        inserted = conn.execute('SELECT count(*) FROM Good_Raw_Data WHERE rowid > ?', (last_row,)).fetchone()[0]
+        return {'inserted': inserted, 'updated': changes - inserted, 'skipped': rows - changes}
+
+    def deleteLoadedRows(self, conn, file):
+        """
+        Deletes the rows loaded from a previous version of the file, if any.
+
+        """
+        loaded = conn.execute('SELECT first_row, last_row FROM Ingestion_Manifest WHERE file_name = ?', (file,)).fetchone()
+        if loaded is not None and loaded[0] is not None:  # no row range once the table has a unique key
+            deleted = conn.execute('DELETE FROM Good_Raw_Data WHERE rowid BETWEEN ? AND ?', loaded).rowcount
+            self.logger.log("Training_Logs/DbInsertLog.txt", " %s: %d rows of the previous version of the file deleted" % (file, deleted), level=DEBUG)
+
+    def createUniqueIndex(self, conn, unique_key):
+        """
+        Creates the unique index of the table on the unique_key column if it does not exist yet,
+        keeping only the last inserted row of every key already in the table. Does nothing without
+        a unique_key.
+
+        """
+        if unique_key is None:
+            return
+        index = 'Good_Raw_Data_%s_key' % unique_key
+        if conn.execute("SELECT count(name) FROM sqlite_master WHERE type = 'index' AND name = ?", (index,)).fetchone()[0]:
+            return
+        column = '"%s"' % unique_key.replace('"', '""')
+        with conn:
+            duplicates = conn.execute('DELETE FROM Good_Raw_Data WHERE {0} IS NOT NULL AND rowid NOT IN '
+                                      '(SELECT max(rowid) FROM Good_Raw_Data GROUP BY {0})'.format(column)).rowcount
+            conn.execute('CREATE UNIQUE INDEX "{0}" ON Good_Raw_Data ({1})'.format(index.replace('"', '""'), column))
+            # the rows of the files are no longer consecutive once they update each other
+            conn.execute('UPDATE Ingestion_Manifest SET first_row = NULL, last_row = NULL')
+        self.logger.log("Training_Logs/DbTableCreateLog.txt", "Unique index on %s created, %d duplicate rows removed" % (unique_key, duplicates))
+
+    def insertQuery(self, header, unique_key=None):
+        """
+        Returns the statement inserting a row of the given columns. With a unique_key column, a row
+        whose key is already in the table updates it instead, unless all its values are the same.
+
+        """
+        columns = ['"%s"' % column.replace('"', '""') for column in header]
+        query = 'INSERT INTO Good_Raw_Data ({columns}) values ({placeholders})'.format(
+            columns=', '.join(columns), placeholders=', '.join(['?'] * len(header)))
+        if unique_key in header:
+            others = [column for name, column in zip(header, columns) if name != unique_key]
+            query += ' ON CONFLICT ({key}) DO UPDATE SET {values} WHERE {changed}'.format(
+                key=columns[header.index(unique_key)],
+                values=', '.join('{0} = excluded.{0}'.format(column) for column in others),
+                changed=' OR '.join('{0} IS NOT excluded.{0}'.format(column) for column in others))
+        return query
+
+    def rowsInChunks(self, reader, converters, chunksize):
+        """
+        Yields the rows of a csv reader as lists of at most chunksize parameter tuples.
+
+        The values are converted a column at a time, so the common case (a column of well formed
+        integers, or of text) is converted by a single C-level pass instead of a call per value.
+
+        Args:
+            reader (csv.reader): The reader positioned after the header.
+            converters (list): The function converting the values of each column to their bound values.
+            chunksize (int): The maximum number of rows per chunk.
 
-        conn.close()
-        log_file.close()
+        Raises:
+            ValueError: If a row does not have a value for every column.
+        """
+        while True:
+            rows = list(islice(reader, chunksize))
+            if not rows:
+                return
+            rows = [row for row in rows if row]  # skip blank lines
+            if any(len(row) != len(converters) for row in rows):
+                raise ValueError('Row with a number of values different from the %d columns' % len(converters))
+            if rows:
+                yield list(zip(*[convert(column) for convert, column in zip(converters, zip(*rows))]))
+
+    def valueConverter(self, column_type):
+        """
+        Returns the function converting the csv values of a column of the given schema type to the
+        values bound in the insert statement.
 
-    def selectingDatafromtableintocsv(self, Database):
+        """
+        if column_type is not None and column_type.lower() == 'integer':
+            return self.integerValues
+        return self.textValues
+
+    def textValues(self, values):
+        return [None if value in NA_VALUES else value for value in values]
+
+    def integerValues(self, values):
+        try:
+            return list(map(int, values))
+        except ValueError:
+            pass
+        try:
+            return list(map(float, values))
+        except ValueError:
+            return [self.integerValue(value) for value in values]
+
+    def integerValue(self, value):
+        if value in NA_VALUES:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            try:
+                return float(value)
+            except ValueError:
+                return value  # e.g. '?', stored as text as the column affinity would do
+
+    def selectingDatafromtableintocsv(self, Database, chunksize=10000):
         """
         Exports the data in GoodData table as a CSV file in a given location.
 
+        The rows are streamed from the cursor to the file chunksize rows at a time, so the memory used
+        does not grow with the table.
+
         Args:
             Database (str): The name of the database.
+            chunksize (int): The number of rows fetched from the database at a time.
+
+        Returns:
+            int: The number of rows exported.
         """
         self.fileFromDb = 'Training_FileFromDB/'
         self.fileName = 'InputFile.csv'
-        log_file = open("Training_Logs/ExportToCsv.txt", 'a+')
+        conn = None
         try:
-            conn = self.dataBaseConnection(Database)
+            conn = self.readerConnection(Database)  # does not block a writer
+            start = time.perf_counter()
             sqlSelect = "SELECT *  FROM Good_Raw_Data"
             cursor = conn.cursor()
             cursor.execute(sqlSelect)
-            results = cursor.fetchall()
             headers = [i[0] for i in cursor.description]
 
             if not os.path.isdir(self.fileFromDb):
                 os.makedirs(self.fileFromDb)
 
-            csvFile = csv.writer(open(self.fileFromDb + self.fileName, 'w', newline=''), delimiter=',', lineterminator='\r\n', quoting=csv.QUOTE_ALL, escapechar='\\')
-            csvFile.writerow(headers)
-            csvFile.writerows(results)
+            rows = 0
+            # written next to the target and renamed, so a reader never sees a partial file
+            with open(self.fileFromDb + self.fileName + '.tmp', 'w', newline='') as f:
+                csvFile = csv.writer(f, delimiter=',', lineterminator='\r\n', quoting=csv.QUOTE_ALL, escapechar='\\')
+                csvFile.writerow(headers)
+                for results in iter(lambda: cursor.fetchmany(chunksize), []):
+                    csvFile.writerows(results)
+                    rows += len(results)
+            os.replace(self.fileFromDb + self.fileName + '.tmp', self.fileFromDb + self.fileName)
 
-            self.logger.log(log_file, "File exported successfully!!!")
-            log_file.close()
+            self.logger.log("Training_Logs/ExportToCsv.txt", "File exported successfully!!! %s" % self.exportRate(rows, start))
+            return rows
 
         except Exception as e:
-            self.logger.log(log_file, "File exporting failed. Error : %s" %e)
-            log_file.close()
+            self.logger.log("Training_Logs/ExportToCsv.txt", "File exporting failed. Error : %s" % e)
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def exportGoodData(self, Database, column_names=None, export_format='parquet'):
+        """
+        Exports the data in GoodData table for the training pipeline: as a Parquet file typed from the
+        schema if export_format is 'parquet' and pyarrow is installed, as a CSV file otherwise. The
+        export of the other format is removed, so the data loader never reads a stale file.
+
+        Args:
+            Database (str): The name of the database.
+            column_names (dict): The column names and types of the schema.
+            export_format (str): 'parquet' or 'csv'.
+
+        Returns:
+            int: The number of rows exported.
+        """
+        if export_format == 'parquet' and pq is None:
+            self.logger.log("Training_Logs/ExportToCsv.txt", "pyarrow is not installed, exporting CSV instead of Parquet")
+        if export_format == 'parquet' and pq is not None:
+            rows = self.selectingDatafromtableintoparquet(Database, column_names)
+            stale_file = 'Training_FileFromDB/InputFile.csv'
+        else:
+            rows = self.selectingDatafromtableintocsv(Database)
+            stale_file = 'Training_FileFromDB/InputFile.parquet'
+        if rows is not None and os.path.exists(stale_file):
+            os.remove(stale_file)
+        return rows
+
+    def exportedFile(self, export_format='parquet'):
+        """
+        Returns the path of the file exportGoodData writes for the given format.
+
+        """
+        if export_format == 'parquet' and pq is not None:
+            return 'Training_FileFromDB/InputFile.parquet'
+        return 'Training_FileFromDB/InputFile.csv'
+
+    def selectingDatafromtableintoparquet(self, Database, column_names=None, chunksize=10000):
+        """
+        Exports the data in GoodData table as a Parquet file in a given location. The Integer columns
+        of the schema are stored as integers (floats if they have decimals) and the others as strings,
+        so the loader reads every column with its type instead of inferring it from text.
+
+        The rows are streamed from the cursor to the file chunksize rows at a time, one row group per
+        chunk, so the memory used does not grow with the table.
+
+        Args:
+            Database (str): The name of the database.
+            column_names (dict): The column names and types of the schema.
+            chunksize (int): The number of rows fetched from the database at a time.
+
+        Returns:
+            int: The number of rows exported.
+        """
+        self.fileFromDb = 'Training_FileFromDB/'
+        self.fileName = 'InputFile.parquet'
+        conn = None
+        try:
+            conn = self.readerConnection(Database)  # does not block a writer
+            start = time.perf_counter()
+            cursor = conn.execute("SELECT *  FROM Good_Raw_Data")
+            headers = [i[0] for i in cursor.description]
+            schema = self.arrowSchema(conn, headers, column_names)
+
+            if not os.path.isdir(self.fileFromDb):
+                os.makedirs(self.fileFromDb)
+
+            rows = 0
+            # written next to the target and renamed, so a reader never sees a partial file
+            with pq.ParquetWriter(self.fileFromDb + self.fileName + '.tmp', schema) as writer:
+                for results in iter(lambda: cursor.fetchmany(chunksize), []):
+                    writer.write_table(pa.table([self.arrowColumn(values, field.type) for field, values in zip(schema, zip(*results))],
+                                                schema=schema))
+                    rows += len(results)
+            os.replace(self.fileFromDb + self.fileName + '.tmp', self.fileFromDb + self.fileName)
+
+            self.logger.log("Training_Logs/ExportToCsv.txt", "File exported successfully as Parquet!!! %s" % self.exportRate(rows, start))
+            return rows
+
+        except Exception as e:
+            self.logger.log("Training_Logs/ExportToCsv.txt", "File exporting failed. Error : %s" % e)
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def arrowSchema(self, conn, headers, column_names):
+        """
+        Returns the Arrow schema of the export. A column is a string column unless the schema types it
+        Integer; an Integer column is float64 if it stores a decimal, int64 otherwise, and string if it
+        stores text that is not a missing value spelling ('?' for instance). The stored types are found
+        by one aggregate query before any row is written, and the text of the few columns storing some
+        by one more query each.
+
+        """
+        types = dict.fromkeys(headers, pa.string())
+        integer_columns = [header for header in headers if ((column_names or {}).get(header) or '').lower() == 'integer']
+        if integer_columns:
+            quoted = ['"%s"' % column.replace('"', '""') for column in integer_columns]
+            stored = conn.execute('SELECT %s FROM Good_Raw_Data' % ', '.join(
+                "max(typeof({0}) = 'real'), max(typeof({0}) = 'text')".format(column) for column in quoted)).fetchone()
+            na_values = ', '.join("'%s'" % value.replace("'", "''") for value in sorted(NA_VALUES))
+            for i, (header, column) in enumerate(zip(integer_columns, quoted)):
+                has_real, has_text = stored[2 * i], stored[2 * i + 1]
+                if has_text:
+                    has_text = conn.execute("SELECT 1 FROM Good_Raw_Data WHERE typeof({0}) = 'text' AND {0} NOT IN ({1}) LIMIT 1".format(
+                        column, na_values)).fetchone()
+                types[header] = pa.string() if has_text else pa.float64() if has_real else pa.int64()
+        return pa.schema([(header, types[header]) for header in headers])
+
+    def arrowColumn(self, values, arrow_type):
+        """
+        Returns the values of a column as an Arrow array of the given type, see arrowSchema.
+
+        """
+        if arrow_type != pa.string():
+            try:
+                return pa.array(values, type=arrow_type)
+            except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+                # the only text of a numeric column is a missing value spelling, e.g. 'nan' stored
+                # by rows inserted before the values were typed
+                return pa.array([None if value.__class__ is str else value for value in values], type=arrow_type)
+        return pa.array([None if value in NA_VALUES else value for value in map(str, values)], type=pa.string())  # None is 'None'
+
+    def exportRate(self, rows, start):
+        elapsed = time.perf_counter() - start
+        return "%d rows in %.2f s (%.0f rows/s)" % (rows, elapsed, rows / elapsed if elapsed else 0)
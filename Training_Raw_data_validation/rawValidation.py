@@ -5,8 +5,45 @@ import os
 import re
 import json
 import shutil
-import pandas as pd
-from application_logging.logger import App_Logger
+import csv
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from application_logging.logger import App_Logger, DEBUG
+
+# the values pandas reads as missing by default
+NA_VALUES = frozenset(['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+                       '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'])
+
+
+def validate_file(path, NumberofColumns):
+    """
+    Streams one raw file once and checks it (see validateFiles). It runs in a worker process,
+    so it takes and returns plain values.
+
+    Returns:
+        tuple: The number of data rows, and None or the reason the file is invalid.
+
+    """
+    with open(path, 'r', newline='') as source:
+        reader = csv.reader(source)
+        header = next(reader, [])
+        if len(header) != NumberofColumns:
+            return 0, 'Invalid Column Length'
+        # the columns with only missing values so far; once a column has a value it is not looked at again
+        missing_columns = range(len(header))
+        rows = 0
+        for row in reader:
+            if not row:
+                continue  # blank line
+            if len(row) != len(header):
+                return rows, 'Invalid Row Length at row %d' % (rows + 1)
+            if missing_columns:
+                missing_columns = [i for i in missing_columns if row[i] in NA_VALUES]
+            rows += 1
+    if missing_columns:
+        return rows, 'Missing values in whole column'
+    return rows, None
+
 
 class Raw_Data_validation:
     """
@@ -48,27 +85,32 @@ class Raw_Data_validation:
             column_names = dic['ColName']
             NumberofColumns = dic['NumberofColumns']
 
-            file = open("Training_Logs/valuesfromSchemaValidationLog.txt", 'a+')
             message = "LengthOfDateStampInFile:: %s" % LengthOfDateStampInFile + "\t" + "LengthOfTimeStampInFile:: %s" % LengthOfTimeStampInFile + "\t " + "NumberofColumns:: %s" % NumberofColumns + "\n"
-            self.logger.log(file, message)
-            file.close()
+            self.logger.log("Training_Logs/valuesfromSchemaValidationLog.txt", message)
         except ValueError:
-            file = open("Training_Logs/valuesfromSchemaValidationLog.txt", 'a+')
-            self.logger.log(file, "ValueError: Value not found inside schema_training.json")
-            file.close()
+            self.logger.log("Training_Logs/valuesfromSchemaValidationLog.txt", "ValueError: Value not found inside schema_training.json")
             raise ValueError
         except KeyError:
-            file = open("Training_Logs/valuesfromSchemaValidationLog.txt", 'a+')
-            self.logger.log(file, "KeyError: Incorrect key value error")
-            file.close()
+            self.logger.log("Training_Logs/valuesfromSchemaValidationLog.txt", "KeyError: Incorrect key value error")
             raise KeyError
         except Exception as e:
-            file = open("Training_Logs/valuesfromSchemaValidationLog.txt", 'a+')
-            self.logger.log(file, str(e))
-            file.close()
+            self.logger.log("Training_Logs/valuesfromSchemaValidationLog.txt", str(e))
             raise e
         return LengthOfDateStampInFile, LengthOfTimeStampInFile, column_names, NumberofColumns
 
+    def uniqueKeyFromSchema(self):
+        """
+        Extract the column identifying a row from the schema file.
+
+        Returns:
+            str: The UniqueKey column, or None if the schema has none.
+
+        """
+        with open(self.schema_path, 'r') as f:
+            unique_key = json.load(f).get('UniqueKey')
+        self.logger.log("Training_Logs/valuesfromSchemaValidationLog.txt", "UniqueKey:: %s" % unique_key)
+        return unique_key
+
     def manualRegexCreation(self):
         """
         Manually create a regex pattern for validating file names.
@@ -96,9 +138,7 @@ class Raw_Data_validation:
             if not os.path.isdir(path):
                 os.makedirs(path)
         except OSError as ex:
-            file = open("Training_Logs/GeneralLog.txt", 'a+')
-            self.logger.log(file, "Error while creating Directory %s:" % ex)
-            file.close()
+            self.logger.log("Training_Logs/GeneralLog.txt", "Error while creating Directory %s:" % ex)
             raise OSError
 
     def deleteExistingGoodDataTrainingFolder(self):
@@ -113,13 +153,9 @@ class Raw_Data_validation:
             path = 'Training_Raw_files_validated/'
             if os.path.isdir(path + 'Good_Raw/'):
                 shutil.rmtree(path + 'Good_Raw/')
-                file = open("Training_Logs/GeneralLog.txt", 'a+')
-                self.logger.log(file, "GoodRaw directory deleted successfully!!!")
-                file.close()
+                self.logger.log("Training_Logs/GeneralLog.txt", "GoodRaw directory deleted successfully!!!")
         except OSError as s:
-            file = open("Training_Logs/GeneralLog.txt", 'a+')
-            self.logger.log(file, "Error while Deleting Directory : %s" % s)
-            file.close()
+            self.logger.log("Training_Logs/GeneralLog.txt", "Error while Deleting Directory : %s" % s)
             raise OSError
 
     def deleteExistingBadDataTrainingFolder(self):
@@ -134,13 +170,9 @@ class Raw_Data_validation:
             path = 'Training_Raw_files_validated/'
             if os.path.isdir(path + 'Bad_Raw/'):
                 shutil.rmtree(path + 'Bad_Raw/')
-                file = open("Training_Logs/GeneralLog.txt", 'a+')
-                self.logger.log(file, "BadRaw directory deleted before starting validation!!!")
-                file.close()
+                self.logger.log("Training_Logs/GeneralLog.txt", "BadRaw directory deleted before starting validation!!!")
         except OSError as s:
-            file = open("Training_Logs/GeneralLog.txt", 'a+')
-            self.logger.log(file, "Error while Deleting Directory : %s" % s)
-            file.close()
+            self.logger.log("Training_Logs/GeneralLog.txt", "Error while Deleting Directory : %s" % s)
             raise OSError
 
     def moveBadFilesToArchiveBad(self):
@@ -167,17 +199,13 @@ class Raw_Data_validation:
                 for f in files:
                     if f not in os.listdir(dest):
                         shutil.move(source + f, dest)
-                file = open("Training_Logs/GeneralLog.txt", 'a+')
-                self.logger.log(file, "Bad files moved to archive")
+                self.logger.log("Training_Logs/GeneralLog.txt", "Bad files moved to archive")
                 path = 'Training_Raw_files_validated/'
                 if os.path.isdir(path + 'Bad_Raw/'):
                     shutil.rmtree(path + 'Bad_Raw/')
-                self.logger.log(file, "Bad Raw Data Folder Deleted successfully!!")
-                file.close()
+                self.logger.log("Training_Logs/GeneralLog.txt", "Bad Raw Data Folder Deleted successfully!!")
         except OSError as e:
-            file = open("Training_Logs/GeneralLog.txt", 'a+')
-            self.logger.log(file, "Error while moving bad files to archive:: %s" % e)
-            file.close()
+            self.logger.log("Training_Logs/GeneralLog.txt", "Error while moving bad files to archive:: %s" % e)
             raise e
 
     def validationFileNameRaw(self, regex, LengthOfDateStampInFile, LengthOfTimeStampInFile):
@@ -200,7 +228,6 @@ class Raw_Data_validation:
         self.createDirectoryForGoodBadRawData()
         onlyfiles = [f for f in listdir(self.Batch_Directory)]
         try:
-            f = open("Training_Logs/nameValidationLog.txt", 'a+')
             for filename in onlyfiles:
                 if (re.match(regex, filename)):
                     splitAtDot = re.split('.csv', filename)
@@ -208,91 +235,73 @@ class Raw_Data_validation:
                     if len(splitAtDot[1]) == LengthOfDateStampInFile:
                         if len(splitAtDot[2]) == LengthOfTimeStampInFile:
                             shutil.copy("Training_Batch_Files/" + filename, "Training_Raw_files_validated/Good_Raw")
-                            self.logger.log(f, "Valid File name!! File moved to GoodRaw Folder :: %s" % filename)
+                            self.logger.log("Training_Logs/nameValidationLog.txt", "Valid File name!! File moved to GoodRaw Folder :: %s" % filename, level=DEBUG)
                         else:
                             shutil.copy("Training_Batch_Files/" + filename, "Training_Raw_files_validated/Bad_Raw")
-                            self.logger.log(f, "Invalid File Name!! File moved to Bad Raw Folder :: %s" % filename)
+                            self.logger.log("Training_Logs/nameValidationLog.txt", "Invalid File Name!! File moved to Bad Raw Folder :: %s" % filename, level=DEBUG)
                     else:
                         shutil.copy("Training_Batch_Files/" + filename, "Training_Raw_files_validated/Bad_Raw")
-                        self.logger.log(f, "Invalid File Name!! File moved to Bad Raw Folder :: %s" % filename)
+                        self.logger.log("Training_Logs/nameValidationLog.txt", "Invalid File Name!! File moved to Bad Raw Folder :: %s" % filename, level=DEBUG)
                 else:
                     shutil.copy("Training_Batch_Files/" + filename, "Training_Raw_files_validated/Bad_Raw")
-                    self.logger.log(f, "Invalid File Name!! File moved to Bad Raw Folder :: %s" % filename)
-            f.close()
+                    self.logger.log("Training_Logs/nameValidationLog.txt", "Invalid File Name!! File moved to Bad Raw Folder :: %s" % filename, level=DEBUG)
         except Exception as e:
-            f = open("Training_Logs/nameValidationLog.txt", 'a+')
-            self.logger.log(f, "Error occurred while validating FileName %s" % e)
-            f.close()
+            self.logger.log("Training_Logs/nameValidationLog.txt", "Error occurred while validating FileName %s" % e)
             raise e
 
-    def validateColumnLength(self, NumberofColumns):
+    def validateFiles(self, NumberofColumns, n_workers=1, valid_file_callback=None):
         """
-        Validate the number of columns in the CSV files.
+        Validates every file of the Good_Raw folder in a single streaming pass.
+
+        While a file is read row by row, the column count of its header and of every row is
+        checked and the columns that have no value yet are tracked. A file with a wrong column
+        count, a malformed row or a column whose values are all missing is moved to the Bad_Raw
+        folder. The files are not rewritten: the values are typed and missing values mapped to
+        NULL when they are inserted.
+
+        The files are validated concurrently by n_workers processes. They are routed and reported in
+        file name order whatever the order the workers finish in, so the outcome is deterministic.
 
         Args:
             NumberofColumns (int): The expected number of columns.
+            n_workers (int): The number of processes validating files concurrently; 1 validates in this process.
+            valid_file_callback (callable): Called with the name of every valid file, in file name order,
+                                            as soon as it is validated, e.g. to start loading it.
 
         Raises:
-            OSError: If an error occurs during validation.
+            OSError: If an error occurs while moving a file.
             Exception: For any other exceptions.
 
         """
+        goodFilePath = 'Training_Raw_files_validated/Good_Raw/'
+        badFilePath = 'Training_Raw_files_validated/Bad_Raw'
         try:
-            f = open("Training_Logs/columnValidationLog.txt", 'a+')
-            self.logger.log(f, "Column Length Validation Started!!")
-            for file in listdir('Training_Raw_files_validated/Good_Raw/'):
-                csv = pd.read_csv("Training_Raw_files_validated/Good_Raw/" + file)
-                if csv.shape[1] == NumberofColumns:
-                    pass
+            self.logger.log("Training_Logs/columnValidationLog.txt", "Column Length and Missing Values Validation Started!!")
+            files = sorted(listdir(goodFilePath))
+            paths = [goodFilePath + file for file in files]
+            n_workers = max(1, min(n_workers, len(files)))
+            executor = ProcessPoolExecutor(max_workers=n_workers) if n_workers > 1 else None
+            try:
+                if executor is None:
+                    results = map(validate_file, paths, repeat(NumberofColumns))
                 else:
-                    shutil.move("Training_Raw_files_validated/Good_Raw/" + file, "Training_Raw_files_validated/Bad_Raw")
-                    self.logger.log(f, "Invalid Column Length for the file!! File moved to Bad Raw Folder :: %s" % file)
-            self.logger.log(f, "Column Length Validation Completed!!")
-        except OSError:
-            f = open("Training_Logs/columnValidationLog.txt", 'a+')
-            self.logger.log(f, "Error Occurred while moving the file")
-            f.close()
-            raise OSError
-        except Exception as e:
-            f = open("Training_Logs/columnValidationLog.txt", 'a+')
-            self.logger.log(f, "Error Occurred: %s" % e)
-            f.close()
-            raise e
-        f.close()
-
-    def validateMissingValuesInWholeColumn(self):
-        """
-        Validate if any column in the CSV files has all values missing.
-
-        Raises:
-            OSError: If an error occurs during validation.
-            Exception: For any other exceptions.
-
-        """
-        try:
-            f = open("Training_Logs/missingValuesInColumn.txt", 'a+')
-            self.logger.log(f, "Missing Values Validation Started!!")
-            for file in listdir('Training_Raw_files_validated/Good_Raw/'):
-                csv = pd.read_csv("Training_Raw_files_validated/Good_Raw/" + file)
-                count = 0
-                for columns in csv:
-                    if (len(csv[columns]) - csv[columns].count()) == len(csv[columns]):
-                        count += 1
-                        shutil.move("Training_Raw_files_validated/Good_Raw/" + file,
-                                    "Training_Raw_files_validated/Bad_Raw")
-                        self.logger.log(f, "Invalid Column Length for the file!! File moved to Bad Raw Folder :: %s" % file)
-                        break
-                if count == 0:
-                    csv.rename(columns={"Unnamed: 0": "Wafer"}, inplace=True)
-                    csv.to_csv("Training_Raw_files_validated/Good_Raw/" + file, index=None, header=True)
-        except OSError:
-            f = open("Training_Logs/missingValuesInColumn.txt", 'a+')
-            self.logger.log(f, "Error Occurred while moving the file")
-            f.close()
+                    # map yields the results in file order, a file waits only for the ones before it
+                    results = executor.map(validate_file, paths, repeat(NumberofColumns))
+                for file, (rows, problem) in zip(files, results):
+                    if problem is None:
+                        self.logger.log("Training_Logs/columnValidationLog.txt", " %s: File validated!! %d rows" % (file, rows), level=DEBUG)
+                        if valid_file_callback is not None:
+                            valid_file_callback(file)
+                    else:
+                        shutil.move(goodFilePath + file, badFilePath)
+                        self.logger.log("Training_Logs/columnValidationLog.txt", "%s for the file!! File moved to Bad Raw Folder :: %s" % (problem, file), level=DEBUG)
+            finally:
+                if executor is not None:
+                    executor.shutdown()
+            self.logger.log("Training_Logs/columnValidationLog.txt", "Column Length and Missing Values Validation Completed!!")
+        except OSError as e:
+            self.logger.log("Training_Logs/columnValidationLog.txt", "Error Occurred while moving the file :: %s" % e)
             raise OSError
         except Exception as e:
-            f = open("Training_Logs/missingValuesInColumn.txt", 'a+')
-            self.logger.log(f, "Error Occurred: %s" % e)
-            f.close()
+            self.logger.log("Training_Logs/columnValidationLog.txt", "Error Occurred:: %s" % e)
             raise e
-        f.close()
@@ -1,20 +1,193 @@
+import atexit
+import glob
+import gzip
+import os
+import queue
+import shutil
+import threading
 from datetime import datetime
 
+# log levels, a message below the level of the App_Logger is dropped
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVELS = {'DEBUG': DEBUG, 'INFO': INFO, 'WARNING': WARNING, 'ERROR': ERROR}
+
+
+class Log_Writer:
+    """
+    This class writes log lines from a background thread, so logging never waits on file I/O.
+
+    Lines are handed over through a queue and buffered per log file. The buffers are written
+    whenever the queue runs empty (or they grow over buffer_bytes) through one persistent handle
+    per log file, and a file is rotated once it grows over max_bytes: the full file is compressed
+    to <name>.<timestamp>.gz and only the backup_count most recent archives are kept.
+
+    Several processes (training workers, web server workers) append to the same log files and
+    each of them may rotate a file. Before every write the writer checks that its handle is still
+    the file at the path (same device and inode) and opens the path again if it was rotated or
+    removed by another process, so the lines do not go to a renamed or deleted file.
+
+    Args:
+        max_bytes (int): The size a log file may reach before it is rotated. 0 disables rotation.
+        backup_count (int): The number of compressed archives kept per log file.
+        buffer_bytes (int): The size of the buffered lines that are written without waiting for
+                            the queue to run empty.
+
+    """
+
+    def __init__(self, max_bytes=10 * 1024 * 1024, backup_count=5, buffer_bytes=64 * 1024):
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.buffer_bytes = buffer_bytes
+        self.reset()
+
+    def reset(self):
+        self.queue = queue.Queue()
+        self.handles = {}
+        self.pending = {}
+        self.pending_bytes = 0
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def write(self, path, line):
+        """
+        Enqueues a line to be appended to the log file at path.
+
+        """
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self.run, name='log-writer', daemon=True)
+                    self.thread.start()
+        self.queue.put((path, line))
+
+    def flush(self):
+        """
+        Blocks until every enqueued line has been written to disk.
+
+        """
+        if self.thread is not None:
+            self.queue.join()
+
+    def run(self):
+        while True:
+            path, line = self.queue.get()
+            try:
+                self.pending.setdefault(path, []).append(line)
+                self.pending_bytes += len(line)
+                if self.queue.unfinished_tasks <= 1 or self.pending_bytes >= self.buffer_bytes:
+                    # nothing else is waiting, make what was logged so far visible on disk
+                    self.write_pending()
+            except Exception:
+                pass  # a failing log write must never break the pipeline
+            finally:
+                self.queue.task_done()
+
+    def write_pending(self):
+        pending, self.pending, self.pending_bytes = self.pending, {}, 0
+        for path, lines in pending.items():
+            handle = self.open_handle(path)
+            handle.write(''.join(lines))
+            handle.flush()
+            if self.max_bytes and handle.tell() >= self.max_bytes:
+                self.rotate(path)
+
+    def open_handle(self, path):
+        """
+        Returns the handle of the log file at path, opened again if the file it was opened on
+        is no longer at path.
+
+        """
+        handle = self.handles.get(path)
+        if handle is not None:
+            try:
+                opened, current = os.fstat(handle.fileno()), os.stat(path)
+                stale = (opened.st_dev, opened.st_ino) != (current.st_dev, current.st_ino)
+            except FileNotFoundError:
+                stale = True
+            if stale:
+                del self.handles[path]
+                handle.close()
+                handle = None
+        if handle is None:
+            directory = os.path.dirname(path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory, exist_ok=True)
+            handle = self.handles[path] = open(path, 'a')
+        return handle
+
+    def rotate(self, path):
+        handle = self.handles.pop(path)
+        try:
+            opened, current = os.fstat(handle.fileno()), os.stat(path)
+            rotated = (opened.st_dev, opened.st_ino) != (current.st_dev, current.st_ino)
+        except FileNotFoundError:
+            rotated = True
+        handle.close()
+        if rotated:
+            return  # already rotated by another process
+        archive = '%s.%s' % (path, datetime.now().strftime('%Y%m%d%H%M%S%f'))
+        try:
+            os.replace(path, archive)
+        except OSError:
+            return  # e.g. the file is still held open elsewhere on Windows, retry on the next write
+        with open(archive, 'rb') as source, gzip.open(archive + '.gz', 'wb') as target:
+            shutil.copyfileobj(source, target)
+        os.remove(archive)
+        for old_archive in sorted(glob.glob(glob.escape(path) + '.*.gz'))[:-self.backup_count or None]:
+            os.remove(old_archive)
+
+
+# one writer per process, shared by every App_Logger
+log_writer = Log_Writer(max_bytes=int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024)),
+                        backup_count=int(os.getenv('LOG_BACKUP_COUNT', 5)))
+atexit.register(log_writer.flush)
+if hasattr(os, 'register_at_fork'):
+    # a forked worker process must not share the queue and thread of its parent
+    os.register_at_fork(after_in_child=log_writer.reset)
+
 
 class App_Logger:
-    def __init__(self):
-        pass
+    """
+    Writes timestamped log messages to the log files of the pipeline.
+
+    Args:
+        level (int): Messages below this level are dropped. Defaults to the LOG_LEVEL
+                     environment variable (DEBUG, INFO, WARNING or ERROR), or INFO.
+
+    """
+
+    def __init__(self, level=None):
+        if level is None:
+            level = LEVELS.get(os.getenv('LOG_LEVEL', 'INFO').upper(), INFO)
+        self.level = level
 
-    def log(self, file_object, log_message):
+    def log(self, file_object, log_message, level=INFO):
         """
         Writes a log message to the specified file object.
         Args:
-        file_object: A file object to write the log message to.
+        file_object: A file object (or the path of a file) to write the log message to.
         log_message: The log message to write.
+        level: The level of the message.
         """
-        
+        if level < self.level:
+            return
         self.now = datetime.now()
         self.date = self.now.date()
         self.current_time = self.now.strftime("%H:%M:%S")
-        file_object.write(
-            str(self.date) + "/" + str(self.current_time) + "\t\t" + log_message +"\n")
\ No newline at end of file
+        line = str(self.date) + "/" + str(self.current_time) + "\t\t" + log_message + "\n"
+        path = file_object if isinstance(file_object, str) else getattr(file_object, 'name', None)
+        if isinstance(path, str):
+            # written by the background writer through its own persistent handle
+            log_writer.write(os.path.abspath(path), line)
+        else:
+            file_object.write(line)
+
+    def flush(self):
+        """
+        Blocks until every message logged so far has been written to disk.
+
+        """
+        log_writer.flush()
@@ -0,0 +1,226 @@
+import cProfile
+import json
+import os
+import re
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+
+class Run_Profiler:
+    """
+    This class records the wall time, CPU time, row count and, when memory tracing is enabled,
+    the peak memory of every stage of a pipeline run and writes them to a JSON run report.
+
+    A stage that runs several times in a run (e.g. once per prediction chunk) is reported once,
+    with its totals and the number of calls. The CPU time includes the worker processes that
+    finished during the stage (on platforms reporting child CPU time); the peak memory is the
+    memory allocated by this process on top of what was allocated when the stage started.
+
+    tracemalloc is shared by the whole process: it is started by the first run that traces memory
+    and stopped when the last one is saved. Measuring a stage resets the peak of the process, so
+    the peak of a stage during which another stage (e.g. of a prediction running next to a
+    training job) reset it is not recorded; peak_memory_bytes is the largest peak of the calls
+    of the stage that were measured, None if none was.
+
+    Args:
+        pipeline_name (str): The name of the pipeline, used in the report file name.
+        report_directory (str): The directory the run report is written to.
+        trace_memory (bool): Whether peak memory is traced with tracemalloc, which slows the whole
+                             process down. Defaults to the PROFILE_MEMORY environment variable, off
+                             unless it is '1'. Wall time, CPU time and rows are always recorded.
+        profile_stages (bool): Whether a cProfile file is dumped for every stage. Defaults to the
+                               PROFILE_STAGES environment variable, off unless it is '1'.
+        keep_reports (int): The number of newest run reports of the pipeline kept in
+                            report_directory, with their cProfile files. Defaults to the
+                            PROFILE_KEEP_REPORTS environment variable, 50 if it is not set.
+        stage_listener (callable): Called with the name and the status of a stage when it starts
+                                   ('running') and when it ends ('succeeded' or 'failed'), e.g. to
+                                   report the progress of a training job.
+
+    """
+
+    # the runs tracing memory in this process, whether they started tracemalloc, and the number
+    # of times a stage reset the traced peak
+    tracing_lock = threading.Lock()
+    tracing_runs = 0
+    started_tracing = False
+    peak_resets = 0
+
+    def __init__(self, pipeline_name, report_directory, trace_memory=None, profile_stages=None, keep_reports=None,
+                 stage_listener=None):
+        self.pipeline_name = pipeline_name
+        self.report_directory = report_directory
+        if trace_memory is None:
+            trace_memory = os.getenv('PROFILE_MEMORY', '0') == '1'
+        if profile_stages is None:
+            profile_stages = os.getenv('PROFILE_STAGES', '0') == '1'
+        if keep_reports is None:
+            keep_reports = int(os.getenv('PROFILE_KEEP_REPORTS', '50'))
+        self.trace_memory = trace_memory
+        self.profile_stages = profile_stages
+        self.keep_reports = keep_reports
+        self.stage_listener = stage_listener
+        self.run_id = datetime.now().strftime('%Y%m%d_%H%M%S_') + uuid.uuid4().hex[:8]
+        self.started = time.time()
+        self.start_wall_time = time.perf_counter()
+        self.stages = {}
+        self.tracing = False
+        if self.trace_memory:
+            with Run_Profiler.tracing_lock:
+                if Run_Profiler.tracing_runs == 0 and not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    Run_Profiler.started_tracing = True
+                Run_Profiler.tracing_runs += 1
+            self.tracing = True
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        """
+        Measures the block as the stage name. The yielded dict lets the block set the number of
+        rows it processed: stage['rows'] = n.
+
+        """
+        stage = {'rows': rows}
+        profile = cProfile.Profile() if self.profile_stages else None
+        start_memory = peak_resets = 0
+        if self.tracing:
+            with Run_Profiler.tracing_lock:
+                tracemalloc.reset_peak()
+                start_memory = tracemalloc.get_traced_memory()[0]
+                Run_Profiler.peak_resets += 1
+                peak_resets = Run_Profiler.peak_resets
+        start_wall_time, start_cpu_time = time.perf_counter(), self.cpu_time()
+        if profile is not None:
+            profile.enable()
+        if self.stage_listener is not None:
+            self.stage_listener(name, 'running')
+        status = 'failed'
+        try:
+            yield stage
+            status = 'succeeded'
+        finally:
+            if profile is not None:
+                profile.disable()
+            if self.stage_listener is not None:
+                self.stage_listener(name, status)
+            wall_time, cpu_time = time.perf_counter() - start_wall_time, self.cpu_time() - start_cpu_time
+            peak_memory = None
+            if self.tracing:
+                with Run_Profiler.tracing_lock:
+                    # the peak is this stage's only if no other stage reset it in the meantime
+                    if Run_Profiler.peak_resets == peak_resets:
+                        peak_memory = max(0, tracemalloc.get_traced_memory()[1] - start_memory)
+            record = self.stages.setdefault(name, {'name': name, 'calls': 0, 'status': status, 'wall_time': 0.0,
+                                                   'cpu_time': 0.0, 'peak_memory_bytes': None, 'rows': None})
+            record['calls'] += 1
+            record['status'] = 'failed' if 'failed' in (record['status'], status) else status
+            record['wall_time'] += wall_time
+            record['cpu_time'] += cpu_time
+            if peak_memory is not None:
+                record['peak_memory_bytes'] = max(record['peak_memory_bytes'] or 0, peak_memory)
+            if stage['rows'] is not None:
+                record['rows'] = (record['rows'] or 0) + int(stage['rows'])
+            if profile is not None:
+                os.makedirs(self.report_directory, exist_ok=True)
+                profile.dump_stats(os.path.join(self.report_directory, '%s_%s_%s_%d.prof' % (
+                    self.pipeline_name, self.run_id, name, record['calls'])))
+
+    def iterate(self, name, iterable):
+        """
+        Yields the items of iterable, measuring the production of every item as the stage name
+        and counting the rows of the items (their len) as the rows of the stage.
+
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name) as stage:
+                item = next(iterator, None)
+                if item is not None:
+                    stage['rows'] = len(item)
+            if item is None:
+                return
+            yield item
+
+    def cpu_time(self):
+        times = os.times()
+        return times.user + times.system + times.children_user + times.children_system
+
+    def report(self, status='succeeded'):
+        """
+        Returns the run report as a dict.
+
+        """
+        return {'pipeline': self.pipeline_name,
+                'run_id': self.run_id,
+                'status': status,
+                'started': datetime.fromtimestamp(self.started).isoformat(),
+                'wall_time': time.perf_counter() - self.start_wall_time,
+                'trace_memory': self.trace_memory,
+                'stages': list(self.stages.values())}
+
+    def save(self, status='succeeded'):
+        """
+        Writes the run report to <report_directory>/<pipeline_name>_<run_id>.json, removes the
+        reports of the pipeline older than the newest keep_reports, and stops the memory tracing
+        if this run was the last one tracing.
+
+        Returns:
+            str: The path of the run report.
+
+        """
+        if self.tracing:
+            with Run_Profiler.tracing_lock:
+                Run_Profiler.tracing_runs -= 1
+                if Run_Profiler.tracing_runs == 0 and Run_Profiler.started_tracing:
+                    tracemalloc.stop()
+                    Run_Profiler.started_tracing = False
+            self.tracing = False
+        os.makedirs(self.report_directory, exist_ok=True)
+        path = os.path.join(self.report_directory, '%s_%s.json' % (self.pipeline_name, self.run_id))
+        with open(path, 'w') as f:
+            json.dump(self.report(status), f, indent=2)
+        self.prune_reports()
+        return path
+
+    def prune_reports(self):
+        """
+        Removes the run reports of the pipeline, and their cProfile files, but the newest
+        keep_reports, by modification time.
+
+        """
+        pattern = re.compile(r'%s_(\d{8}_\d{6}_[0-9a-f]{8})' % re.escape(self.pipeline_name))
+        files = os.listdir(self.report_directory)
+        reports = []
+        for file in files:
+            match = pattern.fullmatch(file[:-len('.json')]) if file.endswith('.json') else None
+            if match:
+                try:
+                    reports.append((os.stat(os.path.join(self.report_directory, file)).st_mtime_ns, match.group(1)))
+                except FileNotFoundError:
+                    # removed by a run saved at the same time
+                    pass
+        reports.sort()
+        stale = {run_id for _, run_id in reports[:max(0, len(reports) - self.keep_reports)]}
+        for file in files:
+            match = pattern.match(file)
+            if match and match.group(1) in stale:
+                try:
+                    os.remove(os.path.join(self.report_directory, file))
+                except FileNotFoundError:
+                    pass
+
+def stop_tracing_in_child():
+    # forked worker processes are not profiled, so they do not pay for the tracing of their parent
+    if Run_Profiler.started_tracing and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    Run_Profiler.tracing_lock = threading.Lock()
+    Run_Profiler.tracing_runs = 0
+    Run_Profiler.started_tracing = False
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=stop_tracing_in_child)
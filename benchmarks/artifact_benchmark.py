@@ -0,0 +1,80 @@
+"""
+Benchmark of the model artifact formats of File_Operation: the size on disk and the load time of
+each kind of model saved as one pickle file (the format before the artifact formats), with joblib,
+and in its native format (UBJSON for XGBoost, .npy files for Logistic Regression and the
+compiled scorer).
+
+Usage (from the repository root):
+    python -m benchmarks.artifact_benchmark [trees ...]
+
+The XGBoost models and the two XGBoost clusters of the compiled scorer have 100 and 1000 trees
+by default.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import numpy as np
+from sklearn.cluster import KMeans
+from sklearn.linear_model import LogisticRegression
+from xgboost import XGBClassifier
+from application_logging import logger
+from best_model_finder.scorer import Compiled_Scorer
+from data_preprocessing.encoder import Categorical_Encoder
+from data_preprocessing.pipeline import Preprocessing_Pipeline
+from data_preprocessing.preprocessing import ORDINAL_MAPPINGS, LABEL_MAPPING, NUMERICAL_COLUMNS
+from file_operations.artifact_formats import format_for
+from file_operations.file_methods import File_Operation
+from benchmarks.encoder_benchmark import make_data
+from benchmarks.router_benchmark import best_of
+
+
+def make_models(trees):
+    encoder = Categorical_Encoder(dict(ORDINAL_MAPPINGS, fraud_reported=LABEL_MAPPING)).fit(make_data(10000))
+    data = encoder.transform(make_data(10000))
+    features, labels = data.drop(columns=['fraud_reported']), data['fraud_reported']
+    # the cluster models are trained on the numerical columns first, as train_cluster scales them
+    features = features[NUMERICAL_COLUMNS + [col for col in features.columns if col not in NUMERICAL_COLUMNS]]
+    kmeans = KMeans(n_clusters=2, random_state=42, n_init=10).fit(features)
+    pipeline = Preprocessing_Pipeline()
+    pipeline.feature_columns = list(features.columns)
+    clusters = kmeans.predict(features)
+    models = {}
+    for cluster in range(2):
+        pipeline.scalers[cluster] = (np.zeros(len(NUMERICAL_COLUMNS)), np.ones(len(NUMERICAL_COLUMNS)))
+        models[cluster] = XGBClassifier(n_estimators=trees, n_jobs=1).fit(features[clusters == cluster], labels[clusters == cluster])
+    return {'KMeans': kmeans,
+            'Logistic Regression': LogisticRegression(max_iter=1000).fit(features, labels),
+            'XGBoost': models[0],
+            'Compiled_Scorer': Compiled_Scorer(kmeans, pipeline, models)}
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(path, file)) for file in os.listdir(path))
+
+
+def measure(model, artifact_format, file_op):
+    file_op.save_model(model, 'Model', artifact_format=artifact_format)
+    size = directory_size(os.path.join(file_op.model_directory, 'Model'))
+    load_time, _ = best_of(file_op.load_model, 'Model', 5)
+    shutil.rmtree(os.path.join(file_op.model_directory, 'Model'))
+    return size, load_time
+
+
+def main(sizes):
+    workspace = tempfile.mkdtemp()
+    try:
+        file_op = File_Operation(None, logger.App_Logger(level=logger.ERROR + 1))
+        file_op.model_directory = workspace + '/'
+        print('%6s %20s %10s %10s %12s' % ('trees', 'model', 'format', 'size KB', 'load ms'))
+        for trees in sizes:
+            for name, model in make_models(trees).items():
+                for artifact_format in dict.fromkeys(('pickle', 'joblib', format_for(model).name)):
+                    size, load_time = measure(model, artifact_format, file_op)
+                    print('%6d %20s %10s %10.1f %12.3f' % (trees, name, artifact_format, size / 1e3, load_time * 1e3))
+    finally:
+        shutil.rmtree(workspace)
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or [100, 1000])
@@ -0,0 +1,76 @@
+"""
+Benchmark of the elbow sweep of KMeansClustering (KMeans fits for k=1..10): the sequential loop
+it replaced, the fits in a thread pool each using every core (the oversubscribed sweep before
+the cores were split between the fits), and elbow_plot with its sampling and MiniBatchKMeans
+options.
+
+Usage (from the repository root):
+    python -m benchmarks.elbow_benchmark [rows ...]
+
+The rows default to 10k and 100k. The thread pool has as many threads as cores; set
+OMP_NUM_THREADS above the number of cores to reproduce the oversubscription of a larger box.
+"""
+import io
+import os
+import sys
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from kneed import KneeLocator
+from sklearn.cluster import KMeans
+from application_logging.logger import App_Logger
+from data_preprocessing.clustering import KMeansClustering
+from data_preprocessing.encoder import Categorical_Encoder
+from data_preprocessing.preprocessing import ORDINAL_MAPPINGS, LABEL_MAPPING
+from benchmarks.encoder_benchmark import make_data
+
+
+def inertia(data, n_clusters):
+    return KMeans(n_clusters=n_clusters, init='k-means++', random_state=42).fit(data).inertia_
+
+
+def knee(wcss):
+    return KneeLocator(range(1, 11), wcss, curve='convex', direction='decreasing').knee
+
+
+def sequential_sweep(data, labels):
+    return knee([inertia(data, n_clusters) for n_clusters in range(1, 11)])
+
+
+def oversubscribed_sweep(data, labels):
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        return knee(list(executor.map(lambda n_clusters: inertia(data, n_clusters), range(1, 11))))
+
+
+def elbow_plot(**options):
+    def sweep(data, labels):
+        clustering = KMeansClustering(io.StringIO(), App_Logger())
+        return clustering.elbow_plot(data, labels=labels, save_plot=False, use_cache=False, **options)
+    return sweep
+
+
+CONFIGURATIONS = [
+    ('sequential (previous)', sequential_sweep),
+    ('threads, all cores each', oversubscribed_sweep),
+    ('elbow_plot', elbow_plot()),
+    ('elbow_plot sample 10k', elbow_plot(sample_size=10000)),
+    ('elbow_plot minibatch', elbow_plot(use_minibatch=True)),
+]
+
+
+def main(sizes):
+    warnings.filterwarnings('ignore')
+    encoder = Categorical_Encoder(dict(ORDINAL_MAPPINGS, fraud_reported=LABEL_MAPPING)).fit(make_data(10000))
+    print('%d cores, OMP_NUM_THREADS=%s' % (os.cpu_count(), os.getenv('OMP_NUM_THREADS')))
+    print('%10s %26s %10s %6s' % ('rows', 'sweep', 'seconds', 'knee'))
+    for rows in sizes:
+        data = encoder.transform(make_data(rows))
+        features, labels = data.drop(columns=['fraud_reported']), data['fraud_reported']
+        for name, sweep in CONFIGURATIONS:
+            start = time.perf_counter()
+            number_of_clusters = sweep(features, labels)
+            print('%10d %26s %10.2f %6s' % (rows, name, time.perf_counter() - start, number_of_clusters))
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or [10000, 100000])
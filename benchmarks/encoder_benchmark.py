@@ -0,0 +1,73 @@
+"""
+Benchmark of the single-pass Categorical_Encoder against the per-column get_dummies loop
+that Preprocessor.encode_categorical_columns used before.
+
+Usage (from the repository root):
+    python -m benchmarks.encoder_benchmark [rows ...]
+
+The rows default to 1k, 100k and 10M. The 10M run needs several GB of memory.
+"""
+import sys
+import time
+import numpy as np
+import pandas as pd
+from data_preprocessing.preprocessing import COLUMNS_TO_DROP, ORDINAL_MAPPINGS, LABEL_MAPPING
+from data_preprocessing.encoder import Categorical_Encoder
+
+
+def legacy_encode(data):
+    """The per-column get_dummies loop replaced by Categorical_Encoder."""
+    cat_df = data.select_dtypes(include=['object']).copy()
+    for col, mapping in ORDINAL_MAPPINGS.items():
+        cat_df[col] = cat_df[col].map(mapping)
+    cat_df['fraud_reported'] = cat_df['fraud_reported'].map(LABEL_MAPPING)
+    cols_to_drop = list(ORDINAL_MAPPINGS) + ['fraud_reported']
+    for col in cat_df.drop(columns=cols_to_drop).columns:
+        cat_df = pd.get_dummies(cat_df, columns=[col], prefix=[col], drop_first=True)
+    data = data.drop(columns=data.select_dtypes(include=['object']).columns)
+    return pd.concat([cat_df, data], axis=1)
+
+
+def single_pass_encode(data):
+    encoder = Categorical_Encoder(dict(ORDINAL_MAPPINGS, fraud_reported=LABEL_MAPPING))
+    return encoder.fit(data).transform(data)
+
+
+def fitted_encoder(data):
+    """The encoder with its vocabulary already fitted, as used by the prediction pipeline."""
+    encoder = Categorical_Encoder(dict(ORDINAL_MAPPINGS, fraud_reported=LABEL_MAPPING))
+    return encoder.fit(data.iloc[:10000]).transform
+
+
+def make_data(rows, seed=42):
+    data = pd.read_csv('data/insuranceFraud.csv').drop(columns=COLUMNS_TO_DROP)
+    data = data.replace('?', np.nan)
+    data = data.fillna(data.mode().iloc[0])
+    index = np.random.default_rng(seed).integers(0, len(data), size=rows)
+    return data.iloc[index].reset_index(drop=True)
+
+
+def best_of(function, data, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(data)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main(sizes):
+    print('%12s %14s %14s %14s %9s' % ('rows', 'get_dummies s', 'fit+encode s', 'encode s', 'speedup'))
+    for rows in sizes:
+        data = make_data(rows)
+        repeat = 5 if rows <= 100000 else 1
+        legacy_time, legacy = best_of(legacy_encode, data, repeat)
+        new_time, new = best_of(single_pass_encode, data, repeat)
+        fixed_time, _ = best_of(fitted_encoder(data), data, repeat)
+        assert list(legacy.columns) == list(new.columns)
+        assert np.allclose(legacy.to_numpy(dtype=np.float64), new.to_numpy(), equal_nan=True)
+        print('%12d %14.4f %14.4f %14.4f %8.1fx' % (rows, legacy_time, new_time, fixed_time, legacy_time / fixed_time))
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or [1000, 100000, 10000000])
@@ -0,0 +1,61 @@
+"""
+Equivalence check of Categorical_Encoder against the per-column get_dummies loop it replaced: the
+encoded columns and values must be identical for batches of every size, for batches with missing
+values, for categorical (category dtype) input as read by Schema_Reader, and for a batch encoded
+with the vocabulary fitted on the training data, as prediction does.
+
+Usage (from the repository root):
+    python -m benchmarks.encoder_equivalence
+
+The exit status is 1 if any batch is encoded differently.
+"""
+import sys
+import numpy as np
+import pandas as pd
+from data_preprocessing.encoder import Categorical_Encoder
+from data_preprocessing.preprocessing import COLUMNS_TO_DROP, ORDINAL_MAPPINGS, LABEL_MAPPING
+from benchmarks.encoder_benchmark import legacy_encode, make_data
+
+
+def encoder():
+    return Categorical_Encoder(dict(ORDINAL_MAPPINGS, fraud_reported=LABEL_MAPPING))
+
+
+def as_category(data):
+    return data.astype({col: 'category' for col in data.select_dtypes(include=['object']).columns})
+
+
+def cases():
+    for rows in (1, 2, 10, 1000, 100000):
+        data = make_data(rows, seed=rows)
+        yield '%d rows' % rows, legacy_encode(data), encoder().fit(data).transform(data)
+    # the '?' of the raw data left as missing values instead of being imputed
+    raw = pd.read_csv('data/insuranceFraud.csv').drop(columns=COLUMNS_TO_DROP).replace('?', np.nan)
+    yield 'missing values', legacy_encode(raw), encoder().fit(raw).transform(raw)
+    data = make_data(1000, seed=3)
+    yield 'category dtype', legacy_encode(data), encoder().fit(as_category(data)).transform(as_category(data))
+    # a small batch encoded with the training vocabulary, against the loop over training and batch
+    # together, so both have the vocabulary of the training data
+    train, batch = make_data(10000, seed=4), make_data(20, seed=5)
+    expected = legacy_encode(pd.concat([train, batch], ignore_index=True)).iloc[len(train):].reset_index(drop=True)
+    yield 'fitted vocabulary', expected, encoder().fit(train).transform(as_category(batch))
+
+
+def main():
+    failures = 0
+    print('%20s %10s %10s %18s' % ('case', 'rows', 'columns', 'different values'))
+    for name, expected, encoded in cases():
+        same_columns = list(expected.columns) == list(encoded.columns)
+        different = -1
+        if same_columns:
+            different = int(np.count_nonzero(~((expected.to_numpy(dtype=np.float64) == encoded.to_numpy())
+                                               | (expected.isna().to_numpy() & encoded.isna().to_numpy()))))
+        failures += not same_columns or different > 0
+        print('%20s %10d %10s %18s' % (name, len(encoded), len(encoded.columns) if same_columns else 'different',
+                                       different if same_columns else '-'))
+    print('identical' if failures == 0 else '%d batches encoded differently from the get_dummies loop' % failures)
+    return failures
+
+
+if __name__ == '__main__':
+    sys.exit(1 if main() else 0)
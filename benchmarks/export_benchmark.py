@@ -0,0 +1,89 @@
+"""
+Benchmark of the hand-off from the training database to the data loader: the fully quoted CSV
+export, re-parsed by pandas with every dtype inferred, against the Parquet export typed from the
+schema and read with column projection. Needs pyarrow.
+
+Both exports stream the table in batches, so their peak memory (traced on a second export) stays
+flat as the table grows.
+
+Usage (from the repository root):
+    python -m benchmarks.export_benchmark [rows ...]
+
+The rows default to 10k, 100k and 1M.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from application_logging import logger
+from data_ingestion.data_loader import Data_Getter
+from data_preprocessing.preprocessing import COLUMNS_TO_DROP
+from DataTypeValidation_Insertion_Training.DataTypeValidation import dBOperation
+from benchmarks.ingestion_benchmark import load_schema, make_batch, create_table, typed_ingest
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def peak_memory(function, *args):
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(rows, column_names):
+    workspace = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    try:
+        directory = os.path.join(workspace, 'Good_Raw')
+        os.makedirs(directory)
+        make_batch(rows, directory)
+        database = os.path.join(workspace, 'Training.db')
+        create_table(database, column_names)
+        typed_ingest(directory, database, column_names)
+
+        os.chdir(workspace)  # the exports are written to Training_FileFromDB/ of the working directory
+        silent = logger.App_Logger(level=logger.ERROR + 1)
+        operation = dBOperation()
+        operation.logger = silent
+        operation.connections.logger = silent
+        operation.path = workspace + '/'
+        getter = Data_Getter(None, silent)
+        getter.training_file = 'Training_FileFromDB/InputFile.csv'
+
+        _, csv_export = timed(operation.exportGoodData, 'Training', column_names, 'csv')
+        csv_data, csv_load = timed(getter.get_data, COLUMNS_TO_DROP)
+        _, parquet_export = timed(operation.exportGoodData, 'Training', column_names, 'parquet')
+        parquet_data, parquet_load = timed(getter.get_data, COLUMNS_TO_DROP)
+        assert csv_data.shape == parquet_data.shape == (rows, len(column_names) - len(COLUMNS_TO_DROP))
+        del csv_data, parquet_data
+        csv_peak = peak_memory(operation.exportGoodData, 'Training', column_names, 'csv')
+        parquet_peak = peak_memory(operation.exportGoodData, 'Training', column_names, 'parquet')
+        operation.close()
+        return csv_export, csv_load, csv_peak, parquet_export, parquet_load, parquet_peak
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workspace)
+
+
+def main(sizes):
+    column_names = load_schema()
+    print('%10s %12s %12s %12s %12s %12s %12s %9s' % ('rows', 'csv export s', 'csv peak MB', 'csv load s',
+                                                    'pq export s', 'pq peak MB', 'pq load s', 'load x'))
+    for rows in sizes:
+        csv_export, csv_load, csv_peak, parquet_export, parquet_load, parquet_peak = run(rows, column_names)
+        print('%10d %12.3f %12.1f %12.3f %12.3f %12.1f %12.3f %8.1fx' % (
+            rows, csv_export, csv_peak / 1e6, csv_load, parquet_export, parquet_peak / 1e6, parquet_load,
+            csv_load / parquet_load))
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or [10000, 100000, 1000000])
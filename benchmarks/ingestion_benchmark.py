@@ -0,0 +1,122 @@
+"""
+Benchmark of the training ingestion of a large synthetic batch: the quote-wrapping transform
+(a pandas apply per cell of the string columns and a full rewrite of every file, then an insert
+unquoting every value) against the validation pass and typed parameter binding used now.
+
+Usage (from the repository root):
+    python -m benchmarks.ingestion_benchmark [rows ...]
+
+The rows default to 10k, 100k and 1M, split into 10 batch files.
+"""
+import csv
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from itertools import islice
+import numpy as np
+import pandas as pd
+from application_logging import logger
+from DataTypeValidation_Insertion_Training.DataTypeValidation import dBOperation
+from Training_Raw_data_validation.rawValidation import validate_file
+
+N_FILES = 10
+
+
+def load_schema():
+    with open('schema_training.json') as f:
+        return json.load(f)['ColName']
+
+
+def make_batch(rows, directory, seed=42):
+    data = pd.read_csv('data/insuranceFraud.csv', dtype=str, keep_default_na=False)
+    index = np.random.default_rng(seed).integers(0, len(data), size=rows)
+    for i, part in enumerate(np.array_split(index, N_FILES)):
+        data.iloc[part].to_csv(os.path.join(directory, 'batch_%02d.csv' % i), index=False)
+
+
+def create_table(path, column_names):
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE Good_Raw_Data (%s)' % ', '.join('"%s" %s' % item for item in column_names.items()))
+    conn.commit()
+    conn.close()
+
+
+def legacy_ingest(directory, database, column_names):
+    """The quote-wrapping transform and the unquoting insert replaced by typed binding."""
+    string_columns = [column for column, column_type in column_names.items() if column_type == 'varchar']
+    for file in sorted(os.listdir(directory)):
+        data = pd.read_csv(os.path.join(directory, file))
+        for col in string_columns:
+            data[col] = data[col].apply(lambda x: "'" + str(x) + "'")
+        data.to_csv(os.path.join(directory, file), index=None, header=True)
+
+    def unquote(value):
+        if value == '':
+            return None
+        if len(value) >= 2 and value[0] == "'" and value[-1] == "'":
+            return value[1:-1]
+        return value
+
+    conn = sqlite3.connect(database)
+    for file in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, file), newline='') as f, conn:
+            reader = csv.reader(f)
+            header = next(reader)
+            query = 'INSERT INTO Good_Raw_Data values (%s)' % ', '.join(['?'] * len(header))
+            while True:
+                chunk = [tuple(unquote(value) for value in row) for row in islice(reader, 10000)]
+                if not chunk:
+                    break
+                conn.executemany(query, chunk)
+    conn.close()
+
+
+def typed_ingest(directory, database, column_names):
+    for file in sorted(os.listdir(directory)):
+        rows, problem = validate_file(os.path.join(directory, file), len(column_names))
+        assert problem is None, problem
+    operation = dBOperation()
+    operation.logger = logger.App_Logger(level=logger.ERROR + 1)  # keep the benchmark out of the training logs
+    operation.connections.logger = operation.logger
+    operation.path = os.path.dirname(database) + '/'
+    operation.goodFilePath = directory
+    operation.badFilePath = directory
+    operation.insertIntoTableGoodData(os.path.splitext(os.path.basename(database))[0], column_names=column_names)
+    operation.close()
+
+
+def run(function, rows, column_names):
+    workspace = tempfile.mkdtemp()
+    try:
+        directory = os.path.join(workspace, 'Good_Raw')
+        os.makedirs(directory)
+        make_batch(rows, directory)
+        database = os.path.join(workspace, 'Training.db')
+        create_table(database, column_names)
+        start = time.perf_counter()
+        function(directory, database, column_names)
+        elapsed = time.perf_counter() - start
+        conn = sqlite3.connect(database)
+        count = conn.execute('SELECT count(*) FROM Good_Raw_Data').fetchone()[0]
+        conn.close()
+        assert count == rows, (count, rows)
+        return elapsed
+    finally:
+        shutil.rmtree(workspace)
+
+
+def main(sizes):
+    column_names = load_schema()
+    print('%12s %16s %16s %9s %12s' % ('rows', 'quote pass s', 'typed binding s', 'speedup', 'rows/s'))
+    for rows in sizes:
+        legacy_time = run(legacy_ingest, rows, column_names)
+        typed_time = run(typed_ingest, rows, column_names)
+        print('%12d %16.3f %16.3f %8.1fx %12.0f' % (rows, legacy_time, typed_time, legacy_time / typed_time, rows / typed_time))
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or [10000, 100000, 1000000])
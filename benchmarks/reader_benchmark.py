@@ -0,0 +1,79 @@
+"""
+Benchmark of reading the CSV export of the good data: pandas.read_csv inferring every dtype, then
+the '?' replacement and the column removal of the training pipeline, against Schema_Reader, which
+reads only the used columns with the dtypes of the schema and '?' as missing.
+
+Usage (from the repository root):
+    python -m benchmarks.reader_benchmark [rows ...]
+
+The rows default to 10k, 100k and 1M.
+"""
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from data_ingestion.schema_reader import Schema_Reader
+from data_preprocessing.preprocessing import COLUMNS_TO_DROP
+
+
+def make_export(rows, path, seed=42):
+    data = pd.read_csv('data/insuranceFraud.csv', dtype=str, keep_default_na=False)
+    index = np.random.default_rng(seed).integers(0, len(data), size=rows)
+    data.iloc[index].to_csv(path, index=False, quoting=csv.QUOTE_ALL)  # quoted as the export writes it
+
+
+def legacy_read(path):
+    data = pd.read_csv(path)
+    data = data.drop(columns=COLUMNS_TO_DROP)
+    data.replace('?', np.NaN, inplace=True)
+    return data
+
+
+def schema_read(path):
+    return Schema_Reader('schema_training.json', COLUMNS_TO_DROP).read(path + '.parquet', path)
+
+
+def measure(function, path):
+    start = time.perf_counter()
+    data = function(path)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    try:
+        function(path)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return data, elapsed, peak, data.memory_usage(deep=True).sum()
+
+
+def run(rows):
+    workspace = tempfile.mkdtemp()
+    try:
+        path = os.path.join(workspace, 'InputFile.csv')
+        make_export(rows, path)
+        legacy_data, legacy_time, legacy_peak, legacy_size = measure(legacy_read, path)
+        typed_data, typed_time, typed_peak, typed_size = measure(schema_read, path)
+        assert legacy_data.shape == typed_data.shape
+        assert (legacy_data.isna().sum() == typed_data.isna().sum()).all()
+        return legacy_time, legacy_peak, legacy_size, typed_time, typed_peak, typed_size
+    finally:
+        shutil.rmtree(workspace)
+
+
+def main(sizes):
+    print('%10s %12s %12s %12s %12s %12s %12s %9s' % ('rows', 'infer s', 'infer peak', 'infer MB',
+                                                    'schema s', 'schema peak', 'schema MB', 'load x'))
+    for rows in sizes:
+        legacy_time, legacy_peak, legacy_size, typed_time, typed_peak, typed_size = run(rows)
+        print('%10d %12.3f %12.1f %12.1f %12.3f %12.1f %12.1f %8.1fx' % (
+            rows, legacy_time, legacy_peak / 1e6, legacy_size / 1e6, typed_time, typed_peak / 1e6,
+            typed_size / 1e6, legacy_time / typed_time))
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or [10000, 100000, 1000000])
@@ -0,0 +1,50 @@
+"""
+Benchmark of the cluster assignment of prediction: KMeans.predict on the encoded DataFrame
+against Centroid_Router on the same rows as a numpy array. The clusters must be identical.
+
+Usage (from the repository root):
+    python -m benchmarks.router_benchmark [rows ...]
+
+The rows default to 1, 100 and 1M. The KMeans model has 3 clusters fitted on 10k rows.
+"""
+import sys
+import time
+import numpy as np
+from sklearn.cluster import KMeans
+from data_preprocessing.centroid_router import Centroid_Router
+from data_preprocessing.encoder import Categorical_Encoder
+from data_preprocessing.preprocessing import ORDINAL_MAPPINGS
+from benchmarks.encoder_benchmark import make_data
+
+
+def make_features(encoder, rows, seed=42):
+    return encoder.transform(make_data(rows, seed).drop(columns=['fraud_reported']))
+
+
+def best_of(function, data, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(data)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main(sizes):
+    # the vocabulary of the encoder is fitted once, as in training
+    encoder = Categorical_Encoder(ORDINAL_MAPPINGS).fit(make_data(10000).drop(columns=['fraud_reported']))
+    kmeans = KMeans(n_clusters=3, init='k-means++', random_state=42, n_init=10).fit(make_features(encoder, 10000))
+    router = Centroid_Router(kmeans.cluster_centers_)
+    print('%10s %16s %16s %9s' % ('rows', 'KMeans.predict s', 'router s', 'speedup'))
+    for rows in sizes:
+        features = make_features(encoder, rows, seed=rows)
+        array = features.to_numpy(dtype=np.float64)
+        repeat = 1000 if rows <= 100 else 3
+        sklearn_time, expected = best_of(kmeans.predict, features, repeat)
+        router_time, clusters = best_of(router.predict, array, repeat)
+        assert (expected == clusters).all()
+        print('%10d %16.6f %16.6f %8.1fx' % (rows, sklearn_time, router_time, sklearn_time / router_time))
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or [1, 100, 1000000])
@@ -0,0 +1,104 @@
+"""
+Equivalence check of Centroid_Router against KMeans.predict, for rows of the insurance data, rows
+exactly on the bisector of two centroids (ties), rows a few float32 or float64 roundings away from
+a bisector, and rows far from every centroid.
+
+Every row must get the cluster KMeans.predict returns, except the rows whose two nearest centroids
+are equidistant within the float64 rounding error of the distances. For those, KMeans.predict has
+no stable answer: the cluster it returns for a row depends on the other rows of the batch (the
+matrix product blocking), which is reported as 'unstable'. Such a row must still get one of its
+nearest clusters, checked against distances computed in extended precision.
+
+Usage (from the repository root):
+    python -m benchmarks.router_equivalence [rows]
+
+The rows of every case default to 100k. The exit status is 1 if any row fails the check.
+"""
+import sys
+import warnings
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans
+from data_preprocessing.centroid_router import Centroid_Router
+from data_preprocessing.encoder import Categorical_Encoder
+from data_preprocessing.preprocessing import ORDINAL_MAPPINGS
+from benchmarks.encoder_benchmark import make_data
+
+EPSILON64 = np.finfo(np.float64).eps
+
+
+def bisector_rows(centers, rows, offsets, rng):
+    """
+    Returns rows on the bisector of two random centroids, moved along the line between them by
+    offsets (relative to the distance of the centroids), and random moves along the bisector.
+    """
+    first = rng.integers(0, len(centers), size=rows)
+    second = (first + rng.integers(1, len(centers), size=rows)) % len(centers)
+    direction = centers[second] - centers[first]
+    midpoint = (centers[first] + centers[second]) / 2
+    # a random move orthogonal to the line between the centroids keeps the row on the bisector
+    move = rng.normal(size=midpoint.shape) * np.abs(centers).mean()
+    move -= direction * (np.einsum('ij,ij->i', move, direction) / np.einsum('ij,ij->i', direction, direction))[:, None]
+    return midpoint + move + direction * rng.choice(offsets, size=rows)[:, None]
+
+
+def cases(features, centers, rows, rng):
+    eps32 = np.finfo(np.float32).eps
+    yield 'insurance rows', features
+    yield 'exact ties', (centers[rng.integers(0, len(centers), size=rows)] + centers[rng.integers(0, len(centers), size=rows)]) / 2
+    yield 'on the bisector', bisector_rows(centers, rows, [0.0], rng)
+    yield 'float32 roundings from the bisector', bisector_rows(centers, rows, np.arange(-8, 9) * eps32, rng)
+    yield 'float64 roundings from the bisector', bisector_rows(centers, rows, np.arange(-8, 9) * EPSILON64, rng)
+    yield 'far rows', features * 1000 + rng.normal(size=features.shape) * 1e6
+
+
+def exact_distances(data, centers):
+    """The squared distances of the rows to the centroids, in extended precision."""
+    data, centers = data.astype(np.longdouble), centers.astype(np.longdouble)
+    return np.stack([((data - center) ** 2).sum(axis=1) for center in centers], axis=1)
+
+
+def float64_ties(data, centers, clusters, expected):
+    """
+    Returns whether clusters and expected are equally near every row within the float64 rounding
+    error of |x|^2 - 2 x.c + |c|^2, and whether clusters is a nearest cluster within that error.
+    """
+    distances = exact_distances(data, centers)
+    rows = np.arange(len(data))
+    bound = 4 * (data.shape[1] + 2) * EPSILON64 * (np.einsum('ij,ij->i', data, data) + np.einsum('ij,ij->i', centers, centers).max())
+    nearest = distances[rows, clusters] - distances.min(axis=1) <= bound
+    tie = np.abs(distances[rows, clusters] - distances[rows, expected]) <= bound
+    return tie, nearest
+
+
+def main(rows):
+    warnings.filterwarnings('ignore')
+    rng = np.random.default_rng(42)
+    encoder = Categorical_Encoder(ORDINAL_MAPPINGS).fit(make_data(10000).drop(columns=['fraud_reported']))
+    features = encoder.transform(make_data(rows, seed=7).drop(columns=['fraud_reported']))
+    columns = features.columns
+    features = features.to_numpy(dtype=np.float64)
+    failures = 0
+    print('%9s %38s %10s %10s %10s %10s' % ('clusters', 'case', 'rows', 'different', 'unstable', 'failed'))
+    for n_clusters in (2, 3, 4, 6, 10):
+        # fitted on a DataFrame as in training
+        kmeans = KMeans(n_clusters=n_clusters, init='k-means++', random_state=42, n_init=10)
+        kmeans.fit(pd.DataFrame(features[:10000], columns=columns))
+        router = Centroid_Router(kmeans.cluster_centers_)
+        for name, data in cases(features, kmeans.cluster_centers_, rows, rng):
+            expected = kmeans.predict(pd.DataFrame(data, columns=columns))
+            clusters = router.predict(data)
+            different = np.flatnonzero(clusters != expected)
+            # the clusters KMeans.predict returns for the same rows predicted one at a time
+            alone = np.array([kmeans.predict(pd.DataFrame(data[[row]], columns=columns))[0] for row in different], dtype=np.int64)
+            tie, nearest = float64_ties(data[different], kmeans.cluster_centers_, clusters[different], expected[different])
+            failed = int(np.count_nonzero(~(tie & nearest)))
+            failures += failed
+            print('%9d %38s %10d %10d %10d %10d' % (n_clusters, name, len(data), len(different),
+                                                     np.count_nonzero(alone != expected[different]), failed))
+    print('equivalent' if failures == 0 else '%d rows routed to another cluster than KMeans.predict' % failures)
+    return failures
+
+
+if __name__ == '__main__':
+    sys.exit(1 if main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000) else 0)
@@ -0,0 +1,128 @@
+"""
+Equivalence check of Compiled_Scorer against the cluster by cluster prediction it replaced in
+predictBatch: KMeans.predict, then the scaler and the model of each cluster, with model.predict
+for the prediction and predict_proba for the score.
+
+The clusters are trained as train_cluster does, with Logistic Regression models, XGBoost models,
+XGBoost models stopped early (predicted up to their best iteration) and linear-booster XGBoost
+models (predicted by their own predict_proba), alone and mixed. Every row must get the same
+cluster and the same prediction, and a score equal within float64 rounding, except a Logistic
+Regression row whose decision is within rounding of 0 (the scorer folds the scaler into the
+coefficients), which may get either prediction.
+
+Usage (from the repository root):
+    python -m benchmarks.scorer_equivalence [rows]
+
+The rows default to 100k. The exit status is 1 if any row fails the check.
+"""
+import sys
+import warnings
+import numpy as np
+from sklearn.cluster import KMeans
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
+from xgboost import XGBClassifier
+from best_model_finder.scorer import Compiled_Scorer
+from data_preprocessing.pipeline import Preprocessing_Pipeline
+from data_preprocessing.preprocessing import NUMERICAL_COLUMNS, LABEL_MAPPING
+from benchmarks.encoder_benchmark import make_data
+
+N_CLUSTERS = 4
+
+
+def logistic_regression(x_train, y_train):
+    return LogisticRegression(max_iter=1000).fit(x_train, y_train)
+
+
+def xgboost(x_train, y_train):
+    return XGBClassifier(n_estimators=50, max_depth=4, n_jobs=1).fit(x_train, y_train)
+
+
+def xgboost_early_stopping(x_train, y_train):
+    x_train, x_eval, y_train, y_eval = train_test_split(x_train, y_train, test_size=1 / 3, random_state=355)
+    model = XGBClassifier(n_estimators=200, learning_rate=1.0, max_depth=8, early_stopping_rounds=5, n_jobs=1)
+    return model.fit(x_train, y_train, eval_set=[(x_eval, y_eval)], verbose=False)
+
+
+def xgboost_linear(x_train, y_train):
+    return XGBClassifier(booster='gblinear', n_estimators=20, n_jobs=1).fit(x_train, y_train)
+
+
+CONFIGURATIONS = [
+    ('Logistic Regression', [logistic_regression]),
+    ('XGBoost', [xgboost]),
+    ('XGBoost early stopping', [xgboost_early_stopping]),
+    ('XGBoost gblinear', [xgboost_linear]),
+    ('mixed', [logistic_regression, xgboost, xgboost_early_stopping, xgboost_linear]),
+]
+
+
+def train(features, labels, pipeline, model_kinds):
+    """
+    Returns the KMeans model and the model of every cluster, trained as train_cluster does, and
+    records the scaler of every cluster in the pipeline.
+
+    """
+    kmeans = KMeans(n_clusters=N_CLUSTERS, init='k-means++', random_state=42, n_init=10).fit(features)
+    clusters = kmeans.predict(features)
+    pipeline.scalers = {}
+    models = {}
+    for cluster in range(N_CLUSTERS):
+        cluster_features = features[clusters == cluster]
+        pipeline.add_scaler(cluster, StandardScaler().fit(cluster_features[NUMERICAL_COLUMNS]))
+        x_train = pipeline.scale_numerical_columns(cluster_features, cluster)
+        models[cluster] = model_kinds[cluster % len(model_kinds)](x_train, labels[clusters == cluster])
+    return kmeans, models
+
+
+def cluster_by_cluster(data, kmeans, pipeline, models):
+    """The prediction loop of predictBatch without a compiled scorer."""
+    clusters = kmeans.predict(data)
+    predictions = np.empty(len(data), dtype=object)
+    scores = np.empty(len(data), dtype=np.float64)
+    decisions = np.full(len(data), np.inf)
+    for i in np.unique(clusters):
+        positions = np.flatnonzero(clusters == i)
+        cluster_data = pipeline.scale_numerical_columns(data.iloc[positions], i)
+        model = models[i]
+        result = model.predict(cluster_data)
+        predictions[positions] = np.where(result == 0, 'N', 'Y')
+        scores[positions] = model.predict_proba(cluster_data)[:, 1]
+        if isinstance(model, LogisticRegression):
+            decisions[positions] = model.decision_function(cluster_data)
+    return predictions, scores, clusters, decisions
+
+
+def main(rows):
+    warnings.filterwarnings('ignore')
+    training = make_data(10000, seed=1)
+    labels = training.pop('fraud_reported').map(LABEL_MAPPING).to_numpy()
+    pipeline = Preprocessing_Pipeline().fit(training)
+    # the training features are encoded with the fitted vocabulary, as by encode_categorical_columns in training
+    features = pipeline.encoder.transform(training)
+    pipeline.set_feature_columns(features)
+    data = pipeline.transform(make_data(rows, seed=2).drop(columns=['fraud_reported']))
+    failures = 0
+    print('%24s %10s %10s %12s %10s %14s %10s' % ('models', 'rows', 'clusters', 'predictions', 'ties', 'max score diff', 'failed'))
+    for name, model_kinds in CONFIGURATIONS:
+        kmeans, models = train(features, labels, pipeline, model_kinds)
+        expected, expected_scores, expected_clusters, decisions = cluster_by_cluster(data, kmeans, pipeline, models)
+        predictions, scores, clusters = Compiled_Scorer(kmeans, pipeline, models).predict(data)
+        different_clusters = clusters != expected_clusters
+        different = predictions != expected
+        # rows whose decision the folded coefficients may round to the other side of 0
+        ties = different & (np.abs(decisions) <= 1e-9)
+        score_difference = np.abs(scores - expected_scores)
+        wrong_scores = ~np.isclose(scores, expected_scores, rtol=1e-9, atol=1e-12)
+        failed = int(np.count_nonzero(different_clusters | (different & ~ties) | wrong_scores))
+        failures += failed
+        print('%24s %10d %10d %12d %10d %14.2e %10d' % (name, len(data), np.count_nonzero(different_clusters),
+                                                        np.count_nonzero(different), np.count_nonzero(ties),
+                                                        score_difference.max(), failed))
+    print('equivalent' if failures == 0 else '%d rows scored differently from the cluster by cluster prediction' % failures)
+    return failures
+
+
+if __name__ == '__main__':
+    sys.exit(1 if main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000) else 0)
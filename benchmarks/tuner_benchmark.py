@@ -0,0 +1,60 @@
+"""
+Benchmark of the hyperparameter search engines of Model_Finder on data/insuranceFraud.csv,
+comparing the search time and the test AUC of the tuned XGBoost and Logistic Regression models.
+
+Usage (from the repository root):
+    python -m benchmarks.tuner_benchmark
+"""
+import io
+import time
+import warnings
+import numpy as np
+import pandas as pd
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import train_test_split
+from application_logging.logger import App_Logger
+from best_model_finder.tuner import Model_Finder
+from data_preprocessing import preprocessing
+
+CONFIGURATIONS = [
+    ('grid (previous)', {'search_strategy': {'logistic_regression': 'grid', 'xgboost': 'grid'}, 'early_stopping_rounds': None}),
+    ('grid + early stopping', {'search_strategy': {'logistic_regression': 'grid', 'xgboost': 'grid'}}),
+    ('halving', {'search_strategy': {'logistic_regression': 'halving', 'xgboost': 'halving'}}),
+    ('random (n_iter=8)', {'search_strategy': {'logistic_regression': 'random', 'xgboost': 'random'}, 'n_iter': 8}),
+]
+
+
+def load_features():
+    log = io.StringIO()
+    preprocessor = preprocessing.Preprocessor(log, App_Logger())
+    data = pd.read_csv('data/insuranceFraud.csv')
+    data = preprocessor.remove_columns(data, preprocessing.COLUMNS_TO_DROP)
+    data = data.replace('?', np.nan)
+    data = data.fillna(data.mode().iloc[0])
+    data = preprocessor.encode_categorical_columns(data)
+    features, labels = preprocessor.separate_label_feature(data, 'fraud_reported')
+    x_train, x_test, y_train, y_test = train_test_split(features, labels, test_size=1 / 3, random_state=355, stratify=labels)
+    x_train = preprocessor.scale_numerical_columns(x_train)
+    x_test = preprocessor.scale_numerical_columns(x_test)[x_train.columns]
+    return x_train, x_test, y_train, y_test
+
+
+def main():
+    warnings.filterwarnings('ignore')
+    x_train, x_test, y_train, y_test = load_features()
+    print('%-24s %10s %8s %10s %8s' % ('strategy', 'xgb s', 'xgb AUC', 'logreg s', 'lr AUC'))
+    for name, options in CONFIGURATIONS:
+        model_finder = Model_Finder(io.StringIO(), App_Logger(), **options)
+        start = time.perf_counter()
+        xgb = model_finder.get_best_params_for_xgboost(x_train, y_train)
+        xgb_time = time.perf_counter() - start
+        start = time.perf_counter()
+        logistic_regression = model_finder.get_best_params_for_logistic_regression(x_train, y_train)
+        lr_time = time.perf_counter() - start
+        print('%-24s %10.2f %8.4f %10.2f %8.4f' % (
+            name, xgb_time, roc_auc_score(y_test, xgb.predict_proba(x_test)[:, 1]),
+            lr_time, roc_auc_score(y_test, logistic_regression.predict_proba(x_test)[:, 1])))
+
+
+if __name__ == '__main__':
+    main()
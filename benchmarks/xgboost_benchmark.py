@@ -0,0 +1,45 @@
+"""
+Latency benchmark of the XGBoost cluster models: XGBClassifier.predict_proba on the scaled
+DataFrame, as the cluster-by-cluster prediction calls it, against Booster.inplace_predict on a
+contiguous float32 array in the feature order of the booster, as Compiled_Scorer calls it. The
+scores must be identical.
+
+Usage (from the repository root):
+    python -m benchmarks.xgboost_benchmark [rows ...]
+
+The rows default to 1, 100, 10k and 1M. The model has 100 trees fitted on 10k rows and
+predicts with one thread.
+"""
+import sys
+import numpy as np
+from xgboost import XGBClassifier
+from data_preprocessing.encoder import Categorical_Encoder
+from data_preprocessing.preprocessing import ORDINAL_MAPPINGS, LABEL_MAPPING
+from benchmarks.encoder_benchmark import make_data
+from benchmarks.router_benchmark import best_of
+
+
+def main(sizes):
+    encoder = Categorical_Encoder(dict(ORDINAL_MAPPINGS, fraud_reported=LABEL_MAPPING)).fit(make_data(10000))
+    train = encoder.transform(make_data(10000))
+    model = XGBClassifier(objective='binary:logistic', n_estimators=100, n_jobs=1)
+    model.fit(train.drop(columns=['fraud_reported']), train['fraud_reported'])
+    booster = model.get_booster()
+    columns = booster.feature_names
+    print('%10s %20s %20s %9s' % ('rows', 'predict_proba ms', 'inplace_predict ms', 'speedup'))
+    for rows in sizes:
+        features = encoder.transform(make_data(rows, seed=rows))[columns]
+        array = features.to_numpy(dtype=np.float64)
+        repeat = 200 if rows <= 100 else 3
+
+        def inplace(data):
+            return booster.inplace_predict(np.ascontiguousarray(data, dtype=np.float32), validate_features=False)
+
+        wrapper_time, expected = best_of(model.predict_proba, features, repeat)
+        inplace_time, scores = best_of(inplace, array, repeat)
+        assert np.array_equal(expected[:, 1], scores)
+        print('%10d %20.3f %20.3f %8.1fx' % (rows, wrapper_time * 1e3, inplace_time * 1e3, wrapper_time / inplace_time))
+
+
+if __name__ == '__main__':
+    main([int(size) for size in sys.argv[1:]] or [1, 100, 10000, 1000000])
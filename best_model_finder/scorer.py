@@ -0,0 +1,186 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+from scipy.special import expit
+from sklearn.linear_model import LogisticRegression
+from xgboost import XGBClassifier
+from data_preprocessing.centroid_router import Centroid_Router
+from data_preprocessing.preprocessing import NUMERICAL_COLUMNS
+
+
+class Compiled_Scorer:
+    """
+    This class scores an encoded batch with the KMeans centroids and the model of every cluster in one
+    vectorized pass, instead of filtering, rescaling and predicting the rows of each cluster in turn.
+
+    It is built at the end of training and saved next to the models in the models directory. The
+    rows are routed to their cluster by a Centroid_Router built from the KMeans centroids.
+
+    The scaler of each Logistic Regression cluster is folded into its coefficients, and the
+    coefficients of all of them are stacked in one matrix, so every Logistic Regression row is
+    scored by a single matrix product. The rows of the other clusters are grouped with one argsort
+    over the cluster ids and each cluster is predicted with one call on its contiguous rows. XGBoost
+    clusters keep only their booster, called with inplace_predict on a contiguous float32 array in
+    the feature order of the booster, without building a DMatrix or validating a DataFrame.
+
+    The scorer is shared by the concurrent requests served from the model registry. A booster is
+    never reconfigured once it predicts: a request asking for another number of XGBoost threads
+    than the default predicts with copies of the boosters configured for that number, made once
+    and kept, and inplace_predict is safe to call from several threads on the same booster.
+
+    Args:
+    kmeans (sklearn.cluster.KMeans): The fitted clustering model.
+    preprocessing_pipeline (Preprocessing_Pipeline): The fitted preprocessing, with the feature
+                                                     columns and the scaler of every cluster.
+    models (dict): The best model of every cluster.
+    n_threads (int): The threads of the XGBoost predictions, all the cores if None.
+
+    Methods:
+    boosters_for: Returns the boosters of the XGBoost clusters configured for a number of threads.
+    predict: Returns the 'Y'/'N' prediction, the fraud score and the cluster of every row of an encoded batch.
+    """
+
+    def __init__(self, kmeans, preprocessing_pipeline, models, n_threads=None):
+        self.router = Centroid_Router(kmeans.cluster_centers_)
+        self.feature_columns = list(preprocessing_pipeline.feature_columns)
+        # the layout the cluster models were trained on: the scaled numerical columns first
+        self.model_columns = NUMERICAL_COLUMNS + [col for col in self.feature_columns if col not in NUMERICAL_COLUMNS]
+        self.permutation = np.array([self.feature_columns.index(col) for col in self.model_columns])
+        self.n_numerical = len(NUMERICAL_COLUMNS)
+        self.n_clusters = int(kmeans.n_clusters)
+
+        self.scalers = {int(cluster): scaler for cluster, scaler in preprocessing_pipeline.scalers.items()}
+        self.models = {}
+        self.boosters = {}
+        # position of each cluster in the stacked coefficients, -1 for the clusters predicted by their model
+        self.linear_index = np.full(self.n_clusters, -1, dtype=np.int64)
+        weights, intercepts, classes = [], [], []
+        for cluster, model in sorted(models.items()):
+            cluster = int(cluster)
+            if self.is_linear(model):
+                mean, scale = self.scalers[cluster]
+                coef = np.asarray(model.coef_[0], dtype=np.float64).copy()
+                intercept = float(model.intercept_[0])
+                # w.(x - mean) / scale + b == (w / scale).x + (b - w.(mean / scale))
+                intercept -= np.dot(coef[:self.n_numerical], mean / scale)
+                coef[:self.n_numerical] /= scale
+                self.linear_index[cluster] = len(weights)
+                weights.append(coef)
+                intercepts.append(intercept)
+                classes.append(model.classes_)
+            elif self.is_booster(model):
+                booster = model.get_booster()
+                # the columns of the cluster rows in the order the booster was trained on
+                names = booster.feature_names or self.model_columns
+                columns = np.array([self.model_columns.index(name) for name in names])
+                try:
+                    iteration_range = (0, booster.best_iteration + 1)  # as XGBClassifier.predict after early stopping
+                except AttributeError:
+                    iteration_range = (0, 0)
+                self.boosters[cluster] = (booster, columns, iteration_range)
+            else:
+                self.models[cluster] = model
+        self.weights = np.column_stack(weights) if weights else np.zeros((len(self.model_columns), 0))
+        self.intercepts = np.asarray(intercepts, dtype=np.float64)
+        self.classes = np.asarray(classes) if classes else np.zeros((0, 2), dtype=np.int64)
+        self.default_threads = n_threads
+        for booster, _, _ in self.boosters.values():
+            booster.set_param({'nthread': n_threads or 0})
+        # the boosters of every other number of threads asked for, by number of threads
+        self.thread_boosters = {}
+        self.lock = threading.Lock()
+
+    def is_linear(self, model):
+        return isinstance(model, LogisticRegression) and model.coef_.shape[0] == 1 and len(model.classes_) == 2
+
+    def is_booster(self, model):
+        return isinstance(model, XGBClassifier) and model.objective == 'binary:logistic' and model.booster in (None, 'gbtree')
+
+    def __getstate__(self):
+        state = dict(vars(self))
+        # the lock cannot be pickled, and the copies are made again on demand
+        del state['lock'], state['thread_boosters']
+        return state
+
+    def __setstate__(self, state):
+        vars(self).update(state)
+        self.thread_boosters = {}
+        self.lock = threading.Lock()
+
+    def boosters_for(self, n_threads):
+        """
+        Returns the booster of every XGBoost cluster configured for the number of threads.
+
+        Args:
+        n_threads (int): The number of threads, the default of the scorer if None, limited to the
+                         number of cores so at most one copy per number of cores is kept.
+
+        Returns:
+        dict: The booster of every XGBoost cluster.
+        """
+        if n_threads is not None:
+            n_threads = max(0, min(int(n_threads), os.cpu_count() or 1))
+        if n_threads is None or n_threads == (self.default_threads or 0):
+            return {cluster: booster for cluster, (booster, _, _) in self.boosters.items()}
+        with self.lock:
+            boosters = self.thread_boosters.get(n_threads)
+            if boosters is None:
+                boosters = {}
+                for cluster, (booster, _, _) in self.boosters.items():
+                    boosters[cluster] = booster.copy()
+                    boosters[cluster].set_param({'nthread': n_threads})
+                self.thread_boosters[n_threads] = boosters
+        return boosters
+
+    def predict(self, data, n_threads=None):
+        """
+        Returns the prediction, the score and the cluster of every row of an encoded batch.
+
+        Args:
+        data (pandas.DataFrame): The batch encoded by Preprocessing_Pipeline.transform, not scaled.
+        n_threads (int): The threads of the XGBoost predictions of this batch, those the scorer was
+                         built with if None. 0 uses all the cores.
+
+        Returns:
+        tuple: The 'Y'/'N' predictions, the probabilities of fraud and the cluster ids, numpy arrays
+               in the row order of data.
+        """
+        features = data.to_numpy(dtype=np.float64)
+        clusters = self.router.predict(features)
+        features = features[:, self.permutation]
+        predictions = np.zeros(len(features), dtype=np.int64)
+        scores = np.zeros(len(features), dtype=np.float64)
+
+        linear = self.linear_index[clusters]
+        rows = np.flatnonzero(linear >= 0)
+        if len(rows):
+            decision = (features[rows] @ self.weights)[np.arange(len(rows)), linear[rows]] + self.intercepts[linear[rows]]
+            predictions[rows] = self.classes[linear[rows], (decision > 0).astype(np.int64)]
+            scores[rows] = expit(decision)
+
+        if self.boosters or self.models:
+            boosters = self.boosters_for(n_threads) if self.boosters else {}
+            order = np.argsort(clusters, kind='stable')
+            bounds = np.concatenate(([0], np.cumsum(np.bincount(clusters, minlength=self.n_clusters))))
+            for cluster in list(self.boosters) + list(self.models):
+                cluster_rows = order[bounds[cluster]:bounds[cluster + 1]]
+                if len(cluster_rows) == 0:
+                    continue
+                mean, scale = self.scalers[cluster]
+                cluster_features = features[cluster_rows]
+                cluster_features[:, :self.n_numerical] = (cluster_features[:, :self.n_numerical] - mean) / scale
+                if cluster in self.boosters:
+                    _, columns, iteration_range = self.boosters[cluster]
+                    booster = boosters[cluster]
+                    # one call per cluster, the prediction is 1 for a probability above 0.5 as XGBClassifier.predict
+                    probabilities = booster.inplace_predict(np.ascontiguousarray(cluster_features[:, columns], dtype=np.float32),
+                                                            iteration_range=iteration_range, validate_features=False)
+                    predictions[cluster_rows] = probabilities > 0.5
+                    scores[cluster_rows] = probabilities
+                else:
+                    probabilities = self.models[cluster].predict_proba(pd.DataFrame(cluster_features, columns=self.model_columns))
+                    predictions[cluster_rows] = self.models[cluster].classes_[np.argmax(probabilities, axis=1)]
+                    scores[cluster_rows] = probabilities[:, 1]
+
+        return np.where(predictions == 0, 'N', 'Y'), scores, clusters
@@ -1,47 +1,185 @@
+import time
+import numpy as np
+from scipy.stats import loguniform, randint
 from sklearn.linear_model import LogisticRegression
-from sklearn.model_selection import GridSearchCV
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401 (enables HalvingGridSearchCV)
+from sklearn.model_selection import GridSearchCV, HalvingGridSearchCV, RandomizedSearchCV, train_test_split
 from xgboost import XGBClassifier
 from sklearn.metrics import roc_auc_score, accuracy_score
+from application_logging.logger import DEBUG
+
+# the search engines that can be selected for each model family
+SEARCH_STRATEGIES = ('grid', 'halving', 'random')
+
+
+class Time_Budget_Spent(Exception):
+    """
+    Raised by a Budgeted_Search when its deadline has passed, to stop the search.
+    """
+
+
+class Budgeted_Search:
+    """
+    This mixin makes a scikit-learn search evaluate its candidates one at a time (with all their
+    cross-validation folds) and stop before the next candidate once the deadline has passed. The
+    candidates evaluated so far are kept in partial_results, in the format of cv_results_. A
+    candidate whose fits all fail (e.g. a penalty its solver does not support) is left out of the
+    results, as its score would be the lowest; the search fails only if every candidate does.
+
+    Args:
+        deadline (float): The time.monotonic() time after which no candidate is started, None for
+                          no deadline. The first candidate is always evaluated.
+    """
+    deadline = None
+    partial_results = None
+
+    def _run_search(self, evaluate_candidates):
+        self.partial_results = None
+
+        failure = None
+
+        def evaluate_until_deadline(candidate_params, cv=None, more_results=None):
+            nonlocal failure
+            for i, params in enumerate(list(candidate_params)):
+                if self.deadline is not None and self.partial_results is not None and time.monotonic() >= self.deadline:
+                    raise Time_Budget_Spent()
+                candidate_results = None if more_results is None else {key: [value[i]] for key, value in more_results.items()}
+                try:
+                    self.partial_results = evaluate_candidates([params], cv, candidate_results)
+                except ValueError as e:
+                    if 'fits failed' not in str(e):
+                        raise
+                    failure = e
+            if self.partial_results is None:
+                raise failure
+            return self.partial_results
+
+        super()._run_search(evaluate_until_deadline)
+
+    def best_partial_params(self):
+        """
+        Returns the best parameters of the candidates evaluated before the search was stopped,
+        among those of the last iteration for successive halving (the most resources).
+        """
+        results = self.partial_results
+        scores = np.asarray(results['mean_test_score'], dtype=np.float64)
+        if 'iter' in results:
+            scores = np.where(np.asarray(results['iter']) == max(results['iter']), scores, np.nan)
+        if np.all(np.isnan(scores)):
+            return {}
+        return results['params'][int(np.nanargmax(scores))]
+
+
+class Budgeted_Grid_Search(Budgeted_Search, GridSearchCV):
+    pass
+
+
+class Budgeted_Halving_Grid_Search(Budgeted_Search, HalvingGridSearchCV):
+    pass
+
+
+class Budgeted_Randomized_Search(Budgeted_Search, RandomizedSearchCV):
+    pass
+
 
 class Model_Finder:
     """
     This class is used to find the model with the best accuracy and AUC score.
+
+    Args:
+        n_jobs (int): The number of threads used by XGBoost, -1 for all cores. Lower it when
+                      several clusters are tuned in parallel processes.
+        search_strategy (dict): The search engine of each model family ('logistic_regression', 'xgboost'):
+                                'grid' (exhaustive, the default), 'halving' (successive halving over the
+                                grid) or 'random' (n_iter candidates sampled from distributions).
+        n_iter (int): The number of candidates evaluated by the 'random' strategy.
+        time_budget (float): The wall-clock budget in seconds of the searches of get_best_model. The
+                             searches evaluate their candidates one at a time and stop before the next
+                             candidate once the budget is spent, using the best candidate evaluated so
+                             far; a family whose search would start after the budget is spent is fitted
+                             with default parameters. The budget is exceeded by at most the candidate
+                             running when it is spent (its cross-validation fits) and the final fit of
+                             each family.
+        early_stopping_rounds (int): The XGBoost refit stops after this many rounds without improvement
+                                     on a validation fold held out from the training data. None disables it.
     """
 
-    def __init__(self, file_object, logger_object):
+    def __init__(self, file_object, logger_object, n_jobs=-1, search_strategy=None, n_iter=10,
+                 time_budget=None, early_stopping_rounds=10):
         self.file_object = file_object
         self.logger_object = logger_object
+        self.n_jobs = n_jobs
+        self.search_strategy = {'logistic_regression': 'grid', 'xgboost': 'grid'}
+        self.search_strategy.update(search_strategy or {})
+        for family, strategy in self.search_strategy.items():
+            if strategy not in SEARCH_STRATEGIES:
+                raise ValueError('Unknown search strategy %s for %s' % (strategy, family))
+        self.n_iter = n_iter
+        self.time_budget = time_budget
+        self.early_stopping_rounds = early_stopping_rounds
+        self.deadline = None
         self.logistic_regression = LogisticRegression()
-        self.xgb = XGBClassifier(objective='binary:logistic', n_jobs=-1)
+        self.xgb = XGBClassifier(objective='binary:logistic', n_jobs=self.n_jobs)
+
+    def search(self, family, estimator, param_grid, param_distributions, train_x, train_y):
+        """
+        Runs the search engine selected for the model family.
+
+        Returns:
+            dict: The best parameters, those of the best candidate evaluated in time if the time
+                  budget was spent during the search, or an empty dict if it was spent before.
+        """
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.logger_object.log(self.file_object, 'Time budget spent, skipping the %s search and using default parameters' % family)
+            return {}
+        strategy = self.search_strategy[family]
+        # only the best parameters are used, the model is fitted again by the caller
+        if strategy == 'halving':
+            search = Budgeted_Halving_Grid_Search(estimator, param_grid, cv=5, factor=3, random_state=355, verbose=1, refit=False)
+        elif strategy == 'random':
+            search = Budgeted_Randomized_Search(estimator, param_distributions, n_iter=self.n_iter, cv=5, random_state=355,
+                                                verbose=1, refit=False)
+        else:
+            search = Budgeted_Grid_Search(estimator, param_grid, cv=5, verbose=3, refit=False)
+        search.deadline = self.deadline
+        start = time.perf_counter()
+        try:
+            search.fit(train_x, train_y)
+            best_params = search.best_params_
+        except Time_Budget_Spent:
+            best_params = search.best_partial_params()
+            self.logger_object.log(self.file_object, 'Time budget spent, the %s search stopped after %d candidates' % (
+                family, len(search.partial_results['params'])))
+        self.logger_object.log(self.file_object, '%s %s search took %.2f seconds' % (family, strategy, time.perf_counter() - start))
+        return best_params
 
     def get_best_params_for_logistic_regression(self, train_x, train_y):
         """
         Get the parameters for the Logistic Regression Algorithm that give the best accuracy.
         Use Hyper Parameter Tuning.
         """
-        self.logger_object.log(self.file_object, 'Entered get_best_params_for_logistic_regression method')
+        self.logger_object.log(self.file_object, 'Entered get_best_params_for_logistic_regression method', level=DEBUG)
         try:
             # Initialize with different combinations of parameters
             param_grid = {
                 "penalty": ['l1', 'l2'],
                 "C": [0.01, 0.1, 1.0, 10.0]
             }
+            param_distributions = {
+                "penalty": ['l1', 'l2'],
+                "C": loguniform(0.01, 10.0)
+            }
 
-            # Create an object of the Grid Search class
-            grid = GridSearchCV(estimator=self.logistic_regression, param_grid=param_grid, cv=5, verbose=3)
-            # Find the best parameters
-            grid.fit(train_x, train_y)
-
-            # Extract the best parameters
-            penalty = grid.best_params_['penalty']
-            C = grid.best_params_['C']
+            # Find the best parameters with the selected search engine
+            best_params = self.search('logistic_regression', self.logistic_regression, param_grid,
+                                      param_distributions, train_x, train_y)
 
             # Create a new model with the best parameters
-            self.logistic_regression = LogisticRegression(penalty=penalty, C=C)
+            self.logistic_regression = LogisticRegression(**best_params)
             # Train the new model
             self.logistic_regression.fit(train_x, train_y)
             self.logger_object.log(self.file_object,
-                                   'Logistic Regression best params: ' + str(grid.best_params_) +
+                                   'Logistic Regression best params: ' + str(best_params) +
                                    '. Exited get_best_params_for_logistic_regression method')
             return self.logistic_regression
         except Exception as e:
@@ -55,33 +193,30 @@ class Model_Finder:
     def get_best_params_for_xgboost(self, train_x, train_y):
         """
         Get the parameters for the XGBoost Algorithm that give the best accuracy.
-        Use Hyper Parameter Tuning.
+        Use Hyper Parameter Tuning, then refit with early stopping on a validation fold.
         """
-        self.logger_object.log(self.file_object, 'Entered get_best_params_for_xgboost method')
+        self.logger_object.log(self.file_object, 'Entered get_best_params_for_xgboost method', level=DEBUG)
         try:
             # Initialize with different combinations of parameters
             param_grid_xgboost = {
                 "n_estimators": [100, 130],
-                "learning_rate": ['0.1', '0.01'],
+                "learning_rate": [0.1, 0.01],
                 "max_depth": range(8, 10, 1)
             }
+            param_distributions_xgboost = {
+                "n_estimators": randint(50, 200),
+                "learning_rate": loguniform(0.01, 0.3),
+                "max_depth": randint(3, 10)
+            }
 
-            # Create an object of the Grid Search class
-            grid = GridSearchCV(XGBClassifier(objective='binary:logistic'), param_grid_xgboost, verbose=3, cv=5)
-            # Find the best parameters
-            grid.fit(train_x, train_y)
-
-            # Extract the best parameters
-            learning_rate = grid.best_params_['learning_rate']
-            max_depth = grid.best_params_['max_depth']
-            n_estimators = grid.best_params_['n_estimators']
+            # Find the best parameters with the selected search engine
+            best_params = self.search('xgboost', XGBClassifier(objective='binary:logistic', n_jobs=self.n_jobs),
+                                      param_grid_xgboost, param_distributions_xgboost, train_x, train_y)
 
-            # Create a new model with the best parameters
-            self.xgb = XGBClassifier(learning_rate=learning_rate, max_depth=max_depth, n_estimators=n_estimators, n_jobs=-1)
-            # Train the new model
-            self.xgb.fit(train_x, train_y)
+            # Create a new model with the best parameters and train it
+            self.xgb = self.fit_xgboost_with_early_stopping(best_params, train_x, train_y)
             self.logger_object.log(self.file_object,
-                                   'XGBoost best params: ' + str(grid.best_params_) +
+                                   'XGBoost best params: ' + str(best_params) +
                                    '. Exited get_best_params_for_xgboost method')
             return self.xgb
         except Exception as e:
@@ -92,12 +227,31 @@ class Model_Finder:
                                    'XGBoost Parameter tuning failed. Exited get_best_params_for_xgboost method')
             raise Exception()
 
+    def fit_xgboost_with_early_stopping(self, params, train_x, train_y):
+        """
+        Fits XGBoost with the given parameters. If early stopping is enabled and both classes are
+        present often enough, a stratified validation fold is held out to stop adding trees once
+        the validation loss stops improving.
+        """
+        if self.early_stopping_rounds is None or train_y.value_counts().min() < 2:
+            xgb = XGBClassifier(objective='binary:logistic', n_jobs=self.n_jobs, **params)
+            xgb.fit(train_x, train_y)
+            return xgb
+        fit_x, val_x, fit_y, val_y = train_test_split(train_x, train_y, test_size=0.2, stratify=train_y, random_state=355)
+        xgb = XGBClassifier(objective='binary:logistic', n_jobs=self.n_jobs, eval_metric='logloss',
+                            early_stopping_rounds=self.early_stopping_rounds, **params)
+        xgb.fit(fit_x, fit_y, eval_set=[(val_x, val_y)], verbose=False)
+        self.logger_object.log(self.file_object, 'XGBoost early stopping kept %d trees' % (xgb.best_iteration + 1))
+        return xgb
+
     def get_best_model(self, train_x, train_y, test_x, test_y):
         """
         Find the model with the best AUC score.
         Output: The best model name and the model object.
         """
-        self.logger_object.log(self.file_object, 'Entered get_best_model method')
+        self.logger_object.log(self.file_object, 'Entered get_best_model method', level=DEBUG)
+        if self.time_budget is not None:
+            self.deadline = time.monotonic() + self.time_budget
         try:
             # Create the best model for Logistic Regression
             self.logistic_regression = self.get_best_params_for_logistic_regression(train_x, train_y)
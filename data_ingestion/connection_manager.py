@@ -0,0 +1,91 @@
+import os
+import sqlite3
+import threading
+from urllib.request import pathname2url
+from application_logging.logger import DEBUG
+
+
+class Connection_Manager:
+    """
+    This class opens the SQLite connections of a pipeline run: one read-write connection per
+    database, reused by every operation of the run, and short-lived read-only connections for
+    the readers such as the export.
+
+    The databases are put in WAL journal mode, so readers run while the ingestion writes, with
+    synchronous=NORMAL (a commit is durable once the WAL is checkpointed, and the database cannot
+    be corrupted by a crash), a large page cache and a large page size.
+
+    The read-write connection can be used from another thread than the one that opened it (e.g.
+    the database writer of the validation pipelines), but by one thread at a time.
+
+    Args:
+        logger: The App_Logger the connections are logged with.
+        log_file (str): The log file of the connections.
+        cache_size_kib (int): The page cache of every connection, in KiB.
+        page_size (int): The page size of the databases created by the manager. The page size of
+                         an existing database does not change.
+
+    """
+
+    def __init__(self, logger, log_file, cache_size_kib=65536, page_size=32768):
+        self.logger = logger
+        self.log_file = log_file
+        self.cache_size_kib = cache_size_kib
+        self.page_size = page_size
+        self.connections = {}
+        self.lock = threading.Lock()
+
+    def connect(self, path):
+        """
+        Returns the read-write connection to the database at path, opening it on first use.
+
+        Args:
+            path (str): The path of the database file.
+
+        Returns:
+            sqlite3.Connection: The connection.
+
+        """
+        path = os.path.abspath(path)
+        with self.lock:
+            conn = self.connections.get(path)
+            if conn is None:
+                conn = sqlite3.connect(path, check_same_thread=False)
+                conn.execute('PRAGMA page_size = %d' % self.page_size)  # before the first table is created
+                conn.execute('PRAGMA journal_mode = WAL')
+                conn.execute('PRAGMA synchronous = NORMAL')
+                self.setCacheSize(conn)
+                self.connections[path] = conn
+                self.logger.log(self.log_file, "Opened %s database successfully" % os.path.basename(path), level=DEBUG)
+        return conn
+
+    def reader(self, path):
+        """
+        Opens a read-only connection to the database at path. It sees the last committed state and
+        does not block the writer; the caller closes it.
+
+        Args:
+            path (str): The path of the database file.
+
+        Returns:
+            sqlite3.Connection: The connection.
+
+        """
+        conn = sqlite3.connect('file:%s?mode=ro' % pathname2url(os.path.abspath(path)), uri=True)
+        self.setCacheSize(conn)
+        self.logger.log(self.log_file, "Opened %s database for reading" % os.path.basename(path), level=DEBUG)
+        return conn
+
+    def setCacheSize(self, conn):
+        conn.execute('PRAGMA cache_size = %d' % -self.cache_size_kib)  # negative sizes are in KiB
+
+    def close(self):
+        """
+        Closes the read-write connections; the next operation opens them again.
+
+        """
+        with self.lock:
+            connections, self.connections = self.connections, {}
+        for path, conn in connections.items():
+            conn.close()
+            self.logger.log(self.log_file, "Closed %s database successfully" % os.path.basename(path), level=DEBUG)
@@ -1,4 +1,5 @@
-import pandas as pd
+from data_ingestion.schema_reader import Schema_Reader
+from application_logging.logger import DEBUG
 
 class Data_Getter:
     """
@@ -11,16 +12,22 @@ class Data_Getter:
     Methods:
     get_data: Reads data from the specified source and returns it as a pandas DataFrame.
 
+    The data is read with the column types of the training schema, see Schema_Reader.
     """
     def __init__(self, file_object, logger_object):
-        self.training_file='Training_FileFromDB\InputFile.csv'
+        self.training_file='Training_FileFromDB/InputFile.csv'
+        self.training_parquet_file='Training_FileFromDB/InputFile.parquet'
+        self.schema_path='schema_training.json'
         self.file_object=file_object
         self.logger_object=logger_object
 
-    def get_data(self):
+    def get_data(self, drop_columns=None):
         """
         Reads data from the specified source and returns it as a pandas DataFrame.
 
+        Args:
+        drop_columns (list): Columns that are not read at all.
+
         Returns:
         pandas.DataFrame: The training data.
 
@@ -28,10 +35,10 @@ class Data_Getter:
         Exception: If data loading fails.
 
         """
-        self.logger_object.log(self.file_object,'Entered the get_data method of the Data_Getter class')
+        self.logger_object.log(self.file_object,'Entered the get_data method of the Data_Getter class', level=DEBUG)
         try:
-            self.data= pd.read_csv(self.training_file) # reading the data file
-            self.logger_object.log(self.file_object,'Data Load Successful.Exited the get_data method of the Data_Getter class')
+            self.data = Schema_Reader(self.schema_path, drop_columns).read(self.training_parquet_file, self.training_file)
+            self.logger_object.log(self.file_object,'Data Load Successful.Exited the get_data method of the Data_Getter class', level=DEBUG)
             return self.data
         except Exception as e:
             self.logger_object.log(self.file_object,'Exception occured in get_data method of the Data_Getter class. Exception message: '+str(e))
@@ -1,4 +1,5 @@
-import pandas as pd
+from data_ingestion.schema_reader import Schema_Reader
+from application_logging.logger import DEBUG
 
 class Data_Getter_Pred:
     """
@@ -10,26 +11,34 @@ class Data_Getter_Pred:
 
     Methods:
     get_data: Reads data from the specified source and returns it as a pandas DataFrame.
+    get_data_chunks: Reads data from the specified source in DataFrames of a fixed number of rows.
+
+    The data is read with the column types of the prediction schema, see Schema_Reader.
     """
     def __init__(self, file_object, logger_object):
         self.prediction_file='Prediction_FileFromDB/InputFile.csv'
+        self.prediction_parquet_file='Prediction_FileFromDB/InputFile.parquet'
+        self.schema_path='schema_prediction.json'
         self.file_object=file_object
         self.logger_object=logger_object
 
-    def get_data(self):
+    def get_data(self, drop_columns=None):
         """
         Reads data from the specified source and returns it as a pandas DataFrame.
 
+        Args:
+        drop_columns (list): Columns that are not read at all.
+
         Returns:
         pandas.DataFrame: The prediction data.
 
         Raises:
         Exception: If data loading fails.
         """
-        self.logger_object.log(self.file_object,'Entered the get_data method of the Data_Getter class')
+        self.logger_object.log(self.file_object,'Entered the get_data method of the Data_Getter class', level=DEBUG)
         try:
-            self.data= pd.read_csv(self.prediction_file) # reading the data
-            self.logger_object.log(self.file_object,'Data Load Successful.Exited the get_data method of the Data_Getter class')
+            self.data = Schema_Reader(self.schema_path, drop_columns).read(self.prediction_parquet_file, self.prediction_file)
+            self.logger_object.log(self.file_object,'Data Load Successful.Exited the get_data method of the Data_Getter class', level=DEBUG)
             return self.data
         except Exception as e:
             self.logger_object.log(self.file_object,'Exception occured in get_data method of the Data_Getter class. Exception message: '+str(e))
@@ -37,4 +46,30 @@ class Data_Getter_Pred:
                                    'Data Load Unsuccessful.Exited the get_data method of the Data_Getter class')
             raise Exception()
 
+    def get_data_chunks(self, chunksize, drop_columns=None):
+        """
+        Reads data from the specified source in pandas DataFrames of at most chunksize rows,
+        so the whole file is never held in memory at once.
+
+        Args:
+        chunksize (int): The number of rows per DataFrame.
+        drop_columns (list): Columns that are not read at all.
+
+        Returns:
+        Iterator[pandas.DataFrame]: The prediction data, chunk by chunk.
+
+        Raises:
+        Exception: If data loading fails.
+        """
+        self.logger_object.log(self.file_object,'Entered the get_data_chunks method of the Data_Getter class', level=DEBUG)
+        try:
+            reader = Schema_Reader(self.schema_path, drop_columns)
+            for chunk in reader.read_chunks(self.prediction_parquet_file, self.prediction_file, chunksize):
+                yield chunk
+            self.logger_object.log(self.file_object,'Data Load Successful.Exited the get_data_chunks method of the Data_Getter class', level=DEBUG)
+        except Exception as e:
+            self.logger_object.log(self.file_object,'Exception occured in get_data_chunks method of the Data_Getter class. Exception message: '+str(e))
+            self.logger_object.log(self.file_object,
+                                   'Data Load Unsuccessful.Exited the get_data_chunks method of the Data_Getter class')
+            raise Exception()
 
@@ -0,0 +1,129 @@
+import csv
+import json
+import os
+import pandas as pd
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # the Parquet export and the pyarrow CSV parser are optional
+    pa = pq = None
+
+# the placeholder of a missing value in the batch files, read as NA on top of the pandas defaults
+NA_VALUE = '?'
+
+
+class Schema_Reader:
+    """
+    This class reads the good data exported from the database with the column types of the schema file,
+    instead of letting pandas infer them.
+
+    Only the columns that are not dropped are read. The varchar columns are read as categoricals and
+    the Integer columns without missing values are downcast to the smallest integer type; Integer
+    columns with missing values or decimals are read as floats. '?' is a missing value, as the
+    pandas defaults are.
+
+    The Parquet export is read if it exists and pyarrow is installed, the CSV export otherwise, with
+    the pyarrow CSV parser when it is installed.
+
+    Args:
+    schema_path (str): The schema file with the column types.
+    drop_columns (list): Columns that are not read at all.
+
+    Methods:
+    read: Reads the whole export into a DataFrame.
+    read_chunks: Reads the export in DataFrames of a fixed number of rows.
+    """
+
+    def __init__(self, schema_path, drop_columns=None):
+        with open(schema_path, 'r') as f:
+            self.column_types = {column: column_type.lower() for column, column_type in json.load(f)['ColName'].items()}
+        self.drop_columns = set(drop_columns or [])
+
+    def read(self, parquet_path, csv_path):
+        """
+        Reads the whole export into a DataFrame.
+
+        Args:
+        parquet_path (str): The Parquet export.
+        csv_path (str): The CSV export, read if the Parquet one cannot be.
+
+        Returns:
+        pandas.DataFrame: The typed data.
+        """
+        if self.use_parquet(parquet_path):
+            return self.typed_frame(pq.read_table(parquet_path, columns=self.parquet_columns(parquet_path)))
+        columns = self.csv_columns(csv_path)
+        data = pd.read_csv(csv_path, usecols=columns, dtype=self.categorical_dtypes(columns), na_values=[NA_VALUE],
+                           engine='c' if pa is None else 'pyarrow')
+        return self.downcast_integers(data)
+
+    def read_chunks(self, parquet_path, csv_path, chunksize):
+        """
+        Reads the export in DataFrames of at most chunksize rows, numbered across chunks. The
+        categories of a column are the values found in its chunk.
+
+        Args:
+        parquet_path (str): The Parquet export.
+        csv_path (str): The CSV export, read if the Parquet one cannot be.
+        chunksize (int): The number of rows per DataFrame.
+
+        Returns:
+        Iterator[pandas.DataFrame]: The typed data, chunk by chunk.
+        """
+        if self.use_parquet(parquet_path):
+            rows = 0
+            for batch in pq.ParquetFile(parquet_path).iter_batches(batch_size=chunksize, columns=self.parquet_columns(parquet_path)):
+                chunk = self.typed_frame(pa.Table.from_batches([batch]))
+                chunk.index = pd.RangeIndex(rows, rows + len(chunk))
+                rows += len(chunk)
+                yield chunk
+        else:
+            columns = self.csv_columns(csv_path)
+            # the pyarrow parser does not read in chunks
+            for chunk in pd.read_csv(csv_path, usecols=columns, dtype=self.categorical_dtypes(columns), na_values=[NA_VALUE],
+                                     chunksize=chunksize):
+                yield self.downcast_integers(chunk)
+
+    def use_parquet(self, parquet_path):
+        return pq is not None and os.path.exists(parquet_path)
+
+    def parquet_columns(self, parquet_path):
+        return [column for column in pq.read_schema(parquet_path).names if column not in self.drop_columns]
+
+    def csv_columns(self, csv_path):
+        with open(csv_path, 'r', newline='') as f:
+            header = next(csv.reader(f), [])
+        return [column for column in header if column not in self.drop_columns]
+
+    def categorical_dtypes(self, columns):
+        return {column: 'category' for column in columns if self.column_types.get(column) == 'varchar'}
+
+    def typed_frame(self, table):
+        """
+        Converts a table read from the Parquet export, typed from the schema when it was exported,
+        to a DataFrame with the types the CSV export is read with.
+
+        """
+        for i, column in enumerate(table.column_names):
+            if self.column_types.get(column) == 'varchar':
+                # encoded by Arrow, so pandas gets the categorical without hashing every value
+                table = table.set_column(i, column, table.column(i).dictionary_encode())
+        data = table.to_pandas()
+        for column in data.columns:
+            if isinstance(data[column].dtype, pd.CategoricalDtype):
+                if NA_VALUE in data[column].cat.categories:
+                    data[column] = data[column].cat.remove_categories([NA_VALUE])
+            elif data[column].dtype == object and self.column_types.get(column) == 'integer':
+                # exported as text because of the '?' placeholder
+                values = data[column].replace(NA_VALUE, None)
+                try:
+                    data[column] = pd.to_numeric(values)
+                except (ValueError, TypeError):
+                    data[column] = values
+        return self.downcast_integers(data)
+
+    def downcast_integers(self, data):
+        for column in data.columns:
+            if self.column_types.get(column) == 'integer' and data[column].dtype.kind == 'i':
+                data[column] = pd.to_numeric(data[column], downcast='integer')
+        return data
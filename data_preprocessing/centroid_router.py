@@ -0,0 +1,73 @@
+import numpy as np
+
+# float32 unit roundoff
+EPSILON = np.finfo(np.float32).eps
+# rows assigned at a time
+BLOCK_ROWS = 4096
+
+
+class Centroid_Router:
+    """
+    This class assigns rows to the nearest KMeans centroid without going through KMeans.predict,
+    whose input validation and thread pool dispatch dominate the time of small batches.
+
+    The centroids are kept as one contiguous float32 array, shifted by their mean so the float32
+    values stay small. The distances are the BLAS-friendly expansion |c|^2 / 2 - x.c (the |x|^2
+    term does not change the nearest centroid), computed with one float32 matrix product. A row
+    whose two nearest centroids are closer than the float32 rounding error can tell apart is
+    assigned again in float64 with the unshifted centroids, as KMeans.predict computes it, so the
+    clusters are the ones KMeans.predict returns. The only exceptions are rows whose two nearest
+    centroids are equidistant within the float64 rounding error, for which KMeans.predict itself
+    returns either cluster depending on the other rows of the batch; they get one of the two. See
+    benchmarks/router_equivalence.py.
+
+    Args:
+    cluster_centers (numpy.ndarray): The centroids of the fitted KMeans model.
+
+    Methods:
+    predict: Returns the cluster of every row.
+    """
+
+    def __init__(self, cluster_centers):
+        centers = np.asarray(cluster_centers, dtype=np.float64)
+        self.n_clusters, self.n_features = centers.shape
+        self.centers64 = np.ascontiguousarray(centers)
+        self.half_norms64 = 0.5 * np.einsum('ij,ij->i', centers, centers)
+        self.shift = centers.mean(axis=0)
+        shifted = centers - self.shift
+        self.centers = np.ascontiguousarray(shifted, dtype=np.float32)
+        self.half_norms = (0.5 * np.einsum('ij,ij->i', shifted, shifted)).astype(np.float32)
+        self.radius = float(np.sqrt(np.einsum('ij,ij->i', shifted, shifted).max()))
+
+    def predict(self, features):
+        """
+        Returns the cluster of every row.
+
+        Args:
+        features (numpy.ndarray): The encoded rows, with the columns the KMeans model was fitted on.
+
+        Returns:
+        numpy.ndarray: The cluster of every row.
+        """
+        features = np.asarray(features, dtype=np.float64)
+        labels = np.zeros(len(features), dtype=np.int64)
+        if self.n_clusters == 1:
+            return labels
+        # in blocks of rows, so the temporaries stay in the cache
+        for start in range(0, len(features), BLOCK_ROWS):
+            block = features[start:start + BLOCK_ROWS]
+            shifted = (block - self.shift).astype(np.float32)
+            row_norms = np.sqrt(np.einsum('ij,ij->i', shifted, shifted))
+            distances = self.half_norms - shifted @ self.centers.T
+            block_labels = np.argmin(distances, axis=1)
+
+            nearest = np.partition(distances, 1, axis=1)
+            gap = nearest[:, 1] - nearest[:, 0]
+            # bound of the float32 rounding error of the gap, doubled for safety
+            bound = 4 * (self.n_features + 2) * EPSILON * (row_norms * self.radius + self.radius ** 2)
+            ambiguous = np.flatnonzero(gap <= bound)
+            if len(ambiguous):
+                exact = self.half_norms64 - block[ambiguous] @ self.centers64.T
+                block_labels[ambiguous] = np.argmin(exact, axis=1)
+            labels[start:start + BLOCK_ROWS] = block_labels
+        return labels
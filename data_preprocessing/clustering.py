@@ -1,7 +1,16 @@
-import matplotlib.pyplot as plt
-from sklearn.cluster import KMeans
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from matplotlib.figure import Figure
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.model_selection import train_test_split
 from kneed import KneeLocator
+from threadpoolctl import threadpool_limits
 from file_operations import file_methods
+from application_logging.logger import DEBUG
 
 class KMeansClustering:
     """
@@ -13,19 +22,35 @@ class KMeansClustering:
 
     Methods:
     elbow_plot: Saves the plot to decide the optimum number of clusters to a file.
+    save_elbow_plot: Renders the elbow plot, off the critical path.
     create_clusters: Creates a new dataframe consisting of the cluster information.
     """
 
     def __init__(self, file_object, logger_object):
         self.file_object = file_object
         self.logger_object = logger_object
+        self.elbow_cache_path = 'preprocessing_data/elbow_cache.json'
+        self.elbow_cache_size = 20
+        self.plot_thread = None
 
-    def elbow_plot(self, data):
+    def elbow_plot(self, data, labels=None, n_jobs=None, sample_size=None, use_minibatch=False, save_plot=True, use_cache=True):
         """
         Saves the plot to decide the optimum number of clusters to the file.
 
+        The KMeans models for k=1..10 are fitted in parallel threads, the cores split between them: each
+        fit is limited to cores // n_jobs OpenMP threads (at least one), instead of every fit using all the
+        cores and the sweep running about 10 x cores threads. The knee found for a feature matrix
+        is cached under a fingerprint of the matrix and of the options, so an unchanged dataset reuses it.
+        The plot is rendered in a background thread and never delays the result.
+
         Args:
         data (pandas.DataFrame): The data used for clustering.
+        labels (pandas.Series): The labels used to stratify the sample, if sample_size is given.
+        n_jobs (int): The number of k values fitted concurrently. Defaults to the number of cores.
+        sample_size (int): If given, the sweep runs on a sample of this many rows.
+        use_minibatch (bool): Use MiniBatchKMeans instead of KMeans for the sweep.
+        save_plot (bool): Render the elbow plot to preprocessing_data/K-Means_Elbow.PNG.
+        use_cache (bool): Reuse the knee cached for the same data and options.
 
         Returns:
         int: The optimum number of clusters.
@@ -33,29 +58,103 @@ class KMeansClustering:
         Raises:
         Exception: If finding the number of clusters fails.
         """
-        self.logger_object.log(self.file_object, 'Entered the elbow_plot method of the KMeansClustering class')
-        wcss = []  # initializing an empty list
+        self.logger_object.log(self.file_object, 'Entered the elbow_plot method of the KMeansClustering class', level=DEBUG)
         try:
-            for i in range(1, 11):
-                kmeans = KMeans(n_clusters=i, init='k-means++', random_state=42)  # initializing the KMeans object
-                print("Data Features",data.columns)
-                kmeans.fit(data)  # fitting the data to the KMeans Algorithm
-                wcss.append(kmeans.inertia_)
-            plt.plot(range(1, 11), wcss)  # creating the graph between WCSS and the number of clusters
-            plt.title('The Elbow Method')
-            plt.xlabel('Number of clusters')
-            plt.ylabel('WCSS')
-            plt.savefig('preprocessing_data/K-Means_Elbow.PNG')  # saving the elbow plot locally
-            # finding the value of the optimum cluster programmatically
-            self.kn = KneeLocator(range(1, 11), wcss, curve='convex', direction='decreasing')
-            self.logger_object.log(self.file_object, 'The optimum number of clusters is: ' + str(self.kn.knee) + ' . Exited the elbow_plot method of the KMeansClustering class'+ ' \n Data Features'+ str(data.columns))
-            return self.kn.knee
+            options = {'sample_size': sample_size, 'use_minibatch': use_minibatch, 'k': [1, 10]}
+            fingerprint = self.fingerprint(data, options)
+            cache = self.load_elbow_cache() if use_cache else {}
+            if fingerprint in cache:
+                knee, wcss = cache[fingerprint]['knee'], cache[fingerprint]['wcss']
+                self.logger_object.log(self.file_object, 'The optimum number of clusters is: ' + str(knee) + ' (cached for unchanged data). Exited the elbow_plot method of the KMeansClustering class')
+            else:
+                sweep_data = data
+                if sample_size is not None and sample_size < len(data):
+                    if labels is not None:
+                        sweep_data = train_test_split(data, train_size=sample_size, stratify=labels, random_state=42)[0]
+                    else:
+                        sweep_data = data.sample(n=sample_size, random_state=42)
+
+                n_workers = n_jobs or os.cpu_count() or 1
+                threads_per_fit = max(1, (os.cpu_count() or 1) // min(n_workers, 10))
+
+                def inertia(n_clusters):
+                    # the OpenMP limit is set for the calling thread only, so every fit gets its share of the cores
+                    with threadpool_limits(limits=threads_per_fit, user_api='openmp'):
+                        return fit_inertia(n_clusters)
+
+                def fit_inertia(n_clusters):
+                    if use_minibatch:
+                        kmeans = MiniBatchKMeans(n_clusters=n_clusters, init='k-means++', random_state=42)
+                    else:
+                        kmeans = KMeans(n_clusters=n_clusters, init='k-means++', random_state=42)  # initializing the KMeans object
+                    kmeans.fit(sweep_data)  # fitting the data to the KMeans Algorithm
+                    return kmeans.inertia_
+
+                with ThreadPoolExecutor(max_workers=n_workers) as executor:
+                    wcss = list(executor.map(inertia, range(1, 11)))
+                # finding the value of the optimum cluster programmatically
+                knee = KneeLocator(range(1, 11), wcss, curve='convex', direction='decreasing').knee
+                knee = None if knee is None else int(knee)
+                if use_cache:
+                    cache[fingerprint] = {'knee': knee, 'wcss': wcss}
+                    self.save_elbow_cache(cache)
+                self.logger_object.log(self.file_object, 'The optimum number of clusters is: ' + str(knee) + ' . Exited the elbow_plot method of the KMeansClustering class'+ ' \n Data Features'+ str(data.columns))
+            if save_plot:
+                self.plot_thread = threading.Thread(target=self.save_elbow_plot, args=(wcss,))
+                self.plot_thread.start()
+            return knee
 
         except Exception as e:
             self.logger_object.log(self.file_object, 'Exception occurred in elbow_plot method of the KMeansClustering class. Exception message: ' + str(e))
             self.logger_object.log(self.file_object, 'Finding the number of clusters failed. Exited the elbow_plot method of the KMeansClustering class')
             raise Exception()
 
+    def save_elbow_plot(self, wcss):
+        """
+        Renders the graph between WCSS and the number of clusters to preprocessing_data/K-Means_Elbow.PNG.
+
+        It uses a standalone Figure instead of pyplot, so it is safe to run in a background thread.
+        """
+        try:
+            figure = Figure()
+            axes = figure.subplots()
+            axes.plot(range(1, len(wcss) + 1), wcss)
+            axes.set_title('The Elbow Method')
+            axes.set_xlabel('Number of clusters')
+            axes.set_ylabel('WCSS')
+            figure.savefig('preprocessing_data/K-Means_Elbow.PNG')  # saving the elbow plot locally
+        except Exception as e:
+            self.logger_object.log(self.file_object, 'Saving the elbow plot failed. Exception message: ' + str(e))
+
+    def fingerprint(self, data, options):
+        """
+        Returns a hash identifying the feature matrix and the sweep options.
+        """
+        sha = hashlib.sha256()
+        sha.update(json.dumps([list(map(str, data.columns)), options]).encode())
+        sha.update(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+        return sha.hexdigest()
+
+    def load_elbow_cache(self):
+        """
+        Returns the knees cached by previous runs, keyed by fingerprint.
+        """
+        try:
+            with open(self.elbow_cache_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_elbow_cache(self, cache):
+        """
+        Saves the cached knees, replacing the cache file atomically. Only the most recent entries are kept.
+        """
+        cache = dict(list(cache.items())[-self.elbow_cache_size:])
+        temp_path = self.elbow_cache_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(cache, f)
+        os.replace(temp_path, self.elbow_cache_path)
+
     def create_clusters(self, data, number_of_clusters):
         """
         Create a new dataframe consisting of the cluster information.
@@ -70,7 +169,7 @@ class KMeansClustering:
         Raises:
         Exception: If fitting the data to clusters fails.
         """
-        self.logger_object.log(self.file_object, 'Entered the create_clusters method of the KMeansClustering class')
+        self.logger_object.log(self.file_object, 'Entered the create_clusters method of the KMeansClustering class', level=DEBUG)
         self.data = data
         try:
             self.kmeans = KMeans(n_clusters=number_of_clusters, init='k-means++', random_state=42)
@@ -80,7 +179,7 @@ class KMeansClustering:
             self.save_model = self.file_op.save_model(self.kmeans, 'KMeans')  # saving the KMeans model to directory
 
             self.data['Cluster'] = self.y_kmeans  # create a new column in the dataset for storing the cluster information
-            self.logger_object.log(self.file_object, 'Successfully created ' + str(self.kn.knee) + ' clusters. Exited the create_clusters method of the KMeansClustering class')
+            self.logger_object.log(self.file_object, 'Successfully created ' + str(number_of_clusters) + ' clusters. Exited the create_clusters method of the KMeansClustering class')
             return self.data
         except Exception as e:
             self.logger_object.log(self.file_object, 'Exception occurred in create_clusters method of the KMeansClustering class. Exception message: ' + str(e))
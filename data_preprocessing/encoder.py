@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+
+class Categorical_Encoder:
+    """
+    This class encodes every categorical column into one preallocated numeric matrix in a single pass.
+
+    Columns with a fixed mapping (including the label column, if present) are encoded with their mapping,
+    every other categorical column is one-hot encoded against the category vocabulary recorded by fit
+    (dropping the first category, as pandas.get_dummies(drop_first=True) does). The column layout is
+    the one the per-column get_dummies loop produced: mapped columns, then the one-hot columns, then
+    the numerical columns.
+
+    Args:
+    ordinal_mappings (dict): The fixed mapping of each column that is not one-hot encoded.
+
+    Methods:
+    fit: Records the categorical columns, their category vocabulary and the output column layout.
+    transform: Encodes the data into the recorded column layout.
+    """
+
+    def __init__(self, ordinal_mappings):
+        self.ordinal_mappings = ordinal_mappings
+        self.mappings = {}
+        self.one_hot_categories = {}
+        self.numerical_columns = []
+        self.feature_names = []
+
+    def fit(self, data):
+        """
+        Records the categorical columns, their category vocabulary and the output column layout.
+
+        Args:
+        data (pandas.DataFrame): The data to learn the vocabulary from.
+
+        Returns:
+        Categorical_Encoder: The fitted encoder.
+        """
+        categorical_columns = data.select_dtypes(include=['object', 'category']).columns
+        self.mappings = {}
+        self.one_hot_categories = {}
+        for col in categorical_columns:
+            if col in self.ordinal_mappings:
+                self.mappings[col] = self.ordinal_mappings[col]
+            else:
+                self.one_hot_categories[col] = sorted(data[col].dropna().unique())
+        self.numerical_columns = [col for col in data.columns if col not in categorical_columns]
+        self.feature_names = list(self.mappings)
+        for col, categories in self.one_hot_categories.items():
+            self.feature_names += [col + '_' + str(category) for category in categories[1:]]
+        self.feature_names += self.numerical_columns
+        return self
+
+    def transform(self, data):
+        """
+        Encodes the data into the column layout recorded by fit.
+
+        Values missing from the vocabulary are encoded as NaN for the mapped columns and as the
+        dropped first category (all zeros) for the one-hot columns.
+
+        Args:
+        data (pandas.DataFrame): The data to encode.
+
+        Returns:
+        pandas.DataFrame: The encoded numeric data.
+        """
+        n_rows = len(data)
+        # column-major, so every column is written contiguously and the DataFrame wraps it without a copy
+        encoded = np.zeros((n_rows, len(self.feature_names)), dtype=np.float64, order='F')
+        position = 0
+        for col, mapping in self.mappings.items():
+            if col in data.columns:
+                # code -1 (unknown or missing) picks the trailing NaN of the lookup table
+                lookup = np.append(np.asarray(list(mapping.values()), dtype=np.float64), np.nan)
+                encoded[:, position] = lookup[self._codes(data[col], list(mapping))]
+            else:
+                encoded[:, position] = np.nan
+            position += 1
+        for col, categories in self.one_hot_categories.items():
+            codes = self._codes(data[col], categories)
+            for code in range(1, len(categories)):
+                np.equal(codes, code, out=encoded[:, position + code - 1])
+            position += len(categories) - 1
+        for col in self.numerical_columns:
+            encoded[:, position] = data[col].to_numpy(dtype=np.float64)
+            position += 1
+        return pd.DataFrame(encoded, columns=self.feature_names, index=data.index, copy=False)
+
+    def _codes(self, values, categories):
+        """
+        Returns the position of every value in the categories, -1 for missing or unknown values.
+        The column is hashed once; only its distinct values are looked up in the vocabulary.
+
+        """
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # already coded, no need to hash the rows again
+            codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+        else:
+            codes, uniques = pd.factorize(values, use_na_sentinel=True)
+        positions = np.append(pd.Index(categories).get_indexer(uniques), -1)
+        return positions[codes]
@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+from data_preprocessing.preprocessing import NUMERICAL_COLUMNS, ORDINAL_MAPPINGS
+from data_preprocessing.encoder import Categorical_Encoder
+
+
+class Preprocessing_Pipeline:
+    """
+    This class holds the preprocessing statistics fitted during training so that prediction
+    can apply exactly the same transformation without fitting anything on the prediction batch.
+
+    It is saved next to the models in the models directory at the end of training.
+
+    Attributes:
+    fill_values (dict): The value used to impute missing values of each feature column.
+    encoder (Categorical_Encoder): The categorical encoder with the category vocabulary seen in training.
+    feature_columns (list): The exact column order of the encoded feature matrix used in training.
+    scalers (dict): The mean and scale of the numerical columns fitted for each cluster.
+
+    Methods:
+    fit: Records the imputation values and the one-hot vocabulary.
+    set_feature_columns: Records the column order of the encoded feature matrix.
+    add_scaler: Records the statistics of the Standard scaler fitted for a cluster.
+    transform: Imputes and encodes a raw prediction batch into the training feature layout.
+    scale_numerical_columns: Scales the numerical columns with the statistics of a cluster.
+    """
+
+    def __init__(self):
+        self.fill_values = {}
+        self.encoder = Categorical_Encoder(ORDINAL_MAPPINGS)
+        self.feature_columns = []
+        self.scalers = {}
+
+    def fit(self, data):
+        """
+        Records the imputation values and the one-hot vocabulary of the training data.
+
+        Args:
+        data (pandas.DataFrame): The training data before encoding, without the label column.
+
+        Returns:
+        Preprocessing_Pipeline: The fitted pipeline.
+        """
+        for col in data.columns:
+            mode = data[col].mode()
+            if len(mode) > 0:
+                self.fill_values[col] = mode.iloc[0]
+        self.encoder.fit(data)
+        return self
+
+    def set_feature_columns(self, features):
+        """
+        Records the exact column order of the encoded feature matrix used in training.
+
+        Args:
+        features (pandas.DataFrame): The encoded feature matrix used for clustering.
+        """
+        self.feature_columns = list(features.columns)
+
+    def add_scaler(self, cluster_number, scaler):
+        """
+        Records the statistics of the Standard scaler fitted on the training rows of a cluster.
+
+        Args:
+        cluster_number (int): The cluster the scaler was fitted for.
+        scaler (sklearn.preprocessing.StandardScaler): The fitted scaler.
+        """
+        self.scalers[int(cluster_number)] = (np.asarray(scaler.mean_, dtype=np.float64),
+                                             np.asarray(scaler.scale_, dtype=np.float64))
+
+    def transform(self, data):
+        """
+        Imputes and encodes a raw batch into the feature layout used in training.
+
+        Args:
+        data (pandas.DataFrame): The batch after column removal, with '?' read as missing.
+
+        Returns:
+        pandas.DataFrame: The encoded feature matrix with the training column order.
+        """
+        fill_values = {col: value for col, value in self.fill_values.items() if col in data.columns}
+        for col, value in fill_values.items():
+            # a categorical column only takes its own categories, those of the batch
+            if isinstance(data[col].dtype, pd.CategoricalDtype) and value not in data[col].cat.categories:
+                data[col] = data[col].cat.add_categories([value])
+        data = data.fillna(fill_values)
+        data = self.encoder.transform(data)
+        if list(data.columns) != self.feature_columns:
+            data = data.reindex(columns=self.feature_columns, fill_value=0)
+        return data
+
+    def scale_numerical_columns(self, data, cluster_number):
+        """
+        Scales the numerical columns with the statistics fitted for the given cluster.
+
+        Args:
+        data (pandas.DataFrame): The encoded rows of the cluster.
+        cluster_number (int): The cluster the rows belong to.
+
+        Returns:
+        pandas.DataFrame: The scaled data with the numerical columns first, as in training.
+        """
+        mean, scale = self.scalers[int(cluster_number)]
+        scaled = (data[NUMERICAL_COLUMNS].to_numpy(dtype=np.float64) - mean) / scale
+        scaled_num_df = pd.DataFrame(data=scaled, columns=NUMERICAL_COLUMNS, index=data.index)
+        return pd.concat([scaled_num_df, data.drop(columns=NUMERICAL_COLUMNS)], axis=1)
@@ -3,6 +3,31 @@ import numpy as np
 from sklearn_pandas import CategoricalImputer
 from sklearn.preprocessing import StandardScaler
 from imblearn.over_sampling import RandomOverSampler
+from data_preprocessing.encoder import Categorical_Encoder
+from application_logging.logger import DEBUG
+
+# columns that do not contribute to the prediction and are removed before preprocessing
+COLUMNS_TO_DROP = ['policy_number', 'policy_bind_date', 'policy_state', 'insured_zip', 'incident_location',
+                   'incident_date', 'incident_state', 'incident_city', 'insured_hobbies', 'auto_make',
+                   'auto_model', 'auto_year', 'age', 'total_claim_amount']
+
+# numerical columns scaled with the Standard scaler
+NUMERICAL_COLUMNS = ['months_as_customer', 'policy_deductable', 'umbrella_limit',
+                     'capital-gains', 'capital-loss', 'incident_hour_of_the_day',
+                     'number_of_vehicles_involved', 'bodily_injuries', 'witnesses', 'injury_claim',
+                     'property_claim', 'vehicle_claim']
+
+# categorical columns encoded with a fixed mapping, every other categorical column is one-hot encoded
+ORDINAL_MAPPINGS = {
+    'policy_csl': {'100/300': 1, '250/500': 2.5, '500/1000': 5},
+    'insured_education_level': {'JD': 1, 'High School': 2, 'College': 3, 'Masters': 4, 'Associate': 5, 'MD': 6, 'PhD': 7},
+    'incident_severity': {'Trivial Damage': 1, 'Minor Damage': 2, 'Major Damage': 3, 'Total Loss': 4},
+    'insured_sex': {'FEMALE': 0, 'MALE': 1},
+    'property_damage': {'NO': 0, 'YES': 1},
+    'police_report_available': {'NO': 0, 'YES': 1},
+}
+
+LABEL_MAPPING = {'N': 0, 'Y': 1}
 
 class Preprocessor:
     """
@@ -40,13 +65,13 @@ class Preprocessor:
         Raises:
         Exception: If removing unwanted spaces fails.
         """
-        self.logger_object.log(self.file_object, 'Entered the remove_unwanted_spaces method of the Preprocessor class')
+        self.logger_object.log(self.file_object, 'Entered the remove_unwanted_spaces method of the Preprocessor class', level=DEBUG)
         self.data = data
 
         try:
             self.df_without_spaces = self.data.apply(lambda x: x.str.strip() if x.dtype == "object" else x)
             self.logger_object.log(self.file_object,
-                                   'Unwanted spaces removal Successful. Exited the remove_unwanted_spaces method of the Preprocessor class')
+                                   'Unwanted spaces removal Successful. Exited the remove_unwanted_spaces method of the Preprocessor class', level=DEBUG)
             return self.df_without_spaces
         except Exception as e:
             self.logger_object.log(self.file_object,
@@ -57,7 +82,8 @@ class Preprocessor:
 
     def remove_columns(self, data, columns):
         """
-        Removes specified columns from a pandas dataframe.
+        Removes specified columns from a pandas dataframe. Columns that are not in the dataframe,
+        e.g. because the data loader did not read them, are ignored.
 
         Args:
         data (pandas.DataFrame): The input DataFrame.
@@ -69,13 +95,13 @@ class Preprocessor:
         Raises:
         Exception: If column removal fails.
         """
-        self.logger_object.log(self.file_object, 'Entered the remove_columns method of the Preprocessor class')
+        self.logger_object.log(self.file_object, 'Entered the remove_columns method of the Preprocessor class', level=DEBUG)
         self.data = data
         self.columns = columns
         try:
-            self.useful_data = self.data.drop(labels=self.columns, axis=1)
+            self.useful_data = self.data.drop(labels=self.columns, axis=1, errors='ignore')
             self.logger_object.log(self.file_object,
-                                   'Column removal Successful. Exited the remove_columns method of the Preprocessor class')
+                                   'Column removal Successful. Exited the remove_columns method of the Preprocessor class', level=DEBUG)
             return self.useful_data
         except Exception as e:
             self.logger_object.log(self.file_object, 'Exception occurred in remove_columns method of the Preprocessor class. Exception message: ' + str(e))
@@ -97,12 +123,12 @@ class Preprocessor:
         Raises:
         Exception: If label separation fails.
         """
-        self.logger_object.log(self.file_object, 'Entered the separate_label_feature method of the Preprocessor class')
+        self.logger_object.log(self.file_object, 'Entered the separate_label_feature method of the Preprocessor class', level=DEBUG)
         try:
             self.X = data.drop(labels=label_column_name, axis=1)
             self.Y = data[label_column_name]
             self.logger_object.log(self.file_object,
-                                   'Label Separation Successful. Exited the separate_label_feature method of the Preprocessor class')
+                                   'Label Separation Successful. Exited the separate_label_feature method of the Preprocessor class', level=DEBUG)
             return self.X, self.Y
         except Exception as e:
             self.logger_object.log(self.file_object, 'Exception occurred in separate_label_feature method of the Preprocessor class. Exception message: ' + str(e))
@@ -122,7 +148,7 @@ class Preprocessor:
         Raises:
         Exception: If finding null values fails.
         """
-        self.logger_object.log(self.file_object, 'Entered the is_null_present method of the Preprocessor class')
+        self.logger_object.log(self.file_object, 'Entered the is_null_present method of the Preprocessor class', level=DEBUG)
         self.null_present = False
         self.cols_with_missing_values = []
         self.cols = data.columns
@@ -138,7 +164,7 @@ class Preprocessor:
                 self.dataframe_with_null['missing values count'] = np.asarray(data.isna().sum())
                 self.dataframe_with_null.to_csv('preprocessing_data/null_values.csv')
             self.logger_object.log(self.file_object,
-                                   'Finding missing values is a success. Data written to the null values file. Exited the is_null_present method of the Preprocessor class')
+                                   'Finding missing values is a success. Data written to the null values file. Exited the is_null_present method of the Preprocessor class', level=DEBUG)
             return self.null_present, self.cols_with_missing_values
         except Exception as e:
             self.logger_object.log(self.file_object, 'Exception occurred in is_null_present method of the Preprocessor class. Exception message: ' + str(e))
@@ -159,14 +185,14 @@ class Preprocessor:
         Raises:
         Exception: If imputing missing values fails.
         """
-        self.logger_object.log(self.file_object, 'Entered the impute_missing_values method of the Preprocessor class')
+        self.logger_object.log(self.file_object, 'Entered the impute_missing_values method of the Preprocessor class', level=DEBUG)
         self.data = data
         self.cols_with_missing_values = cols_with_missing_values
         try:
             self.imputer = CategoricalImputer()
             for col in self.cols_with_missing_values:
                 self.data[col] = self.imputer.fit_transform(self.data[col])
-            self.logger_object.log(self.file_object, 'Imputing missing values Successful. Exited the impute_missing_values method of the Preprocessor class')
+            self.logger_object.log(self.file_object, 'Imputing missing values Successful. Exited the impute_missing_values method of the Preprocessor class', level=DEBUG)
             return self.data
         except Exception as e:
             self.logger_object.log(self.file_object, 'Exception occurred in impute_missing_values method of the Preprocessor class. Exception message: ' + str(e))
@@ -187,13 +213,9 @@ class Preprocessor:
         Exception: If scaling for numerical columns fails.
         """
         self.logger_object.log(self.file_object,
-                               'Entered the scale_numerical_columns method of the Preprocessor class')
+                               'Entered the scale_numerical_columns method of the Preprocessor class', level=DEBUG)
         self.data = data
-        self.num_df = self.data[['months_as_customer', 'policy_deductable', 'umbrella_limit',
-                          'capital-gains', 'capital-loss', 'incident_hour_of_the_day',
-                          'number_of_vehicles_involved', 'bodily_injuries', 'witnesses', 'injury_claim',
-                          'property_claim',
-                          'vehicle_claim']]
+        self.num_df = self.data[NUMERICAL_COLUMNS]
 
         try:
             self.scaler = StandardScaler()
@@ -201,7 +223,7 @@ class Preprocessor:
             self.scaled_num_df = pd.DataFrame(data=self.scaled_data, columns=self.num_df.columns, index=self.data.index)
             self.data.drop(columns=self.scaled_num_df.columns, inplace=True)
             self.data = pd.concat([self.scaled_num_df, self.data], axis=1)
-            self.logger_object.log(self.file_object, 'Scaling for numerical values successful. Exited the scale_numerical_columns method of the Preprocessor class')
+            self.logger_object.log(self.file_object, 'Scaling for numerical values successful. Exited the scale_numerical_columns method of the Preprocessor class', level=DEBUG)
             return self.data
         except Exception as e:
             self.logger_object.log(self.file_object, 'Exception occurred in scale_numerical_columns method of the Preprocessor class. Exception message: ' + str(e))
@@ -221,32 +243,13 @@ class Preprocessor:
         Raises:
         Exception: If encoding for categorical columns fails.
         """
-        self.logger_object.log(self.file_object, 'Entered the encode_categorical_columns method of the Preprocessor class')
+        self.logger_object.log(self.file_object, 'Entered the encode_categorical_columns method of the Preprocessor class', level=DEBUG)
         self.data = data
         try:
-            self.cat_df = self.data.select_dtypes(include=['object']).copy()
-            self.cat_df['policy_csl'] = self.cat_df['policy_csl'].map({'100/300': 1, '250/500': 2.5, '500/1000': 5})
-            self.cat_df['insured_education_level'] = self.cat_df['insured_education_level'].map(
-                {'JD': 1, 'High School': 2, 'College': 3, 'Masters': 4, 'Associate': 5, 'MD': 6, 'PhD': 7})
-            self.cat_df['incident_severity'] = self.cat_df['incident_severity'].map(
-                {'Trivial Damage': 1, 'Minor Damage': 2, 'Major Damage': 3, 'Total Loss': 4})
-            self.cat_df['insured_sex'] = self.cat_df['insured_sex'].map({'FEMALE': 0, 'MALE': 1})
-            self.cat_df['property_damage'] = self.cat_df['property_damage'].map({'NO': 0, 'YES': 1})
-            self.cat_df['police_report_available'] = self.cat_df['police_report_available'].map({'NO': 0, 'YES': 1})
-            try:
-                # code block for training
-                self.cat_df['fraud_reported'] = self.cat_df['fraud_reported'].map({'N': 0, 'Y': 1})
-                self.cols_to_drop = ['policy_csl', 'insured_education_level', 'incident_severity', 'insured_sex',
-                                     'property_damage', 'police_report_available', 'fraud_reported']
-            except:
-                # code block for Prediction
-                self.cols_to_drop = ['policy_csl', 'insured_education_level', 'incident_severity', 'insured_sex',
-                                     'property_damage', 'police_report_available']
-            for col in self.cat_df.drop(columns=self.cols_to_drop).columns:
-                self.cat_df = pd.get_dummies(self.cat_df, columns=[col], prefix=[col], drop_first=True)
-            self.data.drop(columns=self.data.select_dtypes(include=['object']).columns, inplace=True)
-            self.data = pd.concat([self.cat_df, self.data], axis=1)
-            self.logger_object.log(self.file_object, 'Encoding for categorical values successful. Exited the encode_categorical_columns method of the Preprocessor class')
+            # the label column is only present in training
+            self.encoder = Categorical_Encoder(dict(ORDINAL_MAPPINGS, fraud_reported=LABEL_MAPPING))
+            self.data = self.encoder.fit(self.data).transform(self.data)
+            self.logger_object.log(self.file_object, 'Encoding for categorical values successful. Exited the encode_categorical_columns method of the Preprocessor class', level=DEBUG)
             return self.data
         except Exception as e:
             self.logger_object.log(self.file_object, 'Exception occurred in encode_categorical_columns method of the Preprocessor class. Exception message: ' + str(e))
@@ -268,12 +271,12 @@ class Preprocessor:
         Exception: If dataset balancing fails.
         """
         self.logger_object.log(self.file_object,
-                               'Entered the handle_imbalanced_dataset method of the Preprocessor class')
+                               'Entered the handle_imbalanced_dataset method of the Preprocessor class', level=DEBUG)
         try:
             self.rdsmple = RandomOverSampler()
             self.x_sampled, self.y_sampled  = self.rdsmple.fit_sample(x, y)
             self.logger_object.log(self.file_object,
-                                   'Dataset balancing successful. Exited the handle_imbalanced_dataset method of the Preprocessor class')
+                                   'Dataset balancing successful. Exited the handle_imbalanced_dataset method of the Preprocessor class', level=DEBUG)
             return self.x_sampled, self.y_sampled
         except Exception as e:
             self.logger_object.log(self.file_object,
@@ -0,0 +1,188 @@
+import json
+import os
+import pickle
+import joblib
+import numpy as np
+import xgboost
+from sklearn.linear_model import LogisticRegression
+from xgboost import XGBClassifier
+from best_model_finder.scorer import Compiled_Scorer
+from data_preprocessing.centroid_router import Centroid_Router
+
+
+class Pickle_Format:
+    """
+    The whole model pickled in one file, the format of the models saved before the artifact
+    formats existed. It is only used when it is asked for.
+    """
+    name = 'pickle'
+
+    def accepts(self, model):
+        return True
+
+    def save(self, model, prefix):
+        with open(prefix + '.sav', 'wb') as f:
+            pickle.dump(model, f)
+        return {'files': [os.path.basename(prefix + '.sav')]}
+
+    def load(self, directory, meta):
+        with open(os.path.join(directory, meta['files'][0]), 'rb') as f:
+            return pickle.load(f)
+
+
+class Joblib_Format:
+    """
+    The model pickled by joblib, which writes its numpy arrays as raw buffers that are memory-mapped
+    on load instead of being copied. The format of the models without a dedicated one.
+    """
+    name = 'joblib'
+
+    def accepts(self, model):
+        return True
+
+    def save(self, model, prefix):
+        joblib.dump(model, prefix + '.joblib')
+        return {'files': [os.path.basename(prefix + '.joblib')]}
+
+    def load(self, directory, meta):
+        return joblib.load(os.path.join(directory, meta['files'][0]), mmap_mode='r')
+
+
+class XGBoost_Format:
+    """
+    An XGBClassifier in the native UBJSON format of XGBoost, loaded without unpickling the Python
+    wrapper. The sklearn attributes needed to predict (classes, best iteration) are kept by XGBoost.
+    """
+    name = 'xgboost'
+
+    def accepts(self, model):
+        return isinstance(model, XGBClassifier)
+
+    def save(self, model, prefix):
+        model.save_model(prefix + '.ubj')
+        return {'files': [os.path.basename(prefix + '.ubj')]}
+
+    def load(self, directory, meta):
+        model = XGBClassifier()
+        model.load_model(os.path.join(directory, meta['files'][0]))
+        return model
+
+
+class Linear_Format:
+    """
+    A binary LogisticRegression as one .npy file per fitted array (coefficients, intercept and
+    classes), memory-mapped on load, with its parameters in the metadata.
+    """
+    name = 'linear'
+    arrays = ('coef_', 'intercept_', 'classes_')
+
+    def accepts(self, model):
+        if not isinstance(model, LogisticRegression) or model.classes_.dtype == object:
+            return False
+        try:
+            json.dumps(model.get_params())
+        except TypeError:
+            return False
+        return True
+
+    def save(self, model, prefix):
+        files = save_arrays({key: getattr(model, key) for key in self.arrays}, prefix)
+        meta = {'files': list(files.values()), 'arrays': files, 'params': model.get_params(),
+                'n_features_in_': int(model.n_features_in_)}
+        if hasattr(model, 'feature_names_in_'):
+            meta['feature_names_in_'] = list(model.feature_names_in_)
+        return meta
+
+    def load(self, directory, meta):
+        model = LogisticRegression(**meta['params'])
+        for key, value in load_arrays(directory, meta['arrays']).items():
+            setattr(model, key, value)
+        model.n_features_in_ = meta['n_features_in_']
+        if 'feature_names_in_' in meta:
+            model.feature_names_in_ = np.asarray(meta['feature_names_in_'], dtype=object)
+        return model
+
+
+class Scorer_Format:
+    """
+    A Compiled_Scorer as .npy files for the centroids, the stacked coefficients and the scalers,
+    memory-mapped on load, UBJSON files for the XGBoost boosters, the artifact format of every other
+    cluster model, and its remaining attributes in the metadata.
+    """
+    name = 'scorer'
+
+    def accepts(self, model):
+        return isinstance(model, Compiled_Scorer)
+
+    def save(self, model, prefix):
+        state = model.__getstate__()
+        router, scalers = state.pop('router'), state.pop('scalers')
+        boosters, models = state.pop('boosters'), state.pop('models')
+        arrays = {key: value for key, value in state.items() if isinstance(value, np.ndarray)}
+        arrays['centers'] = router.centers64
+        for cluster, (mean, scale) in scalers.items():
+            arrays['mean_%d' % cluster], arrays['scale_%d' % cluster] = mean, scale
+        files = save_arrays(arrays, prefix)
+        meta = {'files': list(files.values()), 'arrays': files,
+                'state': {key: value for key, value in state.items() if key not in arrays},
+                'scalers': sorted(scalers), 'boosters': {}, 'models': {}}
+        for cluster, (booster, columns, iteration_range) in boosters.items():
+            path = '%s.booster_%d.ubj' % (prefix, cluster)
+            booster.save_model(path)
+            meta['files'].append(os.path.basename(path))
+            meta['boosters'][str(cluster)] = {'file': os.path.basename(path), 'columns': columns.tolist(),
+                                              'iteration_range': list(iteration_range)}
+        for cluster, cluster_model in models.items():
+            artifact_format = format_for(cluster_model)
+            cluster_meta = artifact_format.save(cluster_model, '%s.model_%d' % (prefix, cluster))
+            cluster_meta['format'] = artifact_format.name
+            meta['files'] += cluster_meta['files']
+            meta['models'][str(cluster)] = cluster_meta
+        return meta
+
+    def load(self, directory, meta):
+        arrays = load_arrays(directory, meta['arrays'])
+        scorer = Compiled_Scorer.__new__(Compiled_Scorer)
+        scorer.__setstate__(meta['state'])
+        scorer.router = Centroid_Router(arrays.pop('centers'))
+        scorer.scalers = {cluster: (arrays.pop('mean_%d' % cluster), arrays.pop('scale_%d' % cluster))
+                          for cluster in meta['scalers']}
+        vars(scorer).update(arrays)
+        scorer.boosters = {}
+        for cluster, booster_meta in meta['boosters'].items():
+            booster = xgboost.Booster(model_file=os.path.join(directory, booster_meta['file']))
+            booster.set_param({'nthread': scorer.default_threads or 0})
+            scorer.boosters[int(cluster)] = (booster, np.asarray(booster_meta['columns']),
+                                             tuple(booster_meta['iteration_range']))
+        scorer.models = {int(cluster): ARTIFACT_FORMATS[cluster_meta['format']].load(directory, cluster_meta)
+                         for cluster, cluster_meta in meta['models'].items()}
+        return scorer
+
+
+def save_arrays(arrays, prefix):
+    files = {}
+    for key, value in arrays.items():
+        path = '%s.%s.npy' % (prefix, key)
+        np.save(path, np.ascontiguousarray(value), allow_pickle=False)
+        files[key] = os.path.basename(path)
+    return files
+
+
+def load_arrays(directory, files):
+    return {key: np.load(os.path.join(directory, file), mmap_mode='r') for key, file in files.items()}
+
+
+# the formats by name, and the order in which a format is chosen for a model
+ARTIFACT_FORMATS = {artifact_format.name: artifact_format for artifact_format in
+                    (Scorer_Format(), XGBoost_Format(), Linear_Format(), Joblib_Format(), Pickle_Format())}
+DEFAULT_FORMATS = ('scorer', 'xgboost', 'linear', 'joblib')
+
+
+def format_for(model):
+    """
+    Returns the first default format that accepts the model.
+
+    """
+    for name in DEFAULT_FORMATS:
+        if ARTIFACT_FORMATS[name].accepts(model):
+            return ARTIFACT_FORMATS[name]
@@ -1,11 +1,21 @@
+import json
 import pickle
 import os
 import shutil
+import tempfile
+import uuid
+from file_operations.artifact_formats import ARTIFACT_FORMATS, format_for
+from application_logging.logger import DEBUG
 
 class File_Operation:
     """
     This class is responsible for saving and loading machine learning models.
 
+    A model is saved in the artifact format chosen for its type (see artifact_formats.py): its files
+    are written first, under a name unique to the save, then the metadata file naming the format and
+    the files, which is the path of the model. Models saved as one pickle file before the artifact
+    formats existed are still loaded.
+
     Args:
         file_object (file): The log file to record messages.
         logger_object (object): The logger object for logging messages.
@@ -22,13 +32,15 @@ class File_Operation:
         self.logger_object = logger_object
         self.model_directory = 'models/'
 
-    def save_model(self, model, filename):
+    def save_model(self, model, filename, artifact_format=None):
         """
         Save the machine learning model to a file.
 
         Args:
             model (object): The machine learning model to be saved.
             filename (str): The name of the file to save the model.
+            artifact_format (str): The name of the artifact format, the one chosen for the type of
+                                   the model if None.
 
         Returns:
             str: 'success' if the model is saved successfully.
@@ -37,23 +49,62 @@ class File_Operation:
             Exception: If there is an error while saving the model.
 
         """
-        self.logger_object.log(self.file_object, 'Entered the save_model method of the File_Operation class')
+        self.logger_object.log(self.file_object, 'Entered the save_model method of the File_Operation class', level=DEBUG)
         try:
             path = os.path.join(self.model_directory, filename)  # create a separate directory for each cluster
-            if os.path.isdir(path):  # remove previously existing models for each cluster
-                shutil.rmtree(self.model_directory)
-                os.makedirs(path)
-            else:
-                os.makedirs(path)
-            with open(path + '/' + filename + '.sav', 'wb') as f:
-                pickle.dump(model, f)  # save the model to file
-            self.logger_object.log(self.file_object, 'Model File ' + filename + ' saved. Exited the save_model method of the Model_Finder class')
+            os.makedirs(path, exist_ok=True)
+            artifact = ARTIFACT_FORMATS[artifact_format] if artifact_format is not None else format_for(model)
+            # the files of every save have their own names, so a reader never sees a partially written
+            # model: the metadata is renamed over the previous one only when every file is written
+            prefix = os.path.join(path, '%s.%s' % (filename, uuid.uuid4().hex[:12]))
+            try:
+                meta = artifact.save(model, prefix)
+                meta['format'] = artifact.name
+                fd, temp_path = tempfile.mkstemp(dir=path, suffix='.tmp')
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(meta, f)
+                os.replace(temp_path, self.meta_path(filename))
+            except Exception:
+                for file in os.listdir(path):
+                    if file.startswith(os.path.basename(prefix)) or file.endswith('.tmp'):
+                        os.remove(os.path.join(path, file))
+                raise
+            # the files of the previous saves
+            for file in os.listdir(path):
+                if file not in meta['files'] and file != os.path.basename(self.meta_path(filename)):
+                    os.remove(os.path.join(path, file))
+            self.logger_object.log(self.file_object, 'Model File ' + filename + ' saved in the ' + artifact.name + ' format. Exited the save_model method of the Model_Finder class', level=DEBUG)
             return 'success'
         except Exception as e:
             self.logger_object.log(self.file_object, 'Exception occurred in save_model method of the Model_Finder class. Exception message: ' + str(e))
             self.logger_object.log(self.file_object, 'Model File ' + filename + ' could not be saved. Exited the save_model method of the Model_Finder class')
             raise Exception()
 
+    def clear_model_directory(self):
+        """
+        Remove the models saved by a previous training run. The hidden files of the model
+        directory (the lock and the job database of the training jobs) are kept.
+
+        Raises:
+            Exception: If there is an error while removing the models.
+
+        """
+        self.logger_object.log(self.file_object, 'Entered the clear_model_directory method of the File_Operation class', level=DEBUG)
+        try:
+            os.makedirs(self.model_directory, exist_ok=True)
+            for file in os.listdir(self.model_directory):
+                if file.startswith('.'):
+                    continue
+                path = os.path.join(self.model_directory, file)
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+            self.logger_object.log(self.file_object, 'Model directory cleared. Exited the clear_model_directory method of the File_Operation class', level=DEBUG)
+        except Exception as e:
+            self.logger_object.log(self.file_object, 'Exception occurred in clear_model_directory method of the File_Operation class. Exception message: ' + str(e))
+            raise Exception()
+
     def load_model(self, filename):
         """
         Load a machine learning model from a file.
@@ -68,16 +119,43 @@ class File_Operation:
             Exception: If there is an error while loading the model.
 
         """
-        self.logger_object.log(self.file_object, 'Entered the load_model method of the File_Operation class')
+        self.logger_object.log(self.file_object, 'Entered the load_model method of the File_Operation class', level=DEBUG)
         try:
-            with open(self.model_directory + filename + '/' + filename + '.sav', 'rb') as f:
-                self.logger_object.log(self.file_object, 'Model File ' + filename + ' loaded. Exited the load_model method of the Model_Finder class')
-                return pickle.load(f)
+            path = self.model_path(filename)
+            if path.endswith('.sav'):
+                with open(path, 'rb') as f:
+                    model = pickle.load(f)
+            else:
+                with open(path, 'r') as f:
+                    meta = json.load(f)
+                model = ARTIFACT_FORMATS[meta['format']].load(os.path.dirname(path), meta)
+            self.logger_object.log(self.file_object, 'Model File ' + filename + ' loaded. Exited the load_model method of the Model_Finder class', level=DEBUG)
+            return model
         except Exception as e:
             self.logger_object.log(self.file_object, 'Exception occurred in load_model method of the Model_Finder class. Exception message: ' + str(e))
             self.logger_object.log(self.file_object, 'Model File ' + filename + ' could not be loaded. Exited the load_model method of the Model_Finder class')
             raise Exception()
 
+    def model_path(self, filename):
+        """
+        Return the path of the file holding the model with the given name: its metadata file, or the
+        pickle file of a model saved before the artifact formats existed.
+
+        Args:
+            filename (str): The name of the model.
+
+        Returns:
+            str: The path of the saved model file.
+
+        """
+        legacy_path = self.model_directory + filename + '/' + filename + '.sav'
+        if not os.path.exists(self.meta_path(filename)) and os.path.exists(legacy_path):
+            return legacy_path
+        return self.meta_path(filename)
+
+    def meta_path(self, filename):
+        return self.model_directory + filename + '/' + filename + '.json'
+
     def find_correct_model_file(self, cluster_number):
         """
         Find the correct model file based on the cluster number.
@@ -92,20 +170,22 @@ class File_Operation:
             Exception: If there is an error while finding the model file.
 
         """
-        self.logger_object.log(self.file_object, 'Entered the find_correct_model_file method of the File_Operation class')
+        self.logger_object.log(self.file_object, 'Entered the find_correct_model_file method of the File_Operation class', level=DEBUG)
         try:
             self.cluster_number = cluster_number
             self.folder_name = self.model_directory
             self.list_of_model_files = []
             self.list_of_files = os.listdir(self.folder_name)
             for self.file in self.list_of_files:
+                if self.file.startswith('.'):
+                    continue  # the files of the training jobs
                 try:
                     if (self.file.index(str(self.cluster_number)) != -1):
                         self.model_name = self.file
                 except:
                     continue
             self.model_name = self.model_name.split('.')[0]
-            self.logger_object.log(self.file_object, 'Exited the find_correct_model_file method of the Model_Finder class.')
+            self.logger_object.log(self.file_object, 'Exited the find_correct_model_file method of the Model_Finder class.', level=DEBUG)
             return self.model_name
         except Exception as e:
             self.logger_object.log(self.file_object, 'Exception occurred in find_correct_model_file method of the Model_Finder class. Exception message: ' + str(e))
@@ -0,0 +1,111 @@
+import hashlib
+import os
+import threading
+import time
+from file_operations import file_methods
+
+
+class Model_Registry:
+    """
+    This class keeps the models loaded through File_Operation in memory so that every
+    prediction request does not have to read and deserialize them from disk again.
+
+    A cached model is reloaded only when its file on disk (the metadata file of its artifact,
+    which every save replaces) changes. The file is checked with
+    a cheap stat (mtime and size) on every lookup; the checksum is computed only when the
+    stat has changed, so touching a file without changing its content does not cause a reload.
+
+    Attributes:
+        stats (dict): Hit, miss, reload and load-time counters of the registry.
+
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models = {}
+        self.stats = {'hits': 0, 'misses': 0, 'reloads': 0, 'load_time': 0.0}
+
+    def get_model(self, filename, file_object, logger_object):
+        """
+        Return the model with the given name, loading it from disk only if it is not cached
+        yet or if its file has changed since it was cached.
+
+        Args:
+            filename (str): The name of the model, as passed to File_Operation.load_model.
+            file_object (file): The log file to record messages.
+            logger_object (object): The logger object for logging messages.
+
+        Returns:
+            object: The loaded machine learning model.
+
+        Raises:
+            Exception: If the model could not be loaded.
+
+        """
+        file_op = file_methods.File_Operation(file_object, logger_object)
+        path = file_op.model_path(filename)
+        with self._lock:
+            try:
+                stat = os.stat(path)
+                signature = (stat.st_mtime_ns, stat.st_size)
+                cached = self._models.get(filename)
+                if cached is not None and cached['signature'] == signature:
+                    self.stats['hits'] += 1
+                    return cached['model']
+
+                checksum = self._checksum(path)
+                if cached is not None and cached['checksum'] == checksum:
+                    # the file was touched but its content is the same, keep the loaded model
+                    cached['signature'] = signature
+                    self.stats['hits'] += 1
+                    return cached['model']
+
+                start = time.perf_counter()
+                model = file_op.load_model(filename)
+                self.stats['load_time'] += time.perf_counter() - start
+                self.stats['misses'] += 1
+                if cached is not None:
+                    self.stats['reloads'] += 1
+                self._models[filename] = {'signature': signature, 'checksum': checksum, 'model': model}
+                return model
+            except Exception as e:
+                logger_object.log(file_object, 'Exception occurred in get_model method of the Model_Registry class. Exception message: ' + str(e))
+                raise Exception()
+
+    def get_checksum(self, filename):
+        """
+        Return the checksum of the cached model with the given name, or None if it is not cached.
+
+        """
+        with self._lock:
+            cached = self._models.get(filename)
+            return cached['checksum'] if cached is not None else None
+
+    def get_stats(self):
+        """
+        Return a snapshot of the registry counters together with the names of the cached models.
+
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats['cached_models'] = sorted(self._models.keys())
+            return stats
+
+    def clear(self):
+        """
+        Drop every cached model, e.g. after a new training run replaced the model directory.
+
+        """
+        with self._lock:
+            self._models.clear()
+
+    def _checksum(self, path):
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                sha.update(block)
+        return sha.hexdigest()
+
+
+# process wide registry shared by every prediction request served by this worker
+model_registry = Model_Registry()
@@ -0,0 +1,111 @@
+import os
+import uuid
+from datetime import datetime
+from data_ingestion.connection_manager import Connection_Manager
+
+
+class Results_Store:
+    """
+    This class keeps the predictions of every prediction run in a SQLite table, keyed by run and
+    row and indexed by policy number and run, so the latest score of a claim is found with one
+    index lookup instead of a scan of the predictions files.
+
+    The rows of a run are written in one transaction that is committed when the run succeeds, so
+    a failed run leaves no rows behind. The run ids start with the time of the run, so the latest
+    run of a policy is the greatest run id.
+
+    Args:
+        file_object (file): The log file to record messages.
+        logger_object (object): The logger object for logging messages.
+        path (str): The path of the results database.
+
+    Methods:
+        start_run: Returns the id of a new run.
+        write: Writes the predictions of a chunk of the run.
+        commit: Makes the rows of the run visible.
+        rollback: Discards the rows of the run.
+        latest: Returns the latest prediction of a policy.
+        close: Closes the database.
+
+    """
+
+    def __init__(self, file_object, logger_object, path='Prediction_Output_File/Prediction_Results.db'):
+        self.file_object = file_object
+        self.logger_object = logger_object
+        self.path = path
+        self.connections = Connection_Manager(logger_object, file_object)
+        self.created = False
+
+    def connection(self):
+        if self.created:
+            return self.connections.connect(self.path)
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = self.connections.connect(self.path)
+        conn.execute('CREATE TABLE IF NOT EXISTS Prediction_Results (run_id TEXT NOT NULL, row_number INTEGER NOT NULL, '
+                     'policy_number INTEGER, prediction TEXT, score REAL, cluster INTEGER, model_version TEXT, '
+                     'PRIMARY KEY (run_id, row_number))')
+        conn.execute('CREATE INDEX IF NOT EXISTS Prediction_Results_policy_run ON Prediction_Results (policy_number, run_id)')
+        self.created = True
+        return conn
+
+    def start_run(self):
+        """
+        Returns the id of a new run: its start time, sortable as text, and a random suffix.
+
+        """
+        run_id = datetime.now().strftime('%Y%m%dT%H%M%S%f') + '_' + uuid.uuid4().hex[:8]
+        self.logger_object.log(self.file_object, 'Prediction run %s started' % run_id)
+        return run_id
+
+    def write(self, run_id, results):
+        """
+        Writes the predictions of a chunk of the run, uncommitted.
+
+        Args:
+            run_id (str): The id returned by start_run.
+            results (pandas.DataFrame): The rows of the chunk, indexed by their row number in the
+                                        run, with the policy_number, Predictions, score, cluster and
+                                        model_version columns.
+
+        Raises:
+            Exception: If the rows could not be written.
+
+        """
+        try:
+            conn = self.connection()
+            conn.executemany('INSERT INTO Prediction_Results VALUES (?, ?, ?, ?, ?, ?, ?)',
+                             zip([run_id] * len(results), results.index.tolist(),
+                                 results['policy_number'].tolist(), results['Predictions'].tolist(),
+                                 results['score'].tolist(), results['cluster'].tolist(),
+                                 results['model_version'].tolist()))
+        except Exception as e:
+            self.logger_object.log(self.file_object, 'Exception occurred in write method of the Results_Store class. Exception message: ' + str(e))
+            raise Exception()
+
+    def commit(self):
+        self.connection().commit()
+
+    def rollback(self):
+        self.connection().rollback()
+
+    def latest(self, policy_number):
+        """
+        Returns the latest prediction of a policy.
+
+        Args:
+            policy_number (int): The policy number.
+
+        Returns:
+            dict: The run id, row number, prediction, score, cluster and model version, or None if
+                  the policy was never predicted.
+
+        """
+        row = self.connection().execute('SELECT run_id, row_number, prediction, score, cluster, model_version '
+                                        'FROM Prediction_Results WHERE policy_number = ? '
+                                        'ORDER BY run_id DESC LIMIT 1', (policy_number,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('run_id', 'row_number', 'prediction', 'score', 'cluster', 'model_version'), row))
+
+    def close(self):
+        self.connections.close()
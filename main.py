@@ -1,13 +1,15 @@
 from wsgiref import simple_server
 from flask import Flask, request, render_template
-from flask import Response
+from flask import Response, jsonify
 import os
 from flask_cors import CORS, cross_origin
 from prediction_Validation_Insertion import pred_validation
-from trainingModel import trainModel
-from training_Validation_Insertion import train_validation
+from trainingJobs import training_jobs
 import flask_monitoringdashboard as dashboard
 from predictFromModel import prediction
+from file_operations.model_registry import model_registry
+from file_operations.results_store import Results_Store
+from application_logging import logger
 
 os.putenv('LANG', 'en_US.UTF-8')
 os.putenv('LC_ALL', 'en_US.UTF-8')
@@ -36,7 +38,7 @@ def predictRouteClient():
             pred = prediction(path) #object initialization
 
             # predicting for dataset present in database
-            path = pred.predictionFromModel()
+            path = pred.predictionFromModel(chunksize=request.json.get('chunksize'), n_threads=request.json.get('nThreads'))
             return Response("Prediction File created at %s!!!" % path)
 
         elif request.form is not None:
@@ -49,7 +51,7 @@ def predictRouteClient():
             pred = prediction(path) #object initialization
 
             # predicting for dataset present in database
-            path = pred.predictionFromModel()
+            path = pred.predictionFromModel(chunksize=request.form.get('chunksize', type=int), n_threads=request.form.get('nThreads', type=int))
             return Response("Prediction File created at %s!!!" % path)
 
     except ValueError:
@@ -68,14 +70,9 @@ def trainRouteClient():
     try:
         if request.json['folderPath'] is not None:
             path = request.json['folderPath']
-            train_valObj = train_validation(path) #object initialization
-
-            train_valObj.train_validation()#calling the training_validation function
-
-
-            trainModelObj = trainModel() #object initialization
-            trainModelObj.trainingModel() #training the model for the files in the table
-
+            # training runs in the background, the job id is used to follow its progress
+            job_id, created = training_jobs.submit(path, force_reload=bool(request.json.get('forceReload', False)))
+            return jsonify(training_jobs.status(job_id)), 202
 
     except ValueError:
 
@@ -88,7 +85,37 @@ def trainRouteClient():
     except Exception as e:
 
         return Response("Error Occurred! %s" % e)
-    return Response("Training successfull!!")
+    return Response("Error Occurred! No folderPath given", status=400)
+
+@app.route("/train/<job_id>", methods=['GET'])
+@cross_origin()
+def trainStatusRouteClient(job_id):
+    job = training_jobs.status(job_id)
+    if job is None:
+        return Response("Unknown training job %s" % job_id, status=404)
+    return jsonify(job)
+
+@app.route("/train", methods=['GET'])
+@cross_origin()
+def trainJobsRouteClient():
+    return jsonify(training_jobs.list())
+
+@app.route("/predictions/<int:policy_number>", methods=['GET'])
+@cross_origin()
+def latestPredictionRouteClient(policy_number):
+    results_store = Results_Store("Prediction_Logs/Prediction_Log.txt", logger.App_Logger())
+    try:
+        result = results_store.latest(policy_number)
+    finally:
+        results_store.close()
+    if result is None:
+        return Response("No prediction for policy %s" % policy_number, status=404)
+    return jsonify(result)
+
+@app.route("/modelcache", methods=['GET'])
+@cross_origin()
+def modelCacheStats():
+    return jsonify(model_registry.get_stats())
 
 port = int(os.getenv("PORT",5001))
 if __name__ == "__main__":
@@ -1,9 +1,13 @@
-import pandas as pd
+import os
 import numpy as np
+import pandas as pd
 from file_operations import file_methods
+from file_operations.model_registry import model_registry
+from file_operations.results_store import Results_Store
 from data_preprocessing import preprocessing
 from data_ingestion import data_loader_prediction
 from application_logging import logger
+from application_logging.run_profiler import Run_Profiler
 from Prediction_Raw_Data_Validation.predictionDataValidation import Prediction_Data_validation
 
 class prediction:
@@ -13,55 +17,163 @@ class prediction:
         self.log_writer = logger.App_Logger()
         self.pred_data_val = Prediction_Data_validation(path)
 
-    def predictionFromModel(self):
+    def predictionFromModel(self, chunksize=None, n_threads=None):
+        """
+        Predicts the data exported from the prediction database and writes the predictions file.
+
+        The predictions are written in the order of the input rows, with the policy number, the
+        score and the model version, to the predictions file and to the results store, see
+        file_operations/results_store.py.
+
+        Args:
+            chunksize (int): If given, the input is read, preprocessed, scored and written chunksize
+                             rows at a time, so memory is bounded by the chunk size and not by the file.
+                             Streaming needs the preprocessing pipeline saved at training time.
+            n_threads (int): The threads of the XGBoost predictions of the compiled scorer, all the
+                             cores if None.
+
+        Returns:
+            str: The path of the predictions file.
+
+        """
+        # every stage is timed into a run report, see application_logging/run_profiler.py
+        self.profiler = Run_Profiler('predictionFromModel', 'Prediction_Logs/run_reports/')
+        status = 'failed'
+        results_store = Results_Store(self.file_object, self.log_writer)
         try:
             self.pred_data_val.deletePredictionFile() # Deletes the existing prediction file from the last run!
             self.log_writer.log(self.file_object, 'Start of Prediction')
             data_getter = data_loader_prediction.Data_Getter_Pred(self.file_object, self.log_writer)
-            data = data_getter.get_data()
+            file_loader = file_methods.File_Operation(self.file_object, self.log_writer)
+            with self.profiler.stage('load_models'):
+                preprocessing_pipeline = self.load_preprocessing_pipeline(file_loader)
+                scorer = self.load_scorer(file_loader) if preprocessing_pipeline is not None else None
+                model_version = self.modelVersion(scorer)
+            path = "Prediction_Output_File/Predictions.csv"
+            run_id = results_store.start_run()
+
+            if chunksize is not None and preprocessing_pipeline is None:
+                self.log_writer.log(self.file_object, 'Streaming prediction needs the saved preprocessing pipeline, predicting the whole file at once')
+                chunksize = None
+
+            # the unique key is read to identify the predictions, and dropped before preprocessing
+            key_column = self.pred_data_val.uniqueKeyFromSchema()
+            drop_columns = [col for col in preprocessing.COLUMNS_TO_DROP if col != key_column]
+            if chunksize is None:
+                chunks = self.profiler.iterate('load_data', [data_getter.get_data(drop_columns=drop_columns)])
+            else:
+                chunks = self.profiler.iterate('load_data', data_getter.get_data_chunks(chunksize, drop_columns=drop_columns))
+
+            rows = 0
+            for data in chunks:
+                keys = data[key_column].to_numpy() if key_column in data.columns else [None] * len(data)
+                results = self.predictBatch(data, file_loader, preprocessing_pipeline, scorer, n_threads)
+                with self.profiler.stage('write', rows=len(results)):
+                    results.index = pd.RangeIndex(rows, rows + len(results))
+                    results.insert(0, 'policy_number', keys)
+                    results['model_version'] = model_version
+                    results.drop(columns=['cluster']).to_csv(path, header=(rows == 0), mode='w' if rows == 0 else 'a')
+                    results_store.write(run_id, results)
+                rows += len(results)
+            results_store.commit()
+            status = 'succeeded'
+            self.log_writer.log(self.file_object, 'End of Prediction, %d predictions of run %s stored' % (rows, run_id))
+        except Exception as ex:
+            results_store.rollback()
+            self.log_writer.log(self.file_object, 'Error occurred while running the prediction!! Error:: %s' % ex)
+            raise ex
+        finally:
+            results_store.close()
+            self.log_writer.log(self.file_object, 'Run report written to %s' % self.profiler.save(status))
+        return path
 
+    def predictBatch(self, data, file_loader, preprocessing_pipeline, scorer=None, n_threads=None):
+        """
+        Preprocesses a batch of raw rows, routes them to their cluster and predicts them.
+
+        Args:
+            data (pandas.DataFrame): The raw rows as exported from the database.
+            file_loader (File_Operation): The object used to find the model of each cluster.
+            preprocessing_pipeline (Preprocessing_Pipeline): The saved preprocessing, or None.
+            scorer (Compiled_Scorer): The scorer saved at training time, or None to predict
+                                      cluster by cluster with the saved models.
+            n_threads (int): The threads of the XGBoost predictions of the scorer.
+
+        Returns:
+            pandas.DataFrame: The 'Y'/'N' prediction, the probability of fraud and the cluster of
+                              every row, in the order of the rows of data.
+
+        """
+        with self.profiler.stage('preprocessing', rows=len(data)):
             preprocessor = preprocessing.Preprocessor(self.file_object, self.log_writer)
-            data = preprocessor.remove_columns(data, ['policy_number', 'policy_bind_date', 'policy_state', 'insured_zip',
-                                                      'incident_location', 'incident_date', 'incident_state',
-                                                      'incident_city', 'insured_hobbies', 'auto_make', 'auto_model',
-                                                      'auto_year', 'age', 'total_claim_amount'])
-            data.replace('?', np.NaN, inplace=True)
+            data = preprocessor.remove_columns(data, preprocessing.COLUMNS_TO_DROP)
 
-            is_null_present, cols_with_missing_values = preprocessor.is_null_present(data)
+            if preprocessing_pipeline is not None:
+                # impute and encode with the statistics fitted in training, nothing is fitted on the batch
+                data = preprocessing_pipeline.transform(data)
+            else:
+                is_null_present, cols_with_missing_values = preprocessor.is_null_present(data)
 
-            if (is_null_present):
-                data = preprocessor.impute_missing_values(data, cols_with_missing_values)
+                if (is_null_present):
+                    data = preprocessor.impute_missing_values(data, cols_with_missing_values)
 
-            data = preprocessor.encode_categorical_columns(data)
-            #data = preprocessor.scale_numerical_columns(data)
+                data = preprocessor.encode_categorical_columns(data)
 
-            file_loader = file_methods.File_Operation(self.file_object, self.log_writer)
-            kmeans = file_loader.load_model('KMeans')
+        if scorer is not None:
+            with self.profiler.stage('scoring', rows=len(data)):
+                predictions, scores, clusters = scorer.predict(data, n_threads)
+                return pd.DataFrame({'Predictions': predictions, 'score': scores, 'cluster': clusters})
+
+        with self.profiler.stage('scoring', rows=len(data)):
+            kmeans = model_registry.get_model('KMeans', self.file_object, self.log_writer)
 
             clusters = kmeans.predict(data)
-            data['clusters'] = clusters
-            clusters = data['clusters'].unique()
-            predictions = []
-
-            for i in clusters:
-                cluster_data = data[data['clusters'] == i]
-                cluster_data = cluster_data.drop(columns=['clusters'])
-                cluster_data = preprocessor.scale_numerical_columns(cluster_data)
+            predictions = np.empty(len(data), dtype=object)
+            scores = np.empty(len(data), dtype=np.float64)
+
+            for i in np.unique(clusters):
+                # the results of the cluster are scattered back to the positions of its rows
+                positions = np.flatnonzero(clusters == i)
+                cluster_data = data.iloc[positions]
+                if preprocessing_pipeline is not None:
+                    cluster_data = preprocessing_pipeline.scale_numerical_columns(cluster_data, i)
+                else:
+                    cluster_data = preprocessor.scale_numerical_columns(cluster_data)
                 model_name = file_loader.find_correct_model_file(i)
-                model = file_loader.load_model(model_name)
-                result = (model.predict(cluster_data))
+                model = model_registry.get_model(model_name, self.file_object, self.log_writer)
+                result = model.predict(cluster_data)
+                predictions[positions] = np.where(result == 0, 'N', 'Y')
+                scores[positions] = model.predict_proba(cluster_data)[:, 1]
+        return pd.DataFrame({'Predictions': predictions, 'score': scores, 'cluster': clusters})
 
-                for res in result:
-                    if res == 0:
-                        predictions.append('N')
-                    else:
-                        predictions.append('Y')
+    def modelVersion(self, scorer):
+        """
+        Returns the version of the models used by the run: the start of the checksum of the
+        compiled scorer, or of the KMeans model for models trained before the scorer was saved.
 
-            final = pd.DataFrame(list(zip(predictions)), columns=['Predictions'])
-            path = "Prediction_Output_File/Predictions.csv"
-            final.to_csv("Prediction_Output_File/Predictions.csv", header=True, mode='a+')
-            self.log_writer.log(self.file_object, 'End of Prediction')
-        except Exception as ex:
-            self.log_writer.log(self.file_object, 'Error occurred while running the prediction!! Error:: %s' % ex + str(data.columns))
-            raise ex
-        return path
+        """
+        name = 'Compiled_Scorer' if scorer is not None else 'KMeans'
+        model_registry.get_model(name, self.file_object, self.log_writer)
+        return model_registry.get_checksum(name)[:12]
+
+    def load_preprocessing_pipeline(self, file_loader):
+        """
+        Returns the preprocessing pipeline saved at training time, or None for models trained
+        before it was persisted, in which case the batch is preprocessed as it was before.
+
+        """
+        if not os.path.exists(file_loader.model_path('Preprocessing_Pipeline')):
+            self.log_writer.log(self.file_object, 'No saved preprocessing pipeline found, fitting the preprocessing on the batch')
+            return None
+        return model_registry.get_model('Preprocessing_Pipeline', self.file_object, self.log_writer)
+
+    def load_scorer(self, file_loader):
+        """
+        Returns the scorer compiled at training time, or None for models trained before it was
+        saved, in which case every cluster is predicted with its own model.
+
+        """
+        if not os.path.exists(file_loader.model_path('Compiled_Scorer')):
+            self.log_writer.log(self.file_object, 'No compiled scorer found, predicting cluster by cluster')
+            return None
+        return model_registry.get_model('Compiled_Scorer', self.file_object, self.log_writer)
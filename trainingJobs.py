@@ -0,0 +1,224 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from application_logging import logger
+from data_ingestion.connection_manager import Connection_Manager
+from trainingModel import trainModel
+from training_Validation_Insertion import train_validation
+try:
+    import fcntl
+except ImportError:  # no lock file on Windows, the jobs of one process still run one at a time
+    fcntl = None
+
+
+class trainingJobManager:
+    """
+    This class runs training jobs in a background thread, so that the /train request returns
+    a job id immediately instead of blocking a web worker for the whole training run.
+
+    The jobs and the progress of their stages are kept in a SQLite database in the model store,
+    shared by every web worker, so a job is found whichever worker serves the status request.
+    Jobs run one at a time for the model store: each worker runs the jobs it received in a single
+    thread, and a job holds an exclusive lock on a lock file in the model store from the start of
+    its validation to the end of its training, so the jobs of different workers wait for each
+    other. Submitting a folder that already has a queued or running job returns that job instead
+    of starting a new one.
+
+    A running job whose lock is free, or a queued job whose worker process is gone, was
+    interrupted (e.g. the worker was killed) and is reported as failed.
+
+    Args:
+        model_directory (str): The model store the jobs of this manager write to.
+        max_finished_jobs (int): The number of finished jobs kept for status queries.
+
+    """
+
+    def __init__(self, model_directory='models/', max_finished_jobs=100):
+        self.model_directory = model_directory
+        self.max_finished_jobs = max_finished_jobs
+        # hidden files, kept when the model directory is cleared by a training run
+        self.lock_path = os.path.join(model_directory, '.training.lock')
+        self.database_path = os.path.join(model_directory, '.training_jobs.db')
+        # a single worker thread, so the jobs of this worker run in submission order
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='training-job')
+        self.lock = threading.Lock()
+        self.connections = Connection_Manager(logger.App_Logger(), 'Training_Logs/TrainingJobsLog.txt')
+        self.created = False
+
+    def connection(self):
+        # the read-write connection of this worker, used under self.lock
+        if self.created:
+            return self.connections.connect(self.database_path)
+        os.makedirs(self.model_directory, exist_ok=True)
+        conn = self.connections.connect(self.database_path)
+        conn.execute('PRAGMA busy_timeout = 30000')  # the other workers write to the same database
+        conn.execute('CREATE TABLE IF NOT EXISTS Training_Jobs (id TEXT PRIMARY KEY, folder_path TEXT, force_reload INTEGER, '
+                     'status TEXT, submitted REAL, started REAL, finished REAL, result TEXT, error TEXT, worker INTEGER)')
+        conn.execute('CREATE TABLE IF NOT EXISTS Training_Job_Stages (job_id TEXT NOT NULL, position INTEGER NOT NULL, '
+                     'pipeline TEXT, name TEXT, status TEXT, started REAL, finished REAL, PRIMARY KEY (job_id, position))')
+        conn.execute('CREATE INDEX IF NOT EXISTS Training_Jobs_status ON Training_Jobs (status)')
+        self.created = True
+        return conn
+
+    def submit(self, path, force_reload=False):
+        """
+        Enqueues a training job for the given batch folder.
+
+        Args:
+            path (str): The folder with the training batch files.
+            force_reload (bool): Loads every batch file again, not only the new or modified ones.
+
+        Returns:
+            tuple: The job id and whether a new job was created (False if it was coalesced
+                   into a job already queued or running for the same folder).
+
+        """
+        with self.lock:
+            conn = self.connection()
+            self.failInterruptedJobs(conn)
+            # the check and the insert in one write transaction, so two workers cannot both create the job
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                existing = conn.execute("SELECT id FROM Training_Jobs WHERE folder_path = ? AND force_reload = ? "
+                                        "AND status IN ('queued', 'running')", (path, int(force_reload))).fetchone()
+                if existing is not None:
+                    return existing[0], False
+                job_id = uuid.uuid4().hex
+                conn.execute("INSERT INTO Training_Jobs (id, folder_path, force_reload, status, submitted, worker) "
+                             "VALUES (?, ?, ?, 'queued', ?, ?)", (job_id, path, int(force_reload), time.time(), os.getpid()))
+                self.removeFinishedJobs(conn)
+        self.executor.submit(self.run, job_id, path, force_reload)
+        return job_id, True
+
+    def run(self, job_id, path, force_reload):
+        """
+        Runs the validation and training stages of a job, holding the lock of the model store,
+        and records the progress of each stage.
+
+        """
+        with self.storeLock():
+            self.update(job_id, "status = 'running', started = ?", time.time())
+            try:
+                train_validation(path, force_reload=force_reload,
+                                 stage_listener=self.stageListener(job_id, 'train_validation')).train_validation()
+                trainModel(stage_listener=self.stageListener(job_id, 'trainingModel')).trainingModel()
+                self.update(job_id, "status = 'succeeded', result = ?, finished = ?", 'Training successfull!!', time.time())
+            except Exception as e:
+                self.update(job_id, "status = 'failed', error = ?, finished = ?",
+                            'Error Occurred! %s' % (str(e) or type(e).__name__), time.time())
+
+    def storeLock(self):
+        """
+        Returns an open handle of the lock file of the model store, locked exclusively; the lock
+        is released when the handle is closed.
+
+        """
+        os.makedirs(self.model_directory, exist_ok=True)
+        handle = open(self.lock_path, 'a')
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        return handle
+
+    def stageListener(self, job_id, pipeline):
+        def listener(name, status):
+            with self.lock:
+                conn = self.connection()
+                with conn:
+                    if status == 'running':
+                        conn.execute('INSERT INTO Training_Job_Stages SELECT ?, COUNT(*), ?, ?, ?, ?, NULL '
+                                     'FROM Training_Job_Stages WHERE job_id = ?', (job_id, pipeline, name, status, time.time(), job_id))
+                    else:
+                        conn.execute("UPDATE Training_Job_Stages SET status = ?, finished = ? WHERE job_id = ? AND pipeline = ? "
+                                     "AND name = ? AND status = 'running'", (status, time.time(), job_id, pipeline, name))
+        return listener
+
+    def update(self, job_id, assignments, *values):
+        with self.lock:
+            conn = self.connection()
+            with conn:
+                conn.execute('UPDATE Training_Jobs SET %s WHERE id = ?' % assignments, values + (job_id,))
+
+    def failInterruptedJobs(self, conn):
+        """
+        Marks as failed the running jobs while nobody holds the lock of the model store, and the
+        queued jobs of worker processes that no longer exist.
+
+        """
+        now = time.time()
+        if fcntl is not None and os.path.exists(self.lock_path):
+            with open(self.lock_path, 'a') as handle:
+                try:
+                    fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    pass  # a job is running
+                else:
+                    # a job finishes before it releases the lock, so this only matches interrupted jobs
+                    with conn:
+                        conn.execute("UPDATE Training_Jobs SET status = 'failed', error = 'Interrupted', finished = ? "
+                                     "WHERE status = 'running'", (now,))
+        workers = [row[0] for row in conn.execute("SELECT DISTINCT worker FROM Training_Jobs WHERE status = 'queued'")]
+        with conn:
+            for worker in workers:
+                if not self.isAlive(worker):
+                    conn.execute("UPDATE Training_Jobs SET status = 'failed', error = 'Interrupted', finished = ? "
+                                 "WHERE status = 'queued' AND worker = ?", (now, worker))
+
+    def isAlive(self, pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            pass  # e.g. owned by another user
+        return True
+
+    def status(self, job_id):
+        """
+        Returns a snapshot of the job with the elapsed time of the job and of each stage,
+        or None if the job is unknown.
+
+        """
+        with self.lock:
+            conn = self.connection()
+            self.failInterruptedJobs(conn)
+            return self.snapshot(conn, job_id)
+
+    def snapshot(self, conn, job_id):
+        row = conn.execute('SELECT id, folder_path, force_reload, status, submitted, started, finished, result, error '
+                           'FROM Training_Jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        job = dict(zip(('id', 'folderPath', 'forceReload', 'status', 'submitted', 'started', 'finished', 'result', 'error'), row))
+        job['forceReload'] = bool(job['forceReload'])
+        job['elapsed'] = None if job['started'] is None else (job['finished'] or now) - job['started']
+        job['stages'] = [{'pipeline': pipeline, 'name': name, 'status': status, 'started': started, 'finished': finished,
+                          'elapsed': (finished or now) - started}
+                         for pipeline, name, status, started, finished in conn.execute(
+                             'SELECT pipeline, name, status, started, finished FROM Training_Job_Stages '
+                             'WHERE job_id = ? ORDER BY position', (job_id,))]
+        return job
+
+    def list(self):
+        """
+        Returns a snapshot of every known job, the most recent first.
+
+        """
+        with self.lock:
+            conn = self.connection()
+            self.failInterruptedJobs(conn)
+            job_ids = [row[0] for row in conn.execute('SELECT id FROM Training_Jobs ORDER BY submitted DESC')]
+            return [self.snapshot(conn, job_id) for job_id in job_ids]
+
+    def removeFinishedJobs(self, conn):
+        finished = [row[0] for row in conn.execute("SELECT id FROM Training_Jobs WHERE status IN ('succeeded', 'failed') "
+                                                   "ORDER BY submitted DESC LIMIT -1 OFFSET ?", (self.max_finished_jobs,))]
+        for job_id in finished:
+            conn.execute('DELETE FROM Training_Job_Stages WHERE job_id = ?', (job_id,))
+            conn.execute('DELETE FROM Training_Jobs WHERE id = ?', (job_id,))
+
+
+# the job manager of the models/ store, shared by every request served by this worker
+training_jobs = trainingJobManager()
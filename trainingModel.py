@@ -3,56 +3,152 @@ from sklearn.model_selection import train_test_split
 from data_ingestion import data_loader
 from data_preprocessing import preprocessing
 from data_preprocessing import clustering
+from data_preprocessing import pipeline
 from best_model_finder import tuner
+from best_model_finder.scorer import Compiled_Scorer
 from file_operations import file_methods
 from application_logging import logger
-import numpy as np
+from application_logging.run_profiler import Run_Profiler
+from concurrent.futures import ProcessPoolExecutor
+import os
+import time
 import pandas as pd
 
+
+def train_cluster(cluster_number, features, columns, labels, n_jobs, tuner_options):
+    """
+    Finds, trains and saves the best model for the rows of one cluster.
+
+    It runs in a worker process, so it receives only the rows of its own cluster as plain numpy
+    arrays and writes to its own handle of the training log.
+
+    Args:
+        cluster_number (int): The cluster being trained.
+        features (numpy.ndarray): The encoded features of the cluster rows.
+        columns (list): The names of the feature columns.
+        labels (numpy.ndarray): The labels of the cluster rows.
+        n_jobs (int): The number of threads the model search may use.
+        tuner_options (dict): Extra keyword arguments of Model_Finder, e.g. the search strategy.
+
+    Returns:
+        dict: The cluster number, best model name and model, fitted scaler, scores and training time.
+
+    """
+    start = time.perf_counter()
+    log_writer = logger.App_Logger()
+    file_object = open("Training_Logs/ModelTrainingLog.txt", 'a+')
+    try:
+        cluster_features = pd.DataFrame(features, columns=columns)
+        cluster_label = pd.Series(labels, name='Labels')
+
+        # splitting the data into training and test set for each cluster one by one
+        x_train, x_test, y_train, y_test = train_test_split(cluster_features, cluster_label, test_size=1 / 3, random_state=355)
+        # Proceeding with more data pre-processing steps
+        preprocessor = preprocessing.Preprocessor(file_object, log_writer)
+        x_train = preprocessor.scale_numerical_columns(x_train)
+        # the test set is scaled with the training statistics, exactly as prediction does
+        cluster_pipeline = pipeline.Preprocessing_Pipeline()
+        cluster_pipeline.add_scaler(cluster_number, preprocessor.scaler)
+        x_test = cluster_pipeline.scale_numerical_columns(x_test, cluster_number)
+        print("Building the model!")
+
+        model_finder = tuner.Model_Finder(file_object, log_writer, n_jobs=n_jobs, **tuner_options)  # object initialization
+
+        # getting the best model for each of the clusters
+        best_model_name, best_model = model_finder.get_best_model(x_train, y_train, x_test, y_test)
+
+        # saving the best model to the directory.
+        file_op = file_methods.File_Operation(file_object, log_writer)
+        file_op.save_model(best_model, best_model_name + str(cluster_number))
+
+        return {'cluster': cluster_number,
+                'model_name': best_model_name,
+                'model': best_model,
+                'scaler': preprocessor.scaler,
+                'scores': {'Logistic Regression': model_finder.logistic_regression_score,
+                           'XGBoost': model_finder.xgboost_score},
+                'time': time.perf_counter() - start}
+    finally:
+        # a worker process exits without running atexit, so the queued log lines are drained here
+        log_writer.flush()
+        file_object.close()
+
+
 # Creating the common Logging object
 class trainModel:
 
-    def __init__(self):
+    def __init__(self, n_workers=None, tuner_options=None, stage_listener=None, elbow_options=None):
+        """
+        Args:
+            n_workers (int): The number of processes training clusters concurrently. Defaults to
+                             one per cluster, limited by the number of cores; 1 trains sequentially.
+            tuner_options (dict): Extra keyword arguments of Model_Finder (search_strategy, n_iter,
+                                  time_budget, early_stopping_rounds), applied to every cluster.
+            stage_listener (callable): Called when a stage of the run (load_data, preprocessing,
+                                       clustering, tuning, saving) starts and ends, see Run_Profiler.
+            elbow_options (dict): Extra keyword arguments of KMeansClustering.elbow_plot (n_jobs,
+                                  sample_size, use_minibatch), e.g. to find the number of clusters of
+                                  a large dataset on a sample.
+        """
         self.log_writer = logger.App_Logger()
         self.file_object = open("Training_Logs/ModelTrainingLog.txt", 'a+')
+        self.n_workers = n_workers
+        self.tuner_options = tuner_options or {}
+        self.stage_listener = stage_listener
+        self.elbow_options = elbow_options or {}
 
     def trainingModel(self):
         # Logging the start of Training
         self.log_writer.log(self.file_object, 'Start of Training')
         print("Started Training")
+        # every stage is timed into a run report, see application_logging/run_profiler.py
+        profiler = Run_Profiler('trainingModel', 'Training_Logs/run_reports/', stage_listener=self.stage_listener)
+        status = 'failed'
         try:
             # Getting the data from the source
             print("Getting Data")
-            data_getter = data_loader.Data_Getter(self.file_object, self.log_writer)
-            data = data_getter.get_data()
+            with profiler.stage('load_data') as stage:
+                data_getter = data_loader.Data_Getter(self.file_object, self.log_writer)
+                data = data_getter.get_data(drop_columns=preprocessing.COLUMNS_TO_DROP)  # the dropped columns are not read at all
+                stage['rows'] = len(data)
 
             """doing the data preprocessing"""
             print("Got Data")
 
-            preprocessor = preprocessing.Preprocessor(self.file_object, self.log_writer)
-            data = preprocessor.remove_columns(data, ['policy_number', 'policy_bind_date', 'policy_state', 'insured_zip', 'incident_location', 'incident_date', 'incident_state', 'incident_city', 'insured_hobbies', 'auto_make', 'auto_model', 'auto_year', 'age', 'total_claim_amount'])  # remove the column as it doesn't contribute to prediction.
-            data.replace('?', np.NaN, inplace=True)  # replacing '?' with NaN values for imputation
+            with profiler.stage('preprocessing', rows=len(data)):
+                preprocessor = preprocessing.Preprocessor(self.file_object, self.log_writer)
+                data = preprocessor.remove_columns(data, preprocessing.COLUMNS_TO_DROP)  # remove the column as it doesn't contribute to prediction.
+
+                # check if missing values are present in the dataset
+                is_null_present, cols_with_missing_values = preprocessor.is_null_present(data)
 
-            # check if missing values are present in the dataset
-            is_null_present, cols_with_missing_values = preprocessor.is_null_present(data)
+                # if missing values are there, replace them appropriately.
+                if (is_null_present):
+                    data = preprocessor.impute_missing_values(data, cols_with_missing_values)  # missing value imputation
 
-            # if missing values are there, replace them appropriately.
-            if (is_null_present):
-                data = preprocessor.impute_missing_values(data, cols_with_missing_values)  # missing value imputation
+                # record the imputation values and the one-hot vocabulary so prediction never refits them
+                preprocessing_pipeline = pipeline.Preprocessing_Pipeline()
+                preprocessing_pipeline.fit(data.drop(columns=['fraud_reported']))
 
-            # encode categorical data
-            data = preprocessor.encode_categorical_columns(data)
+                # encode categorical data
+                data = preprocessor.encode_categorical_columns(data)
 
-            # create separate features and labels
-            X, Y = preprocessor.separate_label_feature(data, label_column_name='fraud_reported')
+                # create separate features and labels
+                X, Y = preprocessor.separate_label_feature(data, label_column_name='fraud_reported')
+                preprocessing_pipeline.set_feature_columns(X)
 
             """ Applying the clustering approach"""
 
-            kmeans = clustering.KMeansClustering(self.file_object, self.log_writer)  # object initialization.
-            number_of_clusters = kmeans.elbow_plot(X)  # using the elbow plot to find the number of optimum clusters
+            # remove the models of the previous run before saving the new ones
+            file_op = file_methods.File_Operation(self.file_object, self.log_writer)
+            file_op.clear_model_directory()
 
-            # Divide the data into clusters
-            X = kmeans.create_clusters(X, number_of_clusters)
+            with profiler.stage('clustering', rows=len(X)):
+                kmeans = clustering.KMeansClustering(self.file_object, self.log_writer)  # object initialization.
+                number_of_clusters = kmeans.elbow_plot(X, labels=Y, **self.elbow_options)  # using the elbow plot to find the number of optimum clusters
+
+                # Divide the data into clusters
+                X = kmeans.create_clusters(X, number_of_clusters)
 
             # create a new column in the dataset consisting of the corresponding cluster assignments.
             X['Labels'] = Y
@@ -62,35 +158,60 @@ class trainModel:
 
             """parsing all the clusters and looking for the best ML algorithm to fit on individual cluster"""
 
-            for i in list_of_clusters:
-                cluster_data = X[X['Cluster'] == i]  # filter the data for one cluster
-
-                # Prepare the feature and Label columns
-                cluster_features = cluster_data.drop(['Labels', 'Cluster'], axis=1)
-                cluster_label = cluster_data['Labels']
-
-                # splitting the data into training and test set for each cluster one by one
-                x_train, x_test, y_train, y_test = train_test_split(cluster_features, cluster_label, test_size=1 / 3, random_state=355)
-                # Proceeding with more data pre-processing steps
-                x_train = preprocessor.scale_numerical_columns(x_train)
-                x_test = preprocessor.scale_numerical_columns(x_test)
-                print("Building the model!")
+            with profiler.stage('tuning', rows=len(X)):
+                results = self.trainClusters(X, list_of_clusters)
+            for result in results:
+                preprocessing_pipeline.add_scaler(result['cluster'], result['scaler'])
+                self.log_writer.log(self.file_object, 'Cluster %s: %s selected, scores %s, trained in %.2f seconds' % (
+                    result['cluster'], result['model_name'], result['scores'], result['time']))
 
-                model_finder = tuner.Model_Finder(self.file_object, self.log_writer)  # object initialization
-
-                # getting the best model for each of the clusters
-                best_model_name, best_model = model_finder.get_best_model(x_train, y_train, x_test, y_test)
-
-                # saving the best model to the directory.
+            with profiler.stage('saving'):
+                # saving the fitted preprocessing next to the models
                 file_op = file_methods.File_Operation(self.file_object, self.log_writer)
-                save_model = file_op.save_model(best_model, best_model_name + str(i))
+                file_op.save_model(preprocessing_pipeline, 'Preprocessing_Pipeline')
+                # the clustering and every cluster model compiled into one scorer for prediction
+                scorer = Compiled_Scorer(kmeans.kmeans, preprocessing_pipeline, {result['cluster']: result['model'] for result in results})
+                file_op.save_model(scorer, 'Compiled_Scorer')
+            status = 'succeeded'
 
             # logging the successful Training
             self.log_writer.log(self.file_object, 'Successful End of Training')
-            self.file_object.close()
 
         except Exception as e:
             # logging the unsuccessful Training
             self.log_writer.log(self.file_object, 'Unsuccessful End of Training')
-            self.file_object.close()
             raise Exception
+        finally:
+            self.log_writer.log(self.file_object, 'Run report written to %s' % profiler.save(status))
+            self.file_object.close()
+
+    def trainClusters(self, X, list_of_clusters):
+        """
+        Trains the best model of every cluster, in a process pool when more than one worker is used.
+
+        Only the rows of a cluster are sent to the process training it, as numpy arrays.
+
+        Args:
+            X (pandas.DataFrame): The features with the 'Cluster' and 'Labels' columns.
+            list_of_clusters (list): The clusters to train.
+
+        Returns:
+            list: The result of train_cluster for every cluster, in the order of list_of_clusters.
+
+        """
+        n_workers = self.n_workers or min(len(list_of_clusters), os.cpu_count() or 1)
+        # share the cores between the processes instead of letting every search use all of them
+        n_jobs = -1 if n_workers == 1 else max(1, (os.cpu_count() or 1) // n_workers)
+        columns = [col for col in X.columns if col not in ('Labels', 'Cluster')]
+        jobs = []
+        for i in list_of_clusters:
+            cluster_data = X[X['Cluster'] == i]  # filter the data for one cluster
+            jobs.append((int(i), cluster_data[columns].to_numpy(), columns, cluster_data['Labels'].to_numpy(), n_jobs, self.tuner_options))
+
+        self.log_writer.log(self.file_object, 'Training %d clusters with %d worker(s)' % (len(jobs), n_workers))
+        self.log_writer.flush()  # the workers append to the same log file
+        if n_workers == 1:
+            return [train_cluster(*job) for job in jobs]
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = [executor.submit(train_cluster, *job) for job in jobs]
+            return [future.result() for future in futures]
@@ -1,69 +1,96 @@
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from Training_Raw_data_validation.rawValidation import Raw_Data_validation
 from DataTypeValidation_Insertion_Training.DataTypeValidation import dBOperation
-from DataTransform_Training.DataTransformation import dataTransform
 from application_logging import logger
+from application_logging.run_profiler import Run_Profiler
 
 class train_validation:
-    def __init__(self,path):
+    def __init__(self, path, n_workers=None, export_format='parquet', force_reload=False, stage_listener=None):
+        """
+        Args:
+            path (str): The folder with the training batch files.
+            n_workers (int): The number of processes validating files concurrently. Defaults to the
+                             number of cores; 1 validates the files one at a time.
+            export_format (str): 'parquet' exports the table as a typed Parquet file when pyarrow is
+                                 installed, 'csv' as a CSV file.
+            force_reload (bool): Loads every batch file again instead of only the ones that are new
+                                 or modified since they were loaded.
+            stage_listener (callable): Called when a stage of the run starts and ends, see Run_Profiler.
+        """
         self.raw_data = Raw_Data_validation(path)
-        self.dataTransform = dataTransform()
         self.dBOperation = dBOperation()
         self.file_object = open("Training_Logs/Training_Main_Log.txt", 'a+')
         self.log_writer = logger.App_Logger()
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.export_format = export_format
+        self.force_reload = force_reload
+        self.stage_listener = stage_listener
 
     def train_validation(self):
+        # every stage is timed into a run report, see application_logging/run_profiler.py
+        profiler = Run_Profiler('train_validation', 'Training_Logs/run_reports/', stage_listener=self.stage_listener)
+        status = 'failed'
         try:
             self.log_writer.log(self.file_object, 'Start of Validation on files for Training!!')
-            # extracting values from prediction schema
-            LengthOfDateStampInFile, LengthOfTimeStampInFile, column_names, noofcolumns = self.raw_data.valuesFromSchema()
-            # getting the regex defined to validate filename
-            regex = self.raw_data.manualRegexCreation()
-            # validating filename of prediction files
-            self.raw_data.validationFileNameRaw(regex, LengthOfDateStampInFile, LengthOfTimeStampInFile)
-            # validating column length in the file
-            self.raw_data.validateColumnLength(noofcolumns)
-            # validating if any column has all values missing
-            self.raw_data.validateMissingValuesInWholeColumn()
-            self.log_writer.log(self.file_object, "Raw Data Validation Complete!!")
-
-            self.log_writer.log(self.file_object, "Starting Data Transforamtion!!")
-            # replacing blanks in the csv file with "Null" values to insert in table
-            self.dataTransform.replaceMissingWithNull()
-
-            self.log_writer.log(self.file_object, "DataTransformation Completed!!!")
+            with profiler.stage('filename_validation'):
+                # extracting values from prediction schema
+                LengthOfDateStampInFile, LengthOfTimeStampInFile, column_names, noofcolumns = self.raw_data.valuesFromSchema()
+                unique_key = self.raw_data.uniqueKeyFromSchema()
+                # getting the regex defined to validate filename
+                regex = self.raw_data.manualRegexCreation()
+                # validating filename of prediction files
+                self.raw_data.validationFileNameRaw(regex, LengthOfDateStampInFile, LengthOfTimeStampInFile)
 
             self.log_writer.log(self.file_object,
                                 "Creating Training_Database and tables on the basis of given schema!!!")
-            # create database with given name, if present open the connection! Create table with columns given in schema
-            self.dBOperation.createTableDb('Training', column_names)
-            self.log_writer.log(self.file_object, "Table creation Completed!!")
-            self.log_writer.log(self.file_object, "Insertion of Data into Table started!!!!")
-            # insert csv files in the table
-            self.dBOperation.insertIntoTableGoodData('Training')
+            with profiler.stage('validate_and_insert') as stage:
+                # create database with given name, if present open the connection! Create table with columns given in schema
+                self.dBOperation.createTableDb('Training', column_names, force_reload=self.force_reload, unique_key=unique_key)
+                self.log_writer.log(self.file_object, "Table creation Completed!!")
+                # the files loaded by a previous run and unchanged since are skipped
+                files_to_load = self.dBOperation.skipLoadedFiles('Training')
+                self.log_writer.log(self.file_object, "%d new or modified files to load!!" % len(files_to_load))
+                self.log_writer.log(self.file_object, "Validation and Insertion of Data into Table started!!!!")
+                # the files are validated by a process pool; every valid file is queued to the single
+                # database writer, which inserts them in file name order while the next ones are validated
+                file_queue = queue.Queue()
+                with ThreadPoolExecutor(max_workers=1) as writer:
+                    inserted = writer.submit(self.dBOperation.insertIntoTableGoodData, 'Training', files=iter(file_queue.get, None),
+                                             column_names=column_names, manifest=files_to_load, unique_key=unique_key)
+                    try:
+                        # validating the column length and the columns with all values missing in one pass
+                        # over each file; the values are typed from the schema when they are inserted
+                        self.raw_data.validateFiles(noofcolumns, n_workers=self.n_workers, valid_file_callback=file_queue.put)
+                    finally:
+                        file_queue.put(None)  # no more files, lets the writer finish
+                    stage['rows'] = inserted.result()
+            self.log_writer.log(self.file_object, "Raw Data Validation Complete!!")
             self.log_writer.log(self.file_object, "Insertion in Table completed!!!")
             self.log_writer.log(self.file_object, "Deleting Good Data Folder!!!")
-            # Delete the good data folder after loading files in table
-            self.raw_data.deleteExistingGoodDataTrainingFolder()
-            self.log_writer.log(self.file_object, "Good_Data folder deleted!!!")
-            self.log_writer.log(self.file_object, "Moving bad files to Archive and deleting Bad_Data folder!!!")
-            # Move the bad files to archive folder
-            self.raw_data.moveBadFilesToArchiveBad()
+            with profiler.stage('archive'):
+                # Delete the good data folder after loading files in table
+                self.raw_data.deleteExistingGoodDataTrainingFolder()
+                self.log_writer.log(self.file_object, "Good_Data folder deleted!!!")
+                self.log_writer.log(self.file_object, "Moving bad files to Archive and deleting Bad_Data folder!!!")
+                # Move the bad files to archive folder
+                self.raw_data.moveBadFilesToArchiveBad()
             self.log_writer.log(self.file_object, "Bad files moved to archive!! Bad folder Deleted!!")
             self.log_writer.log(self.file_object, "Validation Operation completed!!")
-            self.log_writer.log(self.file_object, "Extracting csv file from table")
-            # export data in table to csvfile
-            self.dBOperation.selectingDatafromtableintocsv('Training')
-            self.file_object.close()
+            self.log_writer.log(self.file_object, "Extracting file from table")
+            with profiler.stage('export') as stage:
+                if files_to_load or not os.path.exists(self.dBOperation.exportedFile(self.export_format)):
+                    # export data in table to a Parquet file, or a csvfile without pyarrow
+                    stage['rows'] = self.dBOperation.exportGoodData('Training', column_names, self.export_format)
+                else:
+                    self.log_writer.log(self.file_object, "No new data, the exported file is up to date!!")
+            status = 'succeeded'
 
         except Exception as e:
             raise e
-
-
-
-
-
-
-
-
-
+        finally:
+            self.dBOperation.close()  # the connection is reused by the whole run
+            self.log_writer.log(self.file_object, "Run report written to %s" % profiler.save(status))
+            self.file_object.close()